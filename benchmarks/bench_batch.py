@@ -0,0 +1,63 @@
+"""HospitalSystem.book_many against booking one appointment at a time.
+
+One at a time is what make_appointment does without the prompt: list the
+day's free slots, then add the record if the wanted slot is among them.
+Every doctor gets a weekly series in each slot of the day for a year, and
+one in ten slots is already taken. Run from the repository root:
+
+    python -m benchmarks.bench_batch
+"""
+from datetime import datetime, timedelta
+from time import perf_counter
+
+from project import Clinic, Doctor, HospitalSystem, Patient, Record
+
+DOCTORS = 100
+WEEKS = 52
+SLOTS_PER_DAY = 18  # 8AM-5PM in 30-minute slots
+FIRST_DAY = datetime(2025, 1, 6, 8)
+
+
+def build(compact):
+    hs = HospitalSystem(compact=compact)
+    patient = Patient("John", "Doe", "1990-01-01", "555-2222", "john@example.com", ["cough"])
+    clinic = Clinic(1, "Healthy Life Clinic", "123 Main St", "Metropolis", "MetroState", "12345", "555-1111", "contact@hlclinic.com", "8AM-5PM")
+    series = []
+    for i in range(DOCTORS):
+        doctor = Doctor("Doc", f"Tor{i}", "1980-01-01", "555-0000", f"doc{i}@hospital.com", "Cardiology", f"LIC{i}", 10)
+        hs.add_doctor(doctor)
+        for slot in range(SLOTS_PER_DAY):
+            series += Record.recurring(patient, doctor, clinic, FIRST_DAY + timedelta(minutes=30 * slot), "Checkup", count=WEEKS)
+    for record in series[::10]:
+        hs.add_record(Record(record.patient, record.doctor, record.clinic, record.visitDate, "Taken"))
+    return hs, series
+
+
+def one_at_a_time(hs, records):
+    booked = 0
+    for record in records:
+        if record.visitDate in hs.free_slots_on(record.doctor, record.clinic, record.visitDate.date()):
+            hs.add_record(record)
+            booked += 1
+    return booked
+
+
+def batched(hs, records):
+    return hs.book_many(records).count("booked")
+
+
+def main():
+    print(f"{DOCTORS * SLOTS_PER_DAY * WEEKS} bookings")
+    print(f"{'records':>8} {'path':<14} {'booked':>7} {'ms':>8} {'per s':>10}")
+    for compact in (False, True):
+        for name, book in (("one at a time", one_at_a_time), ("book_many", batched)):
+            hs, series = build(compact)
+            started = perf_counter()
+            booked = book(hs, series)
+            elapsed = perf_counter() - started
+            mode = "compact" if compact else "objects"
+            print(f"{mode:>8} {name:<14} {booked:>7} {elapsed * 1000:>8.0f} {len(series) / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
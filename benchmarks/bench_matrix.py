@@ -0,0 +1,105 @@
+"""AvailabilityMatrix queries against the per-doctor, per-day free_slots_on loop.
+
+1000 doctors over 90 days at a clinic open weekdays with a lunch break,
+each open day about half booked. Run from the
+repository root (needs numpy):
+
+    python -m benchmarks.bench_matrix
+"""
+import random
+from datetime import date, timedelta
+from timeit import repeat
+
+from project import Clinic, Doctor, HospitalSystem, Patient, Record
+
+DOCTORS = 1_000
+DAYS = 90
+SPECIALIZATIONS = ["Cardiology", "Dermatology", "Pediatrics", "Neurology", "Oncology",
+                   "Orthopedics", "Psychiatry", "Radiology", "Urology", "Gynecology"]
+FIRST_DAY = date(2025, 1, 6)
+CLINIC = Clinic(1, "Healthy Life Clinic", "123 Main St", "Metropolis", "MetroState", "12345", "555-1111",
+                "contact@hlclinic.com", "Mon-Fri 8AM-12PM, 1PM-5PM")
+
+
+def build_system(seed=0):
+    rng = random.Random(seed)
+    hs = HospitalSystem()
+    patient = Patient("John", "Doe", "1990-01-01", "555-2222", "john@example.com", ["cough"])
+    days = [CLINIC.schedule.slots(FIRST_DAY + timedelta(days=day)) for day in range(DAYS)]
+    for i in range(DOCTORS):
+        doctor = Doctor("Doc", f"Tor{i}", "1980-01-01", "555-0000", f"doc{i}@hospital.com", SPECIALIZATIONS[i % 10], f"LIC{i}", 10)
+        hs.add_doctor(doctor)
+        for slots in days:
+            for slot in rng.sample(slots, len(slots) // 2):
+                hs.add_record(Record(patient, doctor, CLINIC, slot, "Checkup"))
+    return hs
+
+
+def loop_earliest(hs, specialization, days):
+    for offset in range(days):
+        found = [
+            (slots[0], doctor)
+            for doctor in hs.get_doctors(specialization)
+            for slots in [hs.free_slots_on(doctor, CLINIC, FIRST_DAY + timedelta(days=offset))]
+            if slots
+        ]
+        if found:
+            return min(found, key=lambda pair: pair[0])
+    return None
+
+
+def loop_count(hs):
+    return {
+        doctor: sum(len(hs.free_slots_on(doctor, CLINIC, FIRST_DAY + timedelta(days=d))) for d in range(DAYS))
+        for doctor in hs.doctors
+    }
+
+
+def loop_common(hs, doctors):
+    common = []
+    for d in range(DAYS):
+        day = FIRST_DAY + timedelta(days=d)
+        free = set(hs.free_slots_on(doctors[0], CLINIC, day))
+        for doctor in doctors[1:]:
+            free &= set(hs.free_slots_on(doctor, CLINIC, day))
+        common += sorted(free)
+    return common
+
+
+def best_ms(fn, number=1):
+    return min(repeat(fn, number=number, repeat=3)) / number * 1000
+
+
+def main():
+    hs = build_system()
+    trio = hs.doctors[:3]
+    build = best_ms(lambda: hs.availability_matrix(CLINIC, FIRST_DAY, DAYS))
+    matrix = hs.availability_matrix(CLINIC, FIRST_DAY, DAYS)
+    cardiologists = hs.get_doctors("Cardiology")
+    fortnight = CLINIC.schedule.slots(FIRST_DAY + timedelta(days=14))[0]
+
+    # Same answers both ways before timing anything
+    assert loop_count(hs) == matrix.count_free()
+    assert loop_common(hs, trio) == matrix.common_free(trio)
+    loop_answer = loop_earliest(hs, "Cardiology", 14)
+    assert matrix.earliest_free(cardiologists, end=fortnight)[1] == loop_answer[0]
+
+    rows = [
+        ("earliest cardiology slot, 14 days",
+         best_ms(lambda: loop_earliest(hs, "Cardiology", 14), 10),
+         best_ms(lambda: matrix.earliest_free(cardiologists, end=fortnight), 100)),
+        ("free slots per doctor, 90 days",
+         best_ms(lambda: loop_count(hs)),
+         best_ms(lambda: matrix.count_free(), 10)),
+        ("common free slots of 3 doctors",
+         best_ms(lambda: loop_common(hs, trio), 10),
+         best_ms(lambda: matrix.common_free(trio), 100)),
+    ]
+    print(f"{DOCTORS} doctors x {DAYS} days, matrix built from the booking indexes in {build:.0f} ms")
+    print(f"{'query':<36} {'loop ms':>10} {'matrix ms':>10} {'speed-up':>9}")
+    for name, loop, vectorized in rows:
+        print(f"{name:<36} {loop:>10.2f} {vectorized:>10.3f} {loop / vectorized:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
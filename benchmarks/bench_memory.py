@@ -0,0 +1,95 @@
+"""Memory used by a HospitalSystem holding a large record history.
+
+Each (mode, size) is built in a fresh interpreter so the peak RSS figures
+don't bleed into each other. Run from the repository root:
+
+    python -m benchmarks.bench_memory
+    python -m benchmarks.bench_memory --sizes 1000000
+"""
+import argparse
+import random
+import resource
+import subprocess
+import sys
+import time as timer
+from datetime import datetime, timedelta
+
+from project import Clinic, Doctor, HospitalSystem, Patient, Record
+
+SIZES = [1_000_000, 10_000_000]
+MODES = ["objects", "compact"]
+DOCTORS = 1_000
+PATIENTS = 100_000
+CLINICS = 50
+TREATMENTS = ["Checkup", "Vaccination", "Blood test", "Follow-up", "Physiotherapy"]
+SLOTS_PER_DAY = 18  # 8AM-5PM in 30-minute slots
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def build(mode, n_records, seed=0):
+    """Fill a HospitalSystem with n_records visits spread over doctors, patients and days."""
+    rng = random.Random(seed)
+    hs = HospitalSystem(compact=mode == "compact")
+    doctors = [
+        Doctor("Doc", f"Tor{i}", "1980-01-01", "555-0000", f"doc{i}@hospital.com", "Cardiology", f"LIC{i}", 10)
+        for i in range(DOCTORS)
+    ]
+    for doctor in doctors:
+        hs.add_doctor(doctor)
+    patients = [
+        Patient("Pat", f"Ient{i}", "1990-01-01", "555-0000", f"pat{i}@example.com", ["cough"])
+        for i in range(PATIENTS)
+    ]
+    clinics = [
+        Clinic(i, f"Clinic {i}", "1 Main St", "Metropolis", "MetroState", "12345", "555-1111", "c@example.com", "8AM-5PM")
+        for i in range(CLINICS)
+    ]
+    first_day = datetime(2024, 1, 1, 8)
+    baseline = peak_rss_mb()
+    started = timer.perf_counter()
+    # Every doctor fills their days in turn, so no slot is booked twice
+    for i in range(n_records):
+        doctor_slot, doctor_index = divmod(i, DOCTORS)
+        day, slot = divmod(doctor_slot, SLOTS_PER_DAY)
+        hs.add_record(Record(
+            rng.choice(patients), doctors[doctor_index], clinics[doctor_index % CLINICS],
+            first_day + timedelta(days=day, minutes=30 * slot), rng.choice(TREATMENTS),
+        ))
+    return hs, peak_rss_mb() - baseline, timer.perf_counter() - started
+
+
+def child(mode, n_records):
+    _, used_mb, seconds = build(mode, n_records)
+    print(f"{used_mb:.1f} {seconds:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "N"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child[0], int(args.child[1]))
+        return
+
+    print(f"{'records':>10} {'mode':>8} {'MB':>9} {'bytes/record':>13} {'build s':>8}")
+    for n in args.sizes:
+        for mode in args.modes:
+            result = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_memory", "--child", mode, str(n)],
+                capture_output=True, text=True,
+            )
+            if result.returncode:
+                # Usually the OOM killer; the size doesn't fit this machine in that mode
+                print(f"{n:>10} {mode:>8} {'failed':>9} (exit {result.returncode})")
+                continue
+            used_mb, seconds = map(float, result.stdout.split())
+            print(f"{n:>10} {mode:>8} {used_mb:>9.1f} {used_mb * 2**20 / n:>13.0f} {seconds:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Slot lookup latency as a doctor's record history grows.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_slots
+"""
+from datetime import datetime, time, timedelta
+from timeit import repeat
+
+from project import Clinic, Doctor, HospitalSystem, Patient, Record
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+SLOTS_PER_DAY = 18  # 8AM-5PM in 30-minute slots
+
+
+def build_system(n_records):
+    hs = HospitalSystem()
+    doctor = Doctor("Alice", "Smith", "1980-06-15", "123456789", "alice@hospital.com", "Cardiology", "LIC123", 10)
+    patient = Patient("John", "Doe", "1990-01-01", "555-2222", "john@example.com", ["cough"])
+    clinic = Clinic(1, "Healthy Life Clinic", "123 Main St", "Metropolis", "MetroState", "12345", "555-1111", "contact@hlclinic.com", "8AM-5PM")
+    hs.add_doctor(doctor)
+    first_day = datetime(2000, 1, 3)
+    for i in range(n_records):
+        day, slot = divmod(i, SLOTS_PER_DAY)
+        visit = first_day + timedelta(days=day, hours=8, minutes=30 * slot)
+        hs.add_record(Record(patient, doctor, clinic, visit, "Checkup"))
+    # The day we query is half booked, in the middle of the history.
+    query_day = (first_day + timedelta(days=n_records // SLOTS_PER_DAY // 2)).date()
+    return hs, doctor, query_day
+
+
+def legacy_is_slot_available(doctor, visit_datetime):
+    return all(record.visitDate != visit_datetime for record in doctor.records)
+
+
+def best_us(fn, number):
+    return min(repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    print(f"{'records':>10} {'is_slot_available':>18} {'free_slots(day)':>16} {'legacy day scan':>16}")
+    for n in SIZES:
+        hs, doctor, day = build_system(n)
+        start = datetime.combine(day, time(8))
+        end = datetime.combine(day, time(17))
+        probe = start + timedelta(hours=4)
+        single = best_us(lambda: hs.is_slot_available(doctor, probe), 10_000)
+        full_day = best_us(lambda: hs.free_slots(doctor, start, end), 1_000)
+        if n <= 100_000:
+            slots = [start + timedelta(minutes=30 * i) for i in range(SLOTS_PER_DAY)]
+            legacy = best_us(lambda: [s for s in slots if legacy_is_slot_available(doctor, s)], 1)
+            legacy = f"{legacy:>13.1f} us"
+        else:
+            legacy = f"{'(skipped)':>16}"
+        print(f"{n:>10} {single:>15.2f} us {full_day:>13.2f} us {legacy}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Time to save a HospitalSystem snapshot and to open it again.
+
+The load is timed in a fresh interpreter, as it would be on start-up; the
+file may still be in the page cache. Run from the repository root:
+
+    python -m benchmarks.bench_snapshot
+    python -m benchmarks.bench_snapshot --sizes 1000000
+"""
+import argparse
+import gc
+import os
+import subprocess
+import sys
+import tempfile
+import time as timer
+from datetime import datetime, time
+
+from project import HospitalSystem
+
+from .bench_memory import build
+
+SIZES = [1_000_000, 10_000_000]
+
+
+def rss_mb():
+    # Not ru_maxrss: a child inherits the high-water mark of the parent that built the records
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def child(path):
+    """Open the snapshot and touch it the way a simulation would on start-up."""
+    baseline = rss_mb()
+    started = timer.perf_counter()
+    hs = HospitalSystem.load(path)
+    # load() holds off the garbage collector; count the collection it defers
+    gc.collect()
+    opened = timer.perf_counter() - started
+    started = timer.perf_counter()
+    doctor = hs.doctors[len(hs.doctors) // 2]
+    day = doctor.records[len(doctor.records) // 2].visitDate.date()
+    hs.free_slots(doctor, datetime.combine(day, time(8)), datetime.combine(day, time(17)))
+    first_query = timer.perf_counter() - started
+    print(f"{opened * 1000:.1f} {first_query * 1000:.1f} {rss_mb() - baseline:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child)
+        return
+
+    print(f"{'records':>10} {'file MB':>8} {'save s':>7} {'open ms':>8} {'1st query ms':>13} {'open RSS MB':>12}")
+    for n in args.sizes:
+        hs, _, _ = build("compact", n)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "hospital.snap")
+            started = timer.perf_counter()
+            hs.save(path)
+            saved = timer.perf_counter() - started
+            del hs
+            result = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_snapshot", "--child", path],
+                capture_output=True, text=True, check=True,
+            )
+            opened, first_query, rss = map(float, result.stdout.split())
+            size_mb = os.path.getsize(path) / 2**20
+        print(f"{n:>10} {size_mb:>8.1f} {saved:>7.1f} {opened:>8.1f} {first_query:>13.1f} {rss:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -38,10 +39,15 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    # API tokens of the async booking view (manage.py drf_create_token <username>)
+    'rest_framework.authtoken',
     'penitansyeAPI',
 ]
 
 MIDDLEWARE = [
+    # First, so that its timings cover the other middleware too
+    'penitansyeAPI.metrics.MetricsMiddleware',
+    'penitansyeAPI.routers.StickyPrimaryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,7 +61,8 @@ ROOT_URLCONF = 'penitansye.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, timing each render for penitansyeAPI.metrics
+        'BACKEND': 'penitansyeAPI.metrics.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -74,12 +81,98 @@ WSGI_APPLICATION = 'penitansye.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# PENITANSYE_DB_PROFILE selects "dev" (default): one SQLite file with Django's
+# defaults, or "production": persistent, health-checked connections and
+# SQLite in WAL mode, plus a read replica at PENITANSYE_REPLICA_PATH if set
+# (a copy kept current by e.g. Litestream or LiteFS). penitansyeAPI.routers
+# sends the reads of availability, listing and export views to the replica.
+
+DB_PROFILE = os.environ.get('PENITANSYE_DB_PROFILE', 'dev')
+DB_PATH = os.environ.get('PENITANSYE_DB_PATH', BASE_DIR / 'db.sqlite3')
+
+if DB_PROFILE == 'production':
+    # Applied to every new connection. WAL lets readers run alongside the
+    # writer; busy_timeout makes a writer wait for the lock instead of failing
+    # at once; synchronous=NORMAL is durable enough under WAL and skips an
+    # fsync per commit.
+    SQLITE_PRAGMAS = 'PRAGMA journal_mode=WAL; PRAGMA busy_timeout=5000; PRAGMA synchronous=NORMAL;'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': DB_PATH,
+            'CONN_MAX_AGE': int(os.environ.get('PENITANSYE_CONN_MAX_AGE', 600)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'init_command': SQLITE_PRAGMAS,
+                # Take the write lock when a transaction starts: a deferred
+                # one that has to upgrade later fails on a busy database
+                # without waiting out busy_timeout.
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
     }
-}
+    if os.environ.get('PENITANSYE_REPLICA_PATH'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'NAME': os.environ['PENITANSYE_REPLICA_PATH'],
+            'OPTIONS': {'init_command': 'PRAGMA busy_timeout=5000; PRAGMA query_only=ON;'},
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': DB_PATH,
+        }
+    }
+
+DATABASE_ROUTERS = ['penitansyeAPI.routers.ReplicaRouter']
+# The alias replica_reads views read from, if configured
+READ_REPLICA = 'replica' if 'replica' in DATABASES else None
+# How long a client's reads stay on the primary after it writes, to cover
+# the replica's lag: it sees its own booking on the next page it loads
+REPLICA_STICKY_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# PENITANSYE_CACHE selects the backend: "locmem" (default), "file", or "redis"
+# for a local Redis (or compatible stand-in) at REDIS_URL.
+
+CACHE_BACKEND = os.environ.get('PENITANSYE_CACHE', 'locmem')
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')
+
+if CACHE_BACKEND == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+elif CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / '.cache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'penitansye',
+            'OPTIONS': {'MAX_ENTRIES': 100_000},
+        }
+    }
+
+
+# Slot change feed (penitansyeAPI/feed.py)
+# PENITANSYE_FEED selects the broadcaster: "local" (default) for a single
+# worker, or "redis" for several, through a stream on the Redis at REDIS_URL
+# (a local Redis or compatible stand-in).
+
+FEED_BACKEND = os.environ.get('PENITANSYE_FEED', 'local')
+FEED_HISTORY = 10_000  # events kept for clients resuming with Last-Event-ID
 
 
 # Password validation
@@ -122,3 +215,7 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Covering indexes (Index.include) only take effect on PostgreSQL; on SQLite
+# the extra columns are ignored, which is fine.
+SILENCED_SYSTEM_CHECKS = ['models.W040']
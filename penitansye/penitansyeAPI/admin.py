@@ -1,10 +1,87 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max
+from django.utils.functional import cached_property
 from .models import  Doctor, Patient,Clinic,Record, Appointment
 
-# Register your models here.
-admin.site.register(Doctor)
-admin.site.register(Patient)
-admin.site.register(Clinic)
-admin.site.register(Record)
-admin.site.register(Appointment)
+# Tables smaller than this are counted exactly
+ESTIMATE_COUNT_ABOVE = 100_000
 
+
+def estimated_count(model, using):
+    """Cheap row count estimate: planner statistics on PostgreSQL, the highest id elsewhere."""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [connection.ops.quote_name(model._meta.db_table)],
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return row[0]
+    return model._default_manager.using(using).aggregate(max_id=Max('pk'))['max_id'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that estimates the size of unfiltered changelists instead of running COUNT(*).
+
+    Filtered and searched lists are still counted exactly; the visit_date
+    indexes keep those counts cheap.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate > ESTIMATE_COUNT_ABOVE:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Skip the second COUNT(*) of the whole table shown next to search results
+    show_full_result_count = False
+
+
+@admin.register(Doctor)
+class DoctorAdmin(LargeTableAdmin):
+    list_display = ('lastname', 'firstname', 'email', 'specialization')
+    search_fields = ('lastname', 'firstname', 'email', 'specialization')
+
+
+@admin.register(Patient)
+class PatientAdmin(LargeTableAdmin):
+    list_display = ('lastname', 'firstname', 'email', 'date_of_birth')
+    # Prefix and exact lookups rather than a substring scan of every patient
+    search_fields = ('^lastname', '^firstname', '=email')
+
+
+@admin.register(Clinic)
+class ClinicAdmin(admin.ModelAdmin):
+    list_display = ('clinic_name', 'city', 'province', 'opening_hours')
+    search_fields = ('clinic_name', 'city')
+
+
+class VisitAdmin(LargeTableAdmin):
+    list_display = ('visit_date', 'patient', 'doctor', 'clinic')
+    list_select_related = ('patient', 'doctor', 'clinic')
+    date_hierarchy = 'visit_date'
+    # Builds the date drill-down from index seeks, see templatetags/visit_admin.py
+    change_list_template = 'admin/penitansyeAPI/visit_change_list.html'
+    # Patients are too many for a search box; doctors and clinics autocomplete
+    raw_id_fields = ('patient',)
+    autocomplete_fields = ('doctor', 'clinic')
+
+
+@admin.register(Record)
+class RecordAdmin(VisitAdmin):
+    pass
+
+
+@admin.register(Appointment)
+class AppointmentAdmin(VisitAdmin):
+    pass
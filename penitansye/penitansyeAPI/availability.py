@@ -0,0 +1,137 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from . import caching
+from .models import Appointment
+
+BOOKED_CACHE_TIMEOUT = 10 * 60
+
+
+def day_slots(day, schedule):
+    """Return the aware slot starts of a clinic day, in the current time zone."""
+    return [timezone.make_aware(datetime.combine(day, slot_time)) for slot_time in schedule.slot_times_on(day)]
+
+
+def date_range(start_date, end_date):
+    day = start_date
+    while day <= end_date:
+        yield day
+        day += timedelta(days=1)
+
+
+def booked_query(doctor_ids, start_date, end_date):
+    """(doctor_id, visit_date) of the appointments booked in the range."""
+    start = timezone.make_aware(datetime.combine(start_date, time.min))
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+    return Appointment.objects.filter(
+        doctor_id__in=doctor_ids,
+        visit_date__gte=start,
+        visit_date__lt=end,
+    ).order_by().values_list("doctor_id", "visit_date")
+
+
+def booked_slots(doctor_ids, start_date, end_date):
+    """Return the set of (doctor_id, visit_date) booked in the range, in one query."""
+    return set(booked_query(doctor_ids, start_date, end_date))
+
+
+def _wanted_days(doctor_ids, start_date, end_date):
+    return [(doctor_id, day) for day in date_range(start_date, end_date) for doctor_id in doctor_ids]
+
+
+def _missing_range(missing):
+    days = [day for _, day in missing]
+    return {doctor_id for doctor_id, _ in missing}, min(days), max(days)
+
+
+def _group_by_day(missing, rows):
+    fetched = {key: [] for key in missing}
+    for doctor_id, visit_date in rows:
+        key = (doctor_id, timezone.localtime(visit_date).date())
+        if key in fetched:
+            fetched[key].append(visit_date)
+    return fetched
+
+
+def booked_by_day(doctor_ids, start_date, end_date):
+    """Return {(doctor_id, day): set of booked slots} for every doctor and day in the range.
+
+    Doctor-days already in the cache cost nothing; the rest are fetched
+    together with a single query and cached for the next request.
+    """
+    wanted = _wanted_days(doctor_ids, start_date, end_date)
+    found = caching.get_many("booked", wanted)
+    missing = [key for key in wanted if key not in found]
+    if missing:
+        fetched = _group_by_day(missing, booked_query(*_missing_range(missing)))
+        # Signals drop these entries once a booking commits; the timeout only
+        # bounds how long a read that raced with the commit can keep showing
+        # the slot as free.
+        caching.set_many("booked", fetched, BOOKED_CACHE_TIMEOUT)
+        found.update(fetched)
+    return {key: set(slots) for key, slots in found.items()}
+
+
+async def abooked_by_day(doctor_ids, start_date, end_date):
+    """Async booked_by_day."""
+    wanted = _wanted_days(doctor_ids, start_date, end_date)
+    found = await caching.aget_many("booked", wanted)
+    missing = [key for key in wanted if key not in found]
+    if missing:
+        rows = [row async for row in booked_query(*_missing_range(missing))]
+        fetched = _group_by_day(missing, rows)
+        await caching.aset_many("booked", fetched, BOOKED_CACHE_TIMEOUT)
+        found.update(fetched)
+    return {key: set(slots) for key, slots in found.items()}
+
+
+def _free_by_day(doctor_ids, schedule, start_date, end_date, booked):
+    for day in date_range(start_date, end_date):
+        slots = day_slots(day, schedule)
+        for doctor_id in doctor_ids:
+            taken = booked[doctor_id, day]
+            yield doctor_id, day, [slot for slot in slots if slot not in taken]
+
+
+def free_slots(doctor_ids, schedule, start_date, end_date):
+    """Yield (doctor_id, day, [free slot starts]) for every doctor and day in the range.
+
+    Booked slots come from the cache or from one query for all the missing
+    doctor-days, so the cost of the request does not depend on how many
+    doctors or days are asked for.
+    """
+    booked = booked_by_day(doctor_ids, start_date, end_date)
+    yield from _free_by_day(doctor_ids, schedule, start_date, end_date, booked)
+
+
+async def afree_slots(doctor_ids, schedule, start_date, end_date):
+    """Async free_slots, returned as a list."""
+    booked = await abooked_by_day(doctor_ids, start_date, end_date)
+    return list(_free_by_day(doctor_ids, schedule, start_date, end_date, booked))
+
+
+def _nearest(slots, booked, visit_date, count):
+    free = [slot for slot in slots if slot not in booked]
+    nearest = sorted(free, key=lambda slot: abs(slot - visit_date))[:count]
+    return sorted(nearest)
+
+
+def nearest_free_slots(doctor_id, schedule, visit_date, count=3, booked=None):
+    """Return up to ``count`` free slots of the doctor closest to visit_date, on the same day.
+
+    booked, the doctor's booked slots that day, is looked up if not given.
+    """
+    day = timezone.localtime(visit_date).date()
+    slots = day_slots(day, schedule)
+    if booked is None:
+        booked = booked_by_day([doctor_id], day, day)[doctor_id, day]
+    return _nearest(slots, booked, visit_date, count)
+
+
+async def anearest_free_slots(doctor_id, schedule, visit_date, count=3, booked=None):
+    day = timezone.localtime(visit_date).date()
+    slots = day_slots(day, schedule)
+    if booked is None:
+        booked = (await abooked_by_day([doctor_id], day, day))[doctor_id, day]
+    return _nearest(slots, booked, visit_date, count)
@@ -0,0 +1,195 @@
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, router, transaction
+from django.utils import timezone
+
+from . import caching, doctor_days, feed, rollups, search
+from .availability import abooked_by_day, anearest_free_slots, booked_by_day, booked_slots, nearest_free_slots
+from .models import Appointment, Doctor, Patient
+
+
+class SlotTaken(Exception):
+    """Raised when the doctor already has an appointment at the requested time."""
+
+    def __init__(self, alternatives):
+        super().__init__("This time slot is already taken.")
+        self.alternatives = alternatives
+
+
+def _slot_query(appointment):
+    return Appointment.objects.filter(doctor_id=appointment.doctor_id, visit_date=appointment.visit_date)
+
+
+def _insert(appointment):
+    # The receivers' writes (rollups, search index) commit or roll back with the row
+    using = router.db_for_write(type(appointment), instance=appointment)
+    with transaction.atomic(using=using):
+        appointment.save(force_insert=True, using=using)
+
+
+def book_appointment(appointment, alternatives=3):
+    """Insert the appointment in a single statement.
+
+    Double-booking is left to the ('doctor', 'visit_date') unique constraint
+    instead of an exists() check, so there is no window between the check and
+    the insert. On conflict SlotTaken carries the nearest free slots that day.
+
+    An IntegrityError is only SlotTaken if the slot really is booked;
+    otherwise (a NOT NULL column, an unknown patient on a backend that
+    checks foreign keys immediately) it's re-raised. The doctor's booked
+    slots that day, which the alternatives are picked around, tell: they
+    usually come from the booked cache, so a conflict costs no query after
+    the rollback. Only when they don't show the slot (a cache filled just
+    before the conflicting booking committed) is the table asked.
+    """
+    try:
+        _insert(appointment)
+    except IntegrityError:
+        if appointment.visit_date is None:
+            raise
+        day = timezone.localtime(appointment.visit_date).date()
+        booked = booked_by_day([appointment.doctor_id], day, day)[appointment.doctor_id, day]
+        if appointment.visit_date not in booked and not _slot_query(appointment).exists():
+            raise
+        clinic = caching.clinic_info(appointment.clinic_id)
+        if not clinic or clinic["schedule"] is None:
+            raise SlotTaken([])
+        raise SlotTaken(nearest_free_slots(
+            appointment.doctor_id, clinic["schedule"], appointment.visit_date, alternatives, booked | {appointment.visit_date},
+        ))
+    return appointment
+
+
+async def abook_appointment(appointment, alternatives=3):
+    """Async book_appointment for the ASGI views.
+
+    Async code can't open atomic blocks, so the insert runs in a thread as
+    book_appointment's does. Conflicts are told from other integrity errors
+    the same way.
+    """
+    try:
+        await sync_to_async(_insert)(appointment)
+    except IntegrityError:
+        if appointment.visit_date is None:
+            raise
+        day = timezone.localtime(appointment.visit_date).date()
+        booked = (await abooked_by_day([appointment.doctor_id], day, day))[appointment.doctor_id, day]
+        if appointment.visit_date not in booked and not await _slot_query(appointment).aexists():
+            raise
+        clinic = await caching.aclinic_info(appointment.clinic_id)
+        if not clinic or clinic["schedule"] is None:
+            raise SlotTaken([])
+        raise SlotTaken(await anearest_free_slots(
+            appointment.doctor_id, clinic["schedule"], appointment.visit_date, alternatives, booked | {appointment.visit_date},
+        ))
+    return appointment
+
+
+# -----------------------
+# Batch booking
+# -----------------------
+
+MAX_BATCH = 1000
+BATCH_RETRIES = 3
+
+
+class BookingRequest:
+    """One appointment asked for in a batch, and what became of it."""
+
+    def __init__(self, index, patient_id, doctor_id, clinic_id, visit_date, treatment=None):
+        self.index = index  # position of the request in the batch it came from
+        self.patient_id = patient_id
+        self.doctor_id = doctor_id
+        self.clinic_id = clinic_id
+        self.visit_date = visit_date
+        self.treatment = treatment
+        self.status = None
+        self.error = None
+        self.appointment = None
+
+    def reject(self, status, error):
+        self.status, self.error = status, error
+
+
+def recurring(index, patient_id, doctor_id, clinic_id, first_visit, treatment=None, every=timedelta(weeks=1), count=1):
+    """BookingRequests for ``count`` visits ``every`` apart, e.g. a course of weekly sessions."""
+    return [
+        BookingRequest(index, patient_id, doctor_id, clinic_id, first_visit + i * every, treatment)
+        for i in range(count)
+    ]
+
+
+def _check(requests):
+    """Reject requests for unknown rows, closed slots or taken slots; return the ones left."""
+    def existing(model, ids):
+        return set(model.objects.filter(pk__in=ids).values_list("pk", flat=True))
+
+    patients = existing(Patient, {r.patient_id for r in requests})
+    doctors = existing(Doctor, {r.doctor_id for r in requests})
+    clinics = {pk: caching.clinic_info(pk) for pk in {r.clinic_id for r in requests}}
+    days = [timezone.localtime(r.visit_date).date() for r in requests]
+    # Every appointment of these doctors over the whole batch, in one query
+    taken = booked_slots(doctors, min(days), max(days)) if doctors else set()
+
+    accepted = []
+    for request, day in zip(requests, days):
+        clinic = clinics[request.clinic_id]
+        slot = (request.doctor_id, request.visit_date)
+        if request.patient_id not in patients or request.doctor_id not in doctors or clinic is None:
+            request.reject("invalid", "Unknown patient, doctor or clinic")
+        elif clinic["schedule"] is None:
+            request.reject("invalid", clinic["schedule_error"])
+        elif timezone.localtime(request.visit_date).time() not in clinic["schedule"].slot_times_on(day):
+            request.reject("closed", "The clinic is closed at that time")
+        elif slot in taken:
+            request.reject("conflict", "This time slot is already taken.")
+        else:
+            taken.add(slot)  # later requests of the same batch conflict with this one
+            accepted.append(request)
+    return accepted
+
+
+def book_many(requests):
+    """Book a batch of BookingRequests with one conflict check and one bulk insert.
+
+    Each request ends up "booked" (with its appointment), "conflict",
+    "closed" or "invalid"; a rejected request doesn't stop the others. If a
+    concurrent booking takes one of the slots between the check and the
+    insert, the unique constraint rolls the insert back and the batch is
+    checked again.
+    """
+    if len(requests) > MAX_BATCH:
+        raise ValueError(f"At most {MAX_BATCH} appointments can be booked at once")
+    if not requests:
+        return requests
+    using = router.db_for_write(Appointment)
+    for attempt in range(BATCH_RETRIES):
+        for request in requests:
+            request.status, request.error = None, None
+        accepted = _check(requests)
+        appointments = [
+            Appointment(
+                patient_id=r.patient_id, doctor_id=r.doctor_id, clinic_id=r.clinic_id,
+                visit_date=r.visit_date, treatment=r.treatment,
+            )
+            for r in accepted
+        ]
+        try:
+            with transaction.atomic(using=using):
+                Appointment.objects.using(using).bulk_create(appointments)
+                # bulk_create sends no post_save, so do what the receivers in signals.py would
+                days = {doctor_days.day_of(appointment) for appointment in appointments}
+                caching.invalidate_on_commit("booked", days, using)
+                doctor_days.refresh_on_commit(days, using)
+                rollups.refresh_on_commit(days, using)
+                search.index(Appointment, [appointment.pk for appointment in appointments], using)
+                feed.publish_on_commit((feed.change("booked", appointment) for appointment in appointments), using)
+        except IntegrityError:
+            if attempt == BATCH_RETRIES - 1:
+                raise
+            continue
+        break
+    for request, appointment in zip(accepted, appointments):
+        request.status, request.appointment = "booked", appointment
+    return requests
@@ -0,0 +1,217 @@
+"""Read-through caching for doctor lists, clinic metadata and daily bookings.
+
+Works with whichever backend CACHES configures (local memory, files or a
+local Redis). Entries are dropped by the receivers in signals.py once the
+transaction changing the rows behind them commits, so most of them never
+expire on their own.
+"""
+from threading import Lock
+from urllib.parse import quote
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, Min
+from django.db.models.functions import Lower
+
+from . import metrics
+from .models import Clinic, Doctor
+from .opening_hours import parse_schedule
+
+KEY_PREFIX = "penitansye"
+MISSING = object()
+
+
+class CacheStats:
+    """Hit and miss counters per namespace, for this process."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counts = {}
+
+    def record(self, namespace, hits=0, misses=0):
+        with self._lock:
+            counts = self._counts.setdefault(namespace, [0, 0])
+            counts[0] += hits
+            counts[1] += misses
+        metrics.count_cache(hits, misses)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                namespace: {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_rate": hits / (hits + misses) if hits + misses else None,
+                }
+                for namespace, (hits, misses) in self._counts.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+stats = CacheStats()
+
+
+def make_key(namespace, *parts):
+    return ":".join([KEY_PREFIX, namespace, *(quote(str(part)) for part in parts)])
+
+
+def get_or_set(namespace, parts, compute, timeout=None):
+    """Return the cached value for (namespace, *parts), computing and storing it on a miss."""
+    key = make_key(namespace, *parts)
+    value = cache.get(key, MISSING)
+    if value is MISSING:
+        stats.record(namespace, misses=1)
+        value = compute()
+        cache.set(key, value, timeout)
+    else:
+        stats.record(namespace, hits=1)
+    return value
+
+
+def get_many(namespace, parts_list):
+    """Return {parts: value} for the entries found, in one round trip."""
+    keys = {make_key(namespace, *parts): parts for parts in parts_list}
+    found = cache.get_many(list(keys))
+    stats.record(namespace, hits=len(found), misses=len(keys) - len(found))
+    return {keys[key]: value for key, value in found.items()}
+
+
+def set_many(namespace, values, timeout=None):
+    cache.set_many({make_key(namespace, *parts): value for parts, value in values.items()}, timeout)
+
+
+def invalidate(namespace, *parts):
+    cache.delete(make_key(namespace, *parts))
+
+
+def invalidate_many(namespace, parts_list):
+    """Drop several entries in one round trip."""
+    cache.delete_many([make_key(namespace, *parts) for parts in parts_list])
+
+
+def invalidate_on_commit(namespace, parts_list, using=DEFAULT_DB_ALIAS):
+    """Drop entries once the current transaction commits, or right away outside of one.
+
+    Dropped any earlier, a read in between would cache the rows as they were
+    before the write, until the next write.
+    """
+    parts_list = list(parts_list)
+    if parts_list:
+        transaction.on_commit(lambda: invalidate_many(namespace, parts_list), using, robust=True)
+
+
+async def aget_or_set(namespace, parts, compute, timeout=None):
+    """Async get_or_set; compute is a coroutine function."""
+    key = make_key(namespace, *parts)
+    value = await cache.aget(key, MISSING)
+    if value is MISSING:
+        stats.record(namespace, misses=1)
+        value = await compute()
+        await cache.aset(key, value, timeout)
+    else:
+        stats.record(namespace, hits=1)
+    return value
+
+
+async def aget_many(namespace, parts_list):
+    keys = {make_key(namespace, *parts): parts for parts in parts_list}
+    found = await cache.aget_many(list(keys))
+    stats.record(namespace, hits=len(found), misses=len(keys) - len(found))
+    return {keys[key]: value for key, value in found.items()}
+
+
+async def aset_many(namespace, values, timeout=None):
+    await cache.aset_many({make_key(namespace, *parts): value for parts, value in values.items()}, timeout)
+
+
+# -----------------------
+# Cached reads
+# -----------------------
+
+def specialization_key(specialization):
+    return specialization.strip().casefold()
+
+
+def doctors_with_specialization(specialization):
+    # Compared lower-cased so the lookup is a seek on doctor_spec_lower_idx
+    return Doctor.objects.alias(specialization_lower=Lower("specialization")).filter(
+        specialization_lower=specialization.strip().lower(),
+    )
+
+
+def specialization_counts():
+    """Doctors per specialization, grouped case-insensitively, most common first."""
+    return Doctor.objects.values(key=Lower("specialization")).annotate(
+        specialization=Min("specialization"), count=Count("id"),
+    ).order_by("-count", "key")
+
+
+def doctors_by_specialization(specialization):
+    """Doctors of one specialization (case-insensitive) as plain dicts."""
+    wanted = specialization_key(specialization)
+
+    def load():
+        doctors = doctors_with_specialization(specialization).only(
+            "id", "firstname", "lastname", "specialization", "years_of_experience",
+        ).order_by("lastname", "firstname")
+        return [
+            {
+                "id": doctor.id,
+                "firstname": doctor.firstname,
+                "lastname": doctor.lastname,
+                "specialization": doctor.specialization,
+                "years_of_experience": doctor.years_of_experience,
+            }
+            for doctor in doctors
+        ]
+    return get_or_set("doctors-by-specialization", (wanted,), load)
+
+
+def specialization_facets():
+    """[{"specialization", "count"}] of every specialization, cached until a doctor changes."""
+    def load():
+        return [
+            {"specialization": row["specialization"], "count": row["count"]}
+            for row in specialization_counts()
+        ]
+    return get_or_set("specialization-facets", (), load)
+
+
+def _clinic_info(clinic):
+    if clinic is None:
+        return None
+    try:
+        schedule, schedule_error = parse_schedule(clinic.opening_hours), None
+    except ValueError as exc:
+        schedule, schedule_error = None, str(exc)
+    return {
+        "id": clinic.id,
+        "clinic_name": clinic.clinic_name,
+        "address": clinic.address,
+        "city": clinic.city,
+        "province": clinic.province,
+        "zipcode": clinic.zipcode,
+        "phone": clinic.phone,
+        "email": clinic.email,
+        "opening_hours": clinic.opening_hours,
+        "schedule": schedule,
+        "schedule_error": schedule_error,
+    }
+
+
+def clinic_info(clinic_id):
+    """Clinic metadata with its parsed Schedule, or None if there is no such clinic.
+
+    The opening hours are parsed once per cache fill rather than on every
+    availability request or booking.
+    """
+    return get_or_set("clinic", (clinic_id,), lambda: _clinic_info(Clinic.objects.filter(pk=clinic_id).first()))
+
+
+async def aclinic_info(clinic_id):
+    async def load():
+        return _clinic_info(await Clinic.objects.filter(pk=clinic_id).afirst())
+    return await aget_or_set("clinic", (clinic_id,), load)
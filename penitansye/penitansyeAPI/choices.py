@@ -0,0 +1,22 @@
+from . import caching
+from .models import Clinic, Doctor
+
+
+def doctor_label(doctor):
+    return f"Dr. {doctor.firstname} {doctor.lastname} - {doctor.specialization}"
+
+
+def doctor_choices():
+    """(id, label) of every doctor, cached until a doctor is saved or deleted."""
+    def load():
+        doctors = Doctor.objects.only("id", "firstname", "lastname", "specialization").order_by("lastname", "firstname")
+        return [(doctor.id, doctor_label(doctor)) for doctor in doctors]
+    return caching.get_or_set("doctor-choices", (), load)
+
+
+def clinic_choices():
+    """(id, label) of every clinic, cached until a clinic is saved or deleted."""
+    def load():
+        clinics = Clinic.objects.only("id", "clinic_name", "city").order_by("clinic_name")
+        return [(clinic.id, str(clinic)) for clinic in clinics]
+    return caching.get_or_set("clinic-choices", (), load)
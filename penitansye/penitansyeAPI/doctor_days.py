@@ -0,0 +1,122 @@
+"""Materialized day schedules: one DoctorDay row per doctor and local day with appointments.
+
+A day or week view is then one range read on the (doctor, day) unique
+index. The receivers in signals.py refresh the days an appointment save
+or delete touches once its transaction commits, outside the write lock.
+Writes that skip the signals (bulk_create, queryset updates) call
+refresh() themselves or are caught up by manage.py rebuild_doctor_days,
+which also checks the table.
+
+Past appointments become records (pipeline.py) and old records move to
+the archive, so past days are built from the booked records of both as
+well: the day keeps showing who was booked, and who came.
+"""
+import heapq
+import operator
+from datetime import datetime, time, timedelta
+from functools import reduce
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Appointment, ArchivedRecord, DoctorDay, Record
+
+DELETE_BATCH = 500
+ENTRY_FIELDS = ("doctor_id", "id", "visit_date", "patient_id", "patient__firstname", "patient__lastname",
+                "clinic_id", "treatment")
+
+
+def _bounds(first_day, last_day):
+    start = timezone.make_aware(datetime.combine(first_day, time.min))
+    end = timezone.make_aware(datetime.combine(last_day + timedelta(days=1), time.min))
+    return start, end
+
+
+def _visits(queryset, doctor_ids, first_day, last_day, *fields):
+    if doctor_ids is not None:
+        queryset = queryset.filter(doctor_id__in=doctor_ids)
+    if first_day is not None:
+        start, end = _bounds(first_day, last_day)
+        queryset = queryset.filter(visit_date__gte=start, visit_date__lt=end)
+    return queryset.order_by("doctor_id", "visit_date").values_list(*ENTRY_FIELDS, *fields).iterator(chunk_size=5000)
+
+
+def entries(doctor_ids=None, first_day=None, last_day=None):
+    """ENTRY_FIELDS plus a status ("booked", "visited" or "no_show") of the visits to materialize, by doctor and time."""
+    appointments = ((*row, "booked") for row in _visits(Appointment.objects.all(), doctor_ids, first_day, last_day))
+    # Only past days have records of appointments; the booking path reads one table
+    if first_day is not None and first_day >= timezone.localdate():
+        return appointments
+    records = (
+        (*row[:-1], "no_show" if row[-1] else "visited")
+        for model in (Record, ArchivedRecord)
+        for row in _visits(model.objects.filter(booked=True), doctor_ids, first_day, last_day, "no_show")
+    )
+    return heapq.merge(appointments, records, key=lambda row: (row[0], row[2]))
+
+
+def group_days(rows):
+    """{(doctor_id, day): [entry, ...]} from rows of entries()."""
+    days = {}
+    # Looked up once: timezone.localtime() would do it for every row
+    tz = timezone.get_current_timezone()
+    for doctor_id, pk, visit_date, patient_id, firstname, lastname, clinic_id, treatment, status in rows:
+        local = visit_date.astimezone(tz)
+        days.setdefault((doctor_id, local.date()), []).append({
+            "id": pk,
+            "time": f"{local.hour:02d}:{local.minute:02d}",
+            "patient": patient_id,
+            "patient_name": f"{firstname} {lastname}",
+            "clinic": clinic_id,
+            "treatment": treatment,
+            "status": status,
+        })
+    return days
+
+
+def save_days(days, empty=()):
+    """Upsert the DoctorDay rows of days and delete those of the (doctor_id, day) in empty."""
+    if days:
+        DoctorDay.objects.bulk_create(
+            [DoctorDay(doctor_id=doctor_id, day=day, appointments=entries) for (doctor_id, day), entries in days.items()],
+            update_conflicts=True, unique_fields=["doctor", "day"], update_fields=["appointments", "updated_at"],
+        )
+    empty = list(empty)
+    # In batches: SQLite refuses an OR of more than 1000 terms
+    for i in range(0, len(empty), DELETE_BATCH):
+        DoctorDay.objects.filter(
+            reduce(operator.or_, (Q(doctor_id=doctor_id, day=day) for doctor_id, day in empty[i:i + DELETE_BATCH]))
+        ).delete()
+
+
+def refresh(pairs):
+    """Recompute the DoctorDay rows of the given (doctor_id, day) pairs."""
+    pairs = set(pairs)
+    if not pairs:
+        return
+    doctor_ids = {doctor_id for doctor_id, _ in pairs}
+    first_day, last_day = min(day for _, day in pairs), max(day for _, day in pairs)
+    found = group_days(entries(doctor_ids, first_day, last_day))
+    save_days({pair: day for pair, day in found.items() if pair in pairs}, pairs - found.keys())
+
+
+def refresh_on_commit(pairs, using=DEFAULT_DB_ALIAS):
+    """refresh() once the current transaction commits."""
+    pairs = set(pairs)
+    if pairs:
+        transaction.on_commit(lambda: refresh(pairs), using)
+
+
+def day_of(appointment):
+    return appointment.doctor_id, timezone.localtime(appointment.visit_date).date()
+
+
+def doctor_days(doctor_id, first_day, days=1):
+    """[(day, entries)] of a doctor for days from first_day, from one indexed query."""
+    last_day = first_day + timedelta(days=days - 1)
+    stored = dict(
+        DoctorDay.objects.filter(doctor_id=doctor_id, day__gte=first_day, day__lte=last_day)
+        .values_list("day", "appointments")
+    )
+    return [(day, stored.get(day, [])) for day in (first_day + timedelta(days=i) for i in range(days))]
@@ -0,0 +1,121 @@
+"""Streaming CSV and NDJSON exports of appointments and records.
+
+Rows come from a values_list() projection over one join, read with
+iterator() so only CHUNK_SIZE of them are held at a time, and leave as text
+chunks; memory stays flat however many rows are exported. Records are read
+from Record and ArchivedRecord together, merged in visit order.
+"""
+import csv
+import heapq
+import io
+import json
+import zlib
+from datetime import date, datetime, time, timedelta
+
+from django.utils import timezone
+
+from .models import Appointment, ArchivedRecord, Record
+
+CHUNK_SIZE = 2000
+FORMATS = ("csv", "ndjson")
+# The tables each kind is read from
+MODELS = {"appointments": (Appointment,), "records": (Record, ArchivedRecord)}
+EXPORT_FIELDS = (
+    "id", "visit_date", "treatment",
+    "patient_id", "patient__firstname", "patient__lastname",
+    "doctor_id", "doctor__firstname", "doctor__lastname", "doctor__specialization",
+    "clinic_id", "clinic__clinic_name", "clinic__city",
+)
+# Column names in the output, e.g. "patient__firstname" -> "patient_firstname"
+EXPORT_COLUMNS = tuple(field.replace("__", "_") for field in EXPORT_FIELDS)
+CONTENT_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def export_params(params):
+    """Return the filters of an export as keyword arguments for export_querysets; raise ValueError."""
+    filters = {}
+    for name in ("doctor", "clinic", "patient"):
+        if params.get(name):
+            filters[name] = int(params[name])
+    for name in ("start", "end"):
+        if params.get(name):
+            filters[name] = date.fromisoformat(params[name])
+    if "start" in filters and "end" in filters and filters["end"] < filters["start"]:
+        raise ValueError("end must not be before start")
+    return filters
+
+
+def export_queryset(model, doctor=None, clinic=None, patient=None, start=None, end=None):
+    """Visits from start to end (inclusive, local dates) as tuples of EXPORT_FIELDS, oldest first."""
+    queryset = model.objects.all()
+    for name, pk in (("doctor", doctor), ("clinic", clinic), ("patient", patient)):
+        if pk is not None:
+            queryset = queryset.filter(**{f"{name}_id": pk})
+    if start is not None:
+        queryset = queryset.filter(visit_date__gte=timezone.make_aware(datetime.combine(start, time.min)))
+    if end is not None:
+        queryset = queryset.filter(visit_date__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)))
+    return queryset.order_by("visit_date", "id").values_list(*EXPORT_FIELDS)
+
+
+def export_querysets(kind, **filters):
+    """export_queryset of each table the kind is read from."""
+    return [export_queryset(model, **filters) for model in MODELS[kind]]
+
+
+def _chunks(rows, size=CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    for chunk in _chunks(rows):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(rows):
+    visit_date = EXPORT_FIELDS.index("visit_date")
+    dumps = json.JSONEncoder(ensure_ascii=False).encode
+    for chunk in _chunks(rows):
+        lines = []
+        for row in chunk:
+            row = list(row)
+            row[visit_date] = row[visit_date].isoformat()
+            lines.append(dumps(dict(zip(EXPORT_COLUMNS, row))))
+        yield "\n".join(lines) + "\n"
+
+
+def gzip_chunks(chunks, level=6):
+    """Gzip text chunks on the fly, yielding the compressed bytes as they come."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip header and trailer
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode())
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def _position(row, visit_date=EXPORT_FIELDS.index("visit_date"), pk=EXPORT_FIELDS.index("id")):
+    return row[visit_date], row[pk]
+
+
+def export(querysets, format="csv", gzip=False):
+    """The export of the querysets from export_querysets, as an iterator of str, or bytes when gzipped."""
+    if format not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    rows = heapq.merge(*(queryset.iterator(chunk_size=CHUNK_SIZE) for queryset in querysets), key=_position)
+    chunks = csv_chunks(rows) if format == "csv" else ndjson_chunks(rows)
+    return gzip_chunks(chunks) if gzip else chunks
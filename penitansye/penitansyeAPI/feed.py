@@ -0,0 +1,307 @@
+"""Live slot changes for availability screens, served as Server-Sent Events.
+
+Saving or deleting an Appointment publishes "booked" and "freed" events
+once its transaction commits (see signals.py; book_many publishes its
+own). Screens subscribe through slotFeedView instead of polling
+availability, each for some doctors or a clinic.
+
+Every event is serialized once, when published, and each worker fans it
+out to its subscribers in memory. With settings.FEED_BACKEND "local" (the
+default) a worker only sees the bookings it served itself, so deployments
+with several workers use "redis": events are appended to a Redis stream
+at REDIS_URL, which one task per worker reads for all its subscribers.
+
+Event ids grow with every event. A client reconnecting with Last-Event-ID
+gets the events it missed from the last FEED_HISTORY kept, or, when they
+are gone, a "reset" event telling it to reload availability.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from threading import Lock
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 3000
+# A subscriber this many events behind is sent "reset" instead of them
+MAX_PENDING = 1000
+STREAM = "penitansye:slots"
+
+
+def change(kind, appointment):
+    """The (kind, appointment id, doctor id, clinic id, visit date) an appointment publishes."""
+    return kind, appointment.pk, appointment.doctor_id, appointment.clinic_id, appointment.visit_date
+
+
+def _key(event_id):
+    """Event ids, "<int>-<int>" for both backends, as comparable tuples; ValueError if malformed."""
+    first, _, second = event_id.partition("-")
+    return int(first), int(second)
+
+
+class Event:
+    __slots__ = ("id", "kind", "doctor", "clinic", "frame")
+
+    def __init__(self, event_id, kind, appointment, doctor, clinic, visit_date):
+        self.id, self.kind, self.doctor, self.clinic = event_id, kind, doctor, clinic
+        data = json.dumps({"appointment": appointment, "doctor": doctor, "clinic": clinic, "visit_date": visit_date})
+        self.frame = f"id: {event_id}\nevent: {kind}\ndata: {data}\n\n"
+
+    @classmethod
+    def reset(cls, event_id):
+        event = cls.__new__(cls)
+        event.id, event.kind, event.doctor, event.clinic = event_id, "reset", None, None
+        event.frame = f"id: {event_id}\nevent: reset\ndata: {{}}\n\n"
+        return event
+
+
+class Subscriber:
+    """One open feed: the events for its doctors and clinic waiting to be sent, on its event loop."""
+
+    def __init__(self, doctors=None, clinic=None):
+        self.doctors = set(doctors) if doctors else None
+        self.clinic = clinic
+        self.loop = asyncio.get_running_loop()
+        self.pending = deque()
+        self.ready = asyncio.Event()
+
+    def wants(self, event):
+        if event.kind == "reset":
+            return True
+        return (self.doctors is None or event.doctor in self.doctors) and (self.clinic is None or event.clinic == self.clinic)
+
+    def deliver(self, events):
+        """Queue events from any thread; False once the subscriber's loop is gone."""
+        try:
+            self.loop.call_soon_threadsafe(self.put, events)
+        except RuntimeError:  # the loop was closed
+            return False
+        return True
+
+    def put(self, events):
+        events = [event for event in events if self.wants(event)]
+        if not events:
+            return
+        if len(self.pending) + len(events) > MAX_PENDING:
+            # Too slow to keep up: the client reloads instead of catching up
+            self.pending.clear()
+            self.pending.append(Event.reset(events[-1].id))
+        else:
+            self.pending.extend(events)
+        self.ready.set()
+
+    async def next_events(self, timeout):
+        """The events pending, waiting up to timeout seconds for some; [] on timeout."""
+        if not self.pending:
+            self.ready.clear()
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        events = list(self.pending)
+        self.pending.clear()
+        return events
+
+
+class LocalBroadcaster:
+    """Events of this process only; ids are "<start time in ms>-<number>"."""
+
+    def __init__(self, history):
+        self._lock = Lock()
+        self._started = int(time.time() * 1000)
+        self._number = 0
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+
+    def publish(self, changes):
+        with self._lock:
+            events = []
+            for kind, appointment, doctor, clinic, visit_date in changes:
+                self._number += 1
+                events.append(Event(f"{self._started}-{self._number}", kind, appointment, doctor, clinic, visit_date.isoformat()))
+            self._history.extend(events)
+            subscribers = list(self._subscribers)
+        self._fan_out(subscribers, events)
+
+    def _fan_out(self, subscribers, events):
+        for subscriber in subscribers:
+            if not subscriber.deliver(events):
+                self.unsubscribe(subscriber)
+
+    async def head(self):
+        """The id of the latest event."""
+        return f"{self._started}-{self._number}"
+
+    async def since(self, event_id):
+        """The events after event_id, or None if some of them are no longer kept."""
+        started, number = _key(event_id)
+        with self._lock:
+            first = self._history[0].id if self._history else f"{self._started}-{self._number + 1}"
+            if started != self._started or not _key(first)[1] - 1 <= number <= self._number:
+                return None
+            return [event for event in self._history if _key(event.id)[1] > number]
+
+    async def subscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.add(subscriber)
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+
+class RedisBroadcaster(LocalBroadcaster):
+    """Events of every worker, through a Redis stream trimmed to about FEED_HISTORY entries.
+
+    Ids are the stream's. Each worker reads the stream in one task and fans
+    the events out to its subscribers.
+    """
+
+    def __init__(self, history, url):
+        super().__init__(history)
+        import redis  # only needed with this backend, as for the Redis cache
+        import redis.asyncio
+
+        self._max_len = history
+        self._no_stream = redis.ResponseError
+        self._client = redis.Redis.from_url(url)
+        self._async_client = redis.asyncio.Redis.from_url(url)
+        self._reader = None
+
+    def publish(self, changes):
+        pipe = self._client.pipeline(transaction=False)
+        for kind, appointment, doctor, clinic, visit_date in changes:
+            pipe.xadd(STREAM, {
+                "kind": kind, "appointment": appointment, "doctor": doctor, "clinic": clinic,
+                "visit_date": visit_date.isoformat(),
+            }, maxlen=self._max_len, approximate=True)
+        pipe.execute()
+
+    @staticmethod
+    def _event(entry_id, fields):
+        fields = {key.decode(): value.decode() for key, value in fields.items()}
+        return Event(
+            entry_id.decode(), fields["kind"], int(fields["appointment"]), int(fields["doctor"]),
+            int(fields["clinic"]), fields["visit_date"],
+        )
+
+    async def _info(self):
+        try:
+            return await self._async_client.xinfo_stream(STREAM)
+        except self._no_stream:  # nothing was published yet
+            return None
+
+    @staticmethod
+    def _id(value):
+        return value.decode() if isinstance(value, bytes) else value
+
+    async def head(self):
+        info = await self._info()
+        return self._id(info["last-generated-id"]) if info else "0-0"
+
+    async def since(self, event_id):
+        key = _key(event_id)
+        info = await self._info()
+        if info is None:
+            return [] if key == (0, 0) else None
+        # Trimmed entries leave max-deleted-entry-id behind (Redis 7)
+        if not _key(self._id(info.get("max-deleted-entry-id", "0-0"))) <= key <= _key(self._id(info["last-generated-id"])):
+            return None
+        entries = await self._async_client.xrange(STREAM, min=f"({event_id}", max="+")
+        return [self._event(entry_id, fields) for entry_id, fields in entries]
+
+    async def subscribe(self, subscriber):
+        if self._reader is None or self._reader.done():
+            # Read from the current head on, before the subscriber asks for
+            # what it missed, so that nothing falls in between
+            self._reader = asyncio.create_task(self._read(await self.head()))
+        await super().subscribe(subscriber)
+
+    async def _read(self, last):
+        while True:
+            try:
+                response = await self._async_client.xread({STREAM: last}, block=HEARTBEAT_SECONDS * 1000, count=500)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Reading the slot feed from Redis failed; retrying")
+                # Events may have been missed meanwhile
+                with self._lock:
+                    subscribers = list(self._subscribers)
+                self._fan_out(subscribers, [Event.reset(last)])
+                await asyncio.sleep(1)
+                continue
+            for _, entries in response:
+                events = [self._event(entry_id, fields) for entry_id, fields in entries]
+                last = events[-1].id
+                with self._lock:
+                    subscribers = list(self._subscribers)
+                for subscriber in subscribers:
+                    subscriber.put(events)
+
+
+_broadcaster = None
+_broadcaster_lock = Lock()
+
+
+def broadcaster():
+    """This process's broadcaster, as settings.FEED_BACKEND selects."""
+    global _broadcaster
+    with _broadcaster_lock:
+        if _broadcaster is None:
+            if settings.FEED_BACKEND == "redis":
+                _broadcaster = RedisBroadcaster(settings.FEED_HISTORY, settings.REDIS_URL)
+            else:
+                _broadcaster = LocalBroadcaster(settings.FEED_HISTORY)
+        return _broadcaster
+
+
+def publish_on_commit(changes, using=DEFAULT_DB_ALIAS):
+    """Publish changes (see change()) once the current transaction commits, and not if it rolls back.
+
+    The write has committed by then: a broadcaster that fails (Redis down)
+    is logged rather than turning the saved booking into an error.
+    """
+    changes = list(changes)
+    if changes:
+        transaction.on_commit(lambda: broadcaster().publish(changes), using, robust=True)
+
+
+async def stream(doctors=None, clinic=None, last_event_id=None, heartbeat=HEARTBEAT_SECONDS):
+    """The text/event-stream of a subscriber, starting after last_event_id if given."""
+    feed = broadcaster()
+    subscriber = Subscriber(doctors, clinic)
+    await feed.subscribe(subscriber)
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        last = None
+        if last_event_id:
+            try:
+                missed = await feed.since(last_event_id)
+            except ValueError:  # not one of our ids
+                missed = None
+            if missed is None:
+                yield Event.reset(await feed.head()).frame
+            else:
+                missed = [event for event in missed if subscriber.wants(event)]
+                if missed:
+                    last = _key(missed[-1].id)
+                    yield "".join(event.frame for event in missed)
+        while True:
+            events = await subscriber.next_events(heartbeat)
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            if last is not None:
+                # Those published while the missed ones were looked up came twice
+                events = [event for event in events if event.kind == "reset" or _key(event.id) > last]
+            if events:
+                yield "".join(event.frame for event in events)
+    finally:
+        feed.unsubscribe(subscriber)
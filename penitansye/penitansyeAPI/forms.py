@@ -5,7 +5,10 @@ from django import forms
 from .models import Appointment, Patient
 
 from django import forms
-from .models import Patient
+from django.urls import reverse
+from django.utils.choices import BaseChoiceIterator
+from .models import Patient, Doctor, Clinic
+from .choices import clinic_choices, doctor_choices
 
 class PatientForm(forms.ModelForm):
     password = forms.CharField(widget=forms.PasswordInput)
@@ -23,7 +26,63 @@ class PatientForm(forms.ModelForm):
         return patient
 
 
+class SearchInput(forms.HiddenInput):
+    """Hidden id input paired with a search-as-you-type box fed by a JSON endpoint.
+
+    Nothing is loaded when the form renders except, when the field has a
+    value, the label of that one row.
+    """
+    template_name = "penitansyeAPI/widgets/search_input.html"
+
+    def __init__(self, search_url, label_for, attrs=None):
+        super().__init__(attrs)
+        self.search_url = search_url
+        self.label_for = label_for
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context["widget"]["search_url"] = reverse(self.search_url)
+        context["widget"]["label"] = self.label_for(value) if value not in (None, "") else ""
+        return context
+
+
+class CachedChoices(BaseChoiceIterator):
+    # A BaseChoiceIterator is left lazy by Django, so nothing is loaded until the widget renders
+    def __init__(self, field):
+        self.field = field
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        yield from self.field.load_choices()
+
+
+class CachedModelChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField whose options come from a cached (id, label) list instead of a query."""
+
+    def __init__(self, queryset, load_choices, **kwargs):
+        self.load_choices = load_choices
+        super().__init__(queryset, **kwargs)
+
+    def _get_choices(self):
+        return CachedChoices(self)
+
+    choices = property(_get_choices, forms.ChoiceField.choices.fset)
+
+
+def patient_label(pk):
+    patient = Patient.objects.filter(pk=pk).only("firstname", "lastname", "email").first()
+    return f"{patient.firstname} {patient.lastname} <{patient.email}>" if patient else ""
+
+
 class AppointmentForm(forms.ModelForm):
+    patient = forms.ModelChoiceField(
+        queryset=Patient.objects.all(),
+        widget=SearchInput("penitansye:patient_search", patient_label),
+    )
+    doctor = CachedModelChoiceField(Doctor.objects.all(), doctor_choices)
+    clinic = CachedModelChoiceField(Clinic.objects.all(), clinic_choices)
+
     class Meta:
         model = Appointment
         fields = [
@@ -36,3 +95,9 @@ class AppointmentForm(forms.ModelForm):
         widgets = {
             "visit_date": forms.DateTimeInput(attrs={"type": "datetime-local"}),
         }
+
+    def validate_unique(self):
+        # Double-booking is caught by the database constraint when the
+        # appointment is inserted (see booking.book_appointment); checking it
+        # here would cost a query and still leave a race window.
+        pass
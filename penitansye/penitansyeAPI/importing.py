@@ -0,0 +1,128 @@
+"""Bulk import of patients from a partner clinic's CSV export.
+
+Rows are validated and inserted a batch at a time: one query finds the
+emails already taken, one bulk_create inserts the rest. The per-row cost
+left is the password hash (PBKDF2 is slow on purpose), which is either
+spread over a process pool or skipped by importing the accounts with
+unusable passwords, to be set through a password reset on first login.
+"""
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import search
+from .models import Patient
+
+IMPORT_FIELDS = (
+    "firstname", "lastname", "date_of_birth", "phone", "email",
+    "emmergencycontactname", "emmergencycontactphone", "bloodType", "Allergies", "symptoms",
+)
+PASSWORD_MODES = ("hash", "unusable")
+CONFLICT_MODES = ("skip", "update")
+# Columns refreshed on an existing patient with on_conflict="update"; never the password
+UPDATE_FIELDS = [field for field in IMPORT_FIELDS if field != "email"]
+
+
+def _hash_all(passwords, pool):
+    if pool is None:
+        return [make_password(password) for password in passwords]
+    return list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // 64)))
+
+
+class PatientImport:
+    """Imports batches of CSV rows (dicts keyed by IMPORT_FIELDS and "password"), keeping the tallies.
+
+    A row that fails is recorded in errors as (line, email, message) and the
+    rest of its batch goes on. pool is a concurrent.futures executor to hash
+    passwords in, or None to hash in this process.
+    """
+
+    def __init__(self, passwords="hash", on_conflict="skip", pool=None):
+        if passwords not in PASSWORD_MODES:
+            raise ValueError(f"passwords must be one of {', '.join(PASSWORD_MODES)}")
+        if on_conflict not in CONFLICT_MODES:
+            raise ValueError(f"on_conflict must be one of {', '.join(CONFLICT_MODES)}")
+        self.passwords = passwords
+        self.on_conflict = on_conflict
+        self.pool = pool
+        self.seen = set()  # emails imported so far, to catch duplicates across batches
+        self.imported = 0
+        self.updated = 0
+        self.errors = []
+
+    def _clean(self, row):
+        patient = Patient(**{field: (row.get(field) or "").strip() or None for field in IMPORT_FIELDS})
+        patient.email = Patient.objects.normalize_email(patient.email or "")
+        # validate_unique would cost a query per row; emails are checked a batch at a time
+        patient.full_clean(exclude=["password"], validate_unique=False, validate_constraints=False)
+        if patient.email in self.seen:
+            raise ValidationError({"email": f"Duplicate email {patient.email} in the import."})
+        self.seen.add(patient.email)
+        return patient
+
+    def _validate(self, numbered_rows):
+        valid = []
+        for line, row in numbered_rows:
+            try:
+                patient = self._clean(row)
+            except ValidationError as exc:
+                messages = exc.message_dict
+                text = "; ".join(f"{field}: {' '.join(errors)}" for field, errors in messages.items())
+                self.errors.append((line, row.get("email"), text))
+                continue
+            valid.append((line, patient, row.get("password") or None))
+        return valid
+
+    def import_batch(self, numbered_rows):
+        """Validate, hash and insert one batch of (line number, row) pairs."""
+        valid = self._validate(numbered_rows)
+        existing = set(
+            Patient.objects.filter(email__in=[patient.email for _, patient, _ in valid]).values_list("email", flat=True)
+        )
+        new = [(patient, password) for _, patient, password in valid if patient.email not in existing]
+        if self.on_conflict == "skip":
+            for line, patient, _ in valid:
+                if patient.email in existing:
+                    self.errors.append((line, patient.email, "email: A patient with this email already exists."))
+            patients = [patient for patient, _ in new]
+        else:
+            # Existing patients keep their password: it isn't among UPDATE_FIELDS
+            patients = [patient for _, patient, _ in valid]
+
+        # make_password(None) is an unusable password, as for rows without one
+        unusable = make_password(None)
+        if self.passwords == "hash":
+            hashes = _hash_all([password for _, password in new], self.pool)
+        else:
+            hashes = [unusable] * len(new)
+        for (patient, _), encoded in zip(new, hashes):
+            patient.password = encoded
+
+        with transaction.atomic():
+            if self.on_conflict == "update":
+                for patient in patients:
+                    patient.password = patient.password or unusable
+                Patient.objects.bulk_create(
+                    patients, update_conflicts=True, unique_fields=["email"], update_fields=UPDATE_FIELDS,
+                )
+            else:
+                # A concurrent insert of the same email is skipped rather than failing the batch
+                Patient.objects.bulk_create(patients, ignore_conflicts=True)
+            # bulk_create sends no post_save, and ignore_conflicts leaves the pks unset
+            rows = list(Patient.objects.filter(
+                email__in=[patient.email for patient in patients]
+            ).values_list("pk", "email", "password"))
+            search.index(Patient, [pk for pk, _, _ in rows])
+        # A row this batch inserted has the password set above: hashes are salted and
+        # the unusable one is random, so a row inserted concurrently (skipped, or
+        # updated) has another
+        ours = {(patient.email, patient.password) for patient, _ in new}
+        inserted = {email for _, email, password in rows if (email, password) in ours}
+        self.imported += len(inserted)
+        if self.on_conflict == "update":
+            self.updated += len(patients) - len(inserted)
+        else:
+            for line, patient, _ in valid:
+                if patient.email not in existing and patient.email not in inserted:
+                    message = "email: A patient with this email was added during the import."
+                    self.errors.append((line, patient.email, message))
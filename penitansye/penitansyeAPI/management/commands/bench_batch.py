@@ -0,0 +1,85 @@
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from penitansyeAPI.booking import SlotTaken, BookingRequest, book_appointment, book_many
+from penitansyeAPI.models import Appointment
+
+from .bench_booking import BENCH_PREFIX
+from .bench_booking import Command as BookingBench
+
+
+class Command(BaseCommand):
+    help = (
+        "Book the same recurring appointments one at a time with book_appointment "
+        "and in batches with book_many, and compare throughput. About one in ten "
+        "slots is already taken, so both paths also pay for conflicts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--appointments", type=int, default=5000)
+        parser.add_argument("--batch-size", type=int, nargs="+", default=[10, 100, 1000])
+        parser.add_argument("--doctors", type=int, default=10)
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        clinic, doctors, patient = BookingBench().fixtures(using, options["doctors"])
+        first_day = timezone.localdate() + timedelta(days=1)
+        midnight = timezone.make_aware(datetime.combine(first_day, datetime.min.time()))
+        # Weekly series: each doctor keeps one slot of the day for the same patient, week after week
+        slots = [
+            (doctors[n % len(doctors)], midnight + timedelta(hours=8, minutes=30 * (n // len(doctors) % 18),
+                                                             weeks=n // (18 * len(doctors))))
+            for n in range(options["appointments"])
+        ]
+
+        def requests():
+            return [
+                BookingRequest(n, patient.pk, doctor.pk, clinic.pk, visit_date, BENCH_PREFIX)
+                for n, (doctor, visit_date) in enumerate(slots)
+            ]
+
+        def pre_book():
+            Appointment.objects.using(using).filter(treatment=BENCH_PREFIX).delete()
+            Appointment.objects.using(using).bulk_create(
+                Appointment(patient=patient, doctor=doctor, clinic=clinic, visit_date=visit_date,
+                            treatment=BENCH_PREFIX)
+                for doctor, visit_date in slots[::10]
+            )
+
+        self.stdout.write(f"database: {using} ({connections[using].vendor}), {len(slots)} appointments")
+        self.stdout.write(f"{'path':<18} {'booked':>7} {'taken':>6} {'seconds':>8} {'per s':>8}")
+
+        pre_book()
+        booked = taken = 0
+        started = time.perf_counter()
+        for request in requests():
+            try:
+                book_appointment(Appointment(
+                    patient_id=request.patient_id, doctor_id=request.doctor_id, clinic_id=request.clinic_id,
+                    visit_date=request.visit_date, treatment=request.treatment,
+                ))
+                booked += 1
+            except SlotTaken:
+                taken += 1
+        self.report("one at a time", booked, taken, time.perf_counter() - started)
+
+        for size in options["batch_size"]:
+            pre_book()
+            batch = requests()
+            started = time.perf_counter()
+            for i in range(0, len(batch), size):
+                book_many(batch[i:i + size])
+            booked = sum(request.status == "booked" for request in batch)
+            self.report(f"batches of {size}", booked, len(batch) - booked, time.perf_counter() - started)
+
+        Appointment.objects.using(using).filter(treatment=BENCH_PREFIX).delete()
+
+    def report(self, path, booked, taken, elapsed):
+        self.stdout.write(
+            f"{path:<18} {booked:>7} {taken:>6} {elapsed:>8.2f} {(booked + taken) / elapsed:>8.0f}"
+        )
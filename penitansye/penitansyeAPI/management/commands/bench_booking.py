@@ -0,0 +1,118 @@
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from django.utils import timezone
+
+from penitansyeAPI.booking import SlotTaken, book_appointment
+from penitansyeAPI.models import Appointment, Clinic, Doctor, Patient
+
+BENCH_PREFIX = "bench-booking"
+
+
+class Command(BaseCommand):
+    help = (
+        "Book appointments from many threads at once and report throughput and "
+        "conflict rate. Use --database to point it at another DATABASES alias, "
+        "e.g. a local PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=50)
+        parser.add_argument("--attempts", type=int, default=20, help="Bookings tried by each writer")
+        parser.add_argument("--doctors", type=int, default=10)
+        parser.add_argument("--days", type=int, default=5, help="Clinic days the writers compete for")
+        parser.add_argument("--database", default="default")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        clinic, doctors, patient = self.fixtures(using, options["doctors"])
+        first_day = timezone.localdate() + timedelta(days=1)
+        slots = [
+            timezone.make_aware(datetime.combine(first_day + timedelta(days=d), datetime.min.time()))
+            + timedelta(hours=8, minutes=30 * s)
+            for d in range(options["days"])
+            for s in range(18)
+        ]
+        counts = {"booked": 0, "taken": 0, "errors": 0}
+        lock = threading.Lock()
+        start_barrier = threading.Barrier(options["writers"])
+
+        def writer(n):
+            rng = random.Random(options["seed"] + n)
+            local = {"booked": 0, "taken": 0, "errors": 0}
+            start_barrier.wait()
+            try:
+                for _ in range(options["attempts"]):
+                    appointment = Appointment(
+                        patient=patient,
+                        doctor=rng.choice(doctors),
+                        clinic=clinic,
+                        visit_date=rng.choice(slots),
+                        treatment=BENCH_PREFIX,
+                    )
+                    try:
+                        book_appointment(appointment)
+                        local["booked"] += 1
+                    except SlotTaken:
+                        local["taken"] += 1
+                    except OperationalError:
+                        # e.g. "database is locked" on SQLite
+                        local["errors"] += 1
+            finally:
+                connections.close_all()
+                with lock:
+                    for key, value in local.items():
+                        counts[key] += value
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(options["writers"])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        attempts = sum(counts.values())
+        vendor = connections[using].vendor
+        self.stdout.write(f"database:        {using} ({vendor})")
+        self.stdout.write(f"writers:         {options['writers']}")
+        self.stdout.write(f"attempts:        {attempts} in {elapsed:.2f}s ({attempts / elapsed:.0f}/s)")
+        self.stdout.write(f"booked:          {counts['booked']} ({counts['booked'] / elapsed:.0f}/s)")
+        self.stdout.write(f"conflict rate:   {counts['taken'] / attempts:.1%}")
+        self.stdout.write(f"errors:          {counts['errors']}")
+
+        Appointment.objects.using(using).filter(treatment=BENCH_PREFIX).delete()
+
+    def fixtures(self, using, n_doctors):
+        clinic, _ = Clinic.objects.using(using).get_or_create(
+            clinic_name=BENCH_PREFIX,
+            defaults=dict(
+                address="1 Bench St", city="Bench", province="Bench", zipcode="00000",
+                phone="000", email=f"{BENCH_PREFIX}@example.com", opening_hours="8AM-5PM",
+            ),
+        )
+        patient, _ = Patient.objects.using(using).get_or_create(
+            email=f"{BENCH_PREFIX}-patient@example.com",
+            defaults=dict(
+                firstname="Bench", lastname="Patient", date_of_birth=date(1990, 1, 1),
+                emmergencycontactname="Bench", emmergencycontactphone="000",
+                bloodType="O+", Allergies="None",
+            ),
+        )
+        doctors = [
+            Doctor.objects.using(using).get_or_create(
+                email=f"{BENCH_PREFIX}-doctor-{i}@example.com",
+                defaults=dict(
+                    firstname="Bench", lastname=f"Doctor{i}", date_of_birth=date(1980, 1, 1),
+                    specialization="General", licence_number=f"BENCH{i}", years_of_experience=1,
+                ),
+            )[0]
+            for i in range(n_doctors)
+        ]
+        Appointment.objects.using(using).filter(treatment=BENCH_PREFIX).delete()
+        return clinic, doctors, patient
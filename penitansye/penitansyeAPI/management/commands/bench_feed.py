@@ -0,0 +1,152 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from penitansyeAPI.models import Appointment
+
+from .loadtest import percentiles
+
+FEED_PATH = "/api/async/availability/feed/"
+BOOK_PATH = "/api/async/appointments/book/"
+# Far enough ahead not to collide with real bookings; deleted afterwards
+FIRST_VISIT = datetime(2099, 1, 5, 9)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure how many slot feed subscribers one ASGI worker (e.g. uvicorn "
+        "penitansye.asgi:application) holds: open 100, 1000 and 5000 feeds, book "
+        "appointments through the async booking view, and time until every feed "
+        "has each booking. Bookings are sent with --token, an API token from "
+        "manage.py drf_create_token <username>. Pass --server-pid for the worker's memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", required=True, help="e.g. http://127.0.0.1:8001")
+        parser.add_argument("--token", required=True, help="API token the bookings are sent with")
+        parser.add_argument("--subscribers", type=int, nargs="+", default=[100, 1000, 5000])
+        parser.add_argument("--events", type=int, default=20, help="Bookings per level")
+        parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for a connection or event")
+        parser.add_argument("--server-pid", type=int, help="Report this process's resident memory")
+
+    def handle(self, *args, **options):
+        sample = Appointment.objects.order_by().values_list("patient_id", "doctor_id", "clinic_id").first()
+        if sample is None:
+            raise CommandError("No appointments to take a patient, doctor and clinic from; run seed_data first")
+        patient, doctor, clinic = sample
+        url = urlsplit(options["url"])
+        host, port = url.hostname, url.port or 80
+
+        self.stdout.write(
+            f"{'feeds':>6} {'open':>6} {'errors':>6} {'open s':>7} {'events':>6} "
+            f"{'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'rss MB':>7}"
+        )
+        booked = []
+        try:
+            for level, subscribers in enumerate(options["subscribers"]):
+                bookings = [
+                    {"patient": patient, "doctor": doctor, "clinic": clinic,
+                     "visit_date": (FIRST_VISIT + timedelta(days=level, minutes=30 * i)).isoformat()}
+                    for i in range(options["events"])
+                ]
+                result = asyncio.run(run(host, port, subscribers, bookings, options["token"], options["timeout"]))
+                booked.extend(result["booked"])
+                p50, _, p99 = percentiles(result["latencies"])
+                rss = memory(options["server_pid"]) if options["server_pid"] else None
+                self.stdout.write(
+                    f"{subscribers:>6} {result['open']:>6} {subscribers - result['open']:>6} {result['open_seconds']:>7.1f} "
+                    f"{len(result['booked']):>6} {p50:>8.1f} {p99:>8.1f} {max(result['latencies'], default=0):>8.1f} "
+                    f"{rss if rss is not None else '-':>7}"
+                )
+                if result["missed"]:
+                    self.stdout.write(f"    {result['missed']} deliveries missing after {options['timeout']}s")
+        finally:
+            Appointment.objects.filter(pk__in=booked).delete()
+
+
+def memory(pid):
+    """Resident memory of a process in MB, from /proc."""
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) // 1024
+    return None
+
+
+async def run(host, port, subscribers, bookings, token, timeout):
+    """Open the feeds, book each appointment in turn and time its delivery to every open feed."""
+    received = {}  # appointment id -> [receipt times]
+    waiting = {}  # appointment id -> asyncio.Event, set once every open feed has it
+    feeds = []
+    opened = asyncio.Semaphore(200)  # not all connection attempts at once
+
+    async def subscribe():
+        async with opened:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+            writer.write(f"GET {FEED_PATH} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+            await writer.drain()
+            while not (await asyncio.wait_for(reader.readline(), timeout)).startswith(b"retry:"):
+                pass
+        feeds.append(writer)
+        return reader
+
+    async def listen(reader):
+        while line := await reader.readline():
+            if line.startswith(b"data: {"):
+                appointment = json.loads(line[6:])["appointment"]
+                times = received.setdefault(appointment, [])
+                times.append(time.perf_counter())
+                if appointment in waiting and len(times) == len(feeds):
+                    waiting[appointment].set()
+
+    started = time.perf_counter()
+    readers = [result for result in await asyncio.gather(*(subscribe() for _ in range(subscribers)), return_exceptions=True)
+               if not isinstance(result, BaseException)]
+    open_seconds = time.perf_counter() - started
+    listeners = [asyncio.create_task(listen(reader)) for reader in readers]
+
+    latencies, booked, missed = [], [], 0
+    for booking in bookings:
+        sent = time.perf_counter()
+        appointment = await book(host, port, booking, token)
+        booked.append(appointment)
+        waiting[appointment] = done = asyncio.Event()
+        if len(received.get(appointment, ())) < len(feeds):
+            try:
+                await asyncio.wait_for(done.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        times = received.get(appointment, [])
+        missed += len(feeds) - len(times)
+        latencies.extend((at - sent) * 1000 for at in times)
+
+    for listener in listeners:
+        listener.cancel()
+    for writer in feeds:
+        writer.close()
+    return {"open": len(readers), "open_seconds": open_seconds, "latencies": latencies,
+            "booked": booked, "missed": missed}
+
+
+async def book(host, port, booking, token):
+    """POST one booking on a fresh connection; return the appointment id."""
+    body = json.dumps(booking).encode()
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(
+            f"POST {BOOK_PATH} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+            f"Authorization: Token {token}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+        status_line = await reader.readline()
+        response = await reader.read()
+    finally:
+        writer.close()
+    if int(status_line.split()[1]) != 201:
+        raise CommandError(f"Booking failed: {status_line.decode().strip()}")
+    return json.loads(response.split(b"\r\n\r\n", 1)[1])["id"]
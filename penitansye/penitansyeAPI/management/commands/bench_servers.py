@@ -0,0 +1,116 @@
+import asyncio
+import random
+import time
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from penitansyeAPI.models import Appointment
+
+from .loadtest import percentiles
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare availability and listing throughput of an ASGI server (e.g. "
+        "uvicorn penitansye.asgi:application) against a WSGI one (e.g. gunicorn "
+        "penitansye.wsgi) at 100, 500 and 1000 concurrent clients. Start both "
+        "servers against the same database first; the ASGI server is sent to "
+        "the /api/async/ views and the WSGI server to the synchronous ones. "
+        "The listings are staff only: pass --token, an API token of a staff "
+        "user from manage.py drf_create_token <username>."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--asgi-url", help="e.g. http://127.0.0.1:8001")
+        parser.add_argument("--wsgi-url", help="e.g. http://127.0.0.1:8000")
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[100, 500, 1000])
+        parser.add_argument("--requests", type=int, default=2000, help="Requests per endpoint and level")
+        parser.add_argument("--timeout", type=float, default=30.0, help="Seconds before a request counts as failed")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--token", help="API token of a staff user, sent with every request")
+
+    def handle(self, *args, **options):
+        servers = [(name, options[f"{name}_url"]) for name in ("asgi", "wsgi") if options[f"{name}_url"]]
+        if not servers:
+            raise CommandError("Pass --asgi-url, --wsgi-url or both")
+        queries = self.availability_queries(options["seed"])
+        if not queries:
+            raise CommandError("No appointments to sample doctors and clinics from; run seed_data first")
+
+        self.stdout.write(
+            f"{'server':<6} {'endpoint':<14} {'clients':>7} {'requests':>8} {'errors':>6} "
+            f"{'p50 ms':>8} {'p99 ms':>8} {'req/s':>8}"
+        )
+        for concurrency in options["concurrency"]:
+            for name, url in servers:
+                prefix = "/api/async" if name == "asgi" else "/api"
+                endpoints = [
+                    ("availability", [f"{prefix}/availability/?{query}" for query in queries]),
+                    ("appointments", [f"{prefix}/appointments/?page_size=50"]),
+                ]
+                for endpoint, paths in endpoints:
+                    latencies, errors, elapsed = asyncio.run(
+                        run(url, paths, options["requests"], concurrency, options["timeout"], options["token"])
+                    )
+                    p50, _, p99 = percentiles(latencies)
+                    self.stdout.write(
+                        f"{name:<6} {endpoint:<14} {concurrency:>7} {len(latencies):>8} {sum(errors.values()):>6} "
+                        f"{p50:>8.1f} {p99:>8.1f} {len(latencies) / elapsed:>8.1f}"
+                    )
+                    if errors:
+                        self.stdout.write(f"    errors: {dict(errors)}")
+
+    def availability_queries(self, seed, n=200):
+        """Query strings for one doctor's week at a clinic they have appointments at."""
+        rng = random.Random(seed)
+        visits = list(Appointment.objects.order_by().values_list("doctor_id", "clinic_id", "visit_date")[:5000])
+        queries = []
+        for doctor_id, clinic_id, visit_date in rng.sample(visits, min(n, len(visits))):
+            day = timezone.localtime(visit_date).date()
+            queries.append(urlencode({"doctors": doctor_id, "clinic": clinic_id, "start": day.isoformat()}))
+        return queries
+
+
+async def run(base_url, paths, n, concurrency, timeout, token=None):
+    """Send n GETs from ``concurrency`` clients; return (latencies in ms, {error: count}, seconds)."""
+    url = urlsplit(base_url)
+    host, port = url.hostname, url.port or 80
+    latencies, errors = [], defaultdict(int)
+    remaining = iter(range(n))
+
+    async def client():
+        for i in remaining:
+            started = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(get(host, port, paths[i % len(paths)], token), timeout)
+            except asyncio.TimeoutError:
+                errors["timeout"] += 1
+                continue
+            except OSError as exc:
+                errors[type(exc).__name__] += 1
+                continue
+            if status >= 400:
+                errors[status] += 1
+            else:
+                latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def get(host, port, path, token=None):
+    """One HTTP/1.1 GET on a fresh connection; return the status code once the body is read."""
+    reader, writer = await asyncio.open_connection(host, port)
+    authorization = f"Authorization: Token {token}\r\n" if token else ""
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n{authorization}Connection: close\r\n\r\n".encode())
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
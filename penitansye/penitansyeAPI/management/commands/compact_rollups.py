@@ -0,0 +1,37 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from penitansyeAPI import rollups
+from penitansyeAPI.models import HourlyRollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Nightly upkeep of the visit rollups: recount the days that just ended, whose "
+        "unrecorded appointments have become no-shows, and drop hourly rollups past "
+        "their retention (the daily ones are kept)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=1,
+                            help="Days to recount, ending yesterday; more catches up missed runs")
+        parser.add_argument("--keep-hourly", type=int, default=rollups.HOURLY_RETENTION_DAYS,
+                            help="Days of hourly rollups to keep")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        last_day = timezone.localdate() - timedelta(days=1)
+        first_day = last_day - timedelta(days=options["days"] - 1)
+        with transaction.atomic():
+            hourly = rollups.tally(None, first_day, last_day)
+            rollups.save(hourly, None, first_day=first_day, last_day=last_day)
+        cutoff = timezone.localdate() - timedelta(days=options["keep_hourly"])
+        dropped, _ = HourlyRollup.objects.filter(day__lt=cutoff).delete()
+        self.stdout.write(
+            f"Recounted {first_day} to {last_day} ({len(hourly)} hourly rollups) and dropped "
+            f"{dropped} hourly rollups before {cutoff} in {time.perf_counter() - started:.1f}s"
+        )
@@ -0,0 +1,50 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from penitansyeAPI import export
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream appointments or records to a CSV or NDJSON file (or stdout), "
+        "optionally gzipped, in constant memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(export.MODELS))
+        parser.add_argument("--format", choices=export.FORMATS, default="csv")
+        parser.add_argument("--gzip", action="store_true")
+        parser.add_argument("-o", "--output", help="File to write; stdout by default")
+        parser.add_argument("--doctor", help="Doctor id")
+        parser.add_argument("--clinic", help="Clinic id")
+        parser.add_argument("--patient", help="Patient id")
+        parser.add_argument("--start", help="First day, YYYY-MM-DD")
+        parser.add_argument("--end", help="Last day, YYYY-MM-DD")
+
+    def handle(self, *args, **options):
+        try:
+            filters = export.export_params(options)
+        except ValueError as exc:
+            raise CommandError(exc)
+        querysets = export.export_querysets(options["kind"], **filters)
+        chunks = export.export(querysets, options["format"], options["gzip"])
+        if not options["gzip"]:
+            chunks = (chunk.encode() for chunk in chunks)
+
+        started, written = time.perf_counter(), 0
+        output = open(options["output"], "wb") if options["output"] else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if options["output"]:
+                output.close()
+            else:
+                output.flush()
+        if options["output"]:
+            self.stderr.write(
+                f"{written / 2**20:.1f} MB written to {options['output']} in {time.perf_counter() - started:.1f}s"
+            )
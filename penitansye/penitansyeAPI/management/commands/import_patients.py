@@ -0,0 +1,75 @@
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from penitansyeAPI.importing import CONFLICT_MODES, IMPORT_FIELDS, PASSWORD_MODES, PatientImport
+
+
+class Command(BaseCommand):
+    help = (
+        "Import patients from a CSV file with a header row naming "
+        f"{', '.join(IMPORT_FIELDS)} and optionally password. Rows are validated "
+        "and inserted in batches; a bad row is reported and skipped without "
+        "stopping its batch."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--passwords", choices=PASSWORD_MODES, default="hash",
+            help="hash: hash the password column in a process pool; unusable: import without "
+                 "passwords, for patients to set one through a password reset on first login",
+        )
+        parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                            help="Processes hashing passwords; 0 hashes in this process")
+        parser.add_argument("--on-conflict", choices=CONFLICT_MODES, default="skip",
+                            help="For emails already in the database: report them, or update those patients")
+        parser.add_argument("--errors", help="Write the rejected rows' line, email and error to this CSV file")
+
+    def handle(self, *args, **options):
+        try:
+            source = open(options["path"], newline="", encoding="utf-8")
+        except OSError as exc:
+            raise CommandError(exc)
+        pool = ProcessPoolExecutor(options["workers"]) if options["workers"] and options["passwords"] == "hash" else None
+        importer = PatientImport(options["passwords"], options["on_conflict"], pool)
+        started = time.perf_counter()
+        read = 0
+        try:
+            with source:
+                reader = csv.DictReader(source)
+                missing = set(IMPORT_FIELDS) - set(reader.fieldnames or ())
+                if missing:
+                    raise CommandError(f"Missing columns: {', '.join(sorted(missing))}")
+                # Line 1 is the header
+                rows = enumerate(reader, start=2)
+                while batch := list(islice(rows, options["batch_size"])):
+                    importer.import_batch(batch)
+                    read += len(batch)
+                    if options["verbosity"] > 1:
+                        self.stdout.write(f"{read} rows, {read / (time.perf_counter() - started):.0f}/s")
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"rows read:  {read} in {elapsed:.1f}s ({read / elapsed:.0f}/s)")
+        self.stdout.write(f"imported:   {importer.imported}")
+        if options["on_conflict"] == "update":
+            self.stdout.write(f"updated:    {importer.updated}")
+        self.stdout.write(f"rejected:   {len(importer.errors)}")
+        if options["errors"]:
+            with open(options["errors"], "w", newline="", encoding="utf-8") as errors:
+                writer = csv.writer(errors)
+                writer.writerow(["line", "email", "error"])
+                writer.writerows(importer.errors)
+        else:
+            for line, email, message in importer.errors[:20]:
+                self.stderr.write(f"line {line} ({email}): {message}")
+            if len(importer.errors) > 20:
+                self.stderr.write(f"... and {len(importer.errors) - 20} more; pass --errors to keep them all")
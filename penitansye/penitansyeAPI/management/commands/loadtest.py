@@ -0,0 +1,133 @@
+import logging
+import random
+import statistics
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.utils import timezone
+
+from penitansyeAPI.models import Clinic, Doctor, Patient
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive /api/home/, /api/patient/ and /api/appointment/ and report "
+        "p50/p95/p99 latency and requests per second per endpoint. Requests go "
+        "through the Django test client unless --url points at a running local "
+        "server, in which case only the GET endpoints are exercised. POST "
+        "requests create real patients and appointments; use --read-only to skip them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+        parser.add_argument("--concurrency", type=int, default=1)
+        parser.add_argument("--url", help="Base URL of a running server, e.g. http://127.0.0.1:8000")
+        parser.add_argument("--read-only", action="store_true")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.base_url = options["url"]
+        scenarios = [
+            ("GET /api/home/", self.get("/api/home/")),
+            ("GET /api/patient/", self.get("/api/patient/")),
+            ("GET /api/appointment/", self.get("/api/appointment/")),
+        ]
+        if not options["read_only"] and not self.base_url:
+            scenarios += [
+                ("POST /api/patient/", self.post_patient),
+                ("POST /api/appointment/", self.post_appointment(options["seed"])),
+            ]
+
+        # Failed requests are counted below; don't print a traceback for each
+        logging.getLogger("django.request").setLevel(logging.CRITICAL)
+        self.stdout.write(
+            f"{'endpoint':<26} {'requests':>8} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8}"
+        )
+        for name, request in scenarios:
+            latencies, errors, elapsed = self.run(request, options["requests"], options["concurrency"])
+            p50, p95, p99 = percentiles(latencies)
+            self.stdout.write(
+                f"{name:<26} {len(latencies):>8} {errors:>6} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f} "
+                f"{len(latencies) / elapsed:>8.1f}"
+            )
+
+    def run(self, request, n, concurrency):
+        latencies, errors = [], defaultdict(int)
+        lock = threading.Lock()
+        per_worker = [n // concurrency + (i < n % concurrency) for i in range(concurrency)]
+
+        def worker(count):
+            client = Client(SERVER_NAME="localhost", raise_request_exception=False)
+            local = []
+            for _ in range(count):
+                started = time.perf_counter()
+                status = request(client)
+                local.append((time.perf_counter() - started) * 1000)
+                if status >= 400:
+                    with lock:
+                        errors[status] += 1
+            with lock:
+                latencies.extend(local)
+
+        threads = [threading.Thread(target=worker, args=(count,)) for count in per_worker]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, sum(errors.values()), time.perf_counter() - started
+
+    def get(self, path):
+        if self.base_url:
+            url = self.base_url.rstrip("/") + path
+
+            def request(client):
+                try:
+                    with urlopen(url) as response:
+                        response.read()
+                        return response.status
+                except HTTPError as exc:
+                    return exc.code
+            return request
+        return lambda client: client.get(path).status_code
+
+    def post_patient(self, client):
+        return client.post("/api/patient/", {
+            "firstname": "Load", "lastname": "Test", "date_of_birth": "1990-01-01",
+            "phone": "555-0000", "email": f"load-{uuid.uuid4().hex}@example.com",
+            "password": "load-test-password", "symptoms": "cough",
+        }).status_code
+
+    def post_appointment(self, seed):
+        rng = random.Random(seed)
+        patients = list(Patient.objects.values_list("id", flat=True)[:1000])
+        doctors = list(Doctor.objects.values_list("id", flat=True)[:1000])
+        clinics = list(Clinic.objects.values_list("id", flat=True)[:100])
+        first_day = timezone.localdate() + timedelta(days=1)
+
+        def request(client):
+            if not (patients and doctors and clinics):
+                return 599  # nothing to book against; run seed_data first
+            day = first_day + timedelta(days=rng.randrange(365))
+            hour, half = 8 + rng.randrange(9), rng.choice(["00", "30"])
+            return client.post("/api/appointment/", {
+                "patient": rng.choice(patients), "doctor": rng.choice(doctors),
+                "clinic": rng.choice(clinics), "visit_date": f"{day}T{hour:02d}:{half}",
+                "treatment": "Load test",
+            }).status_code
+        return request
+
+
+def percentiles(latencies):
+    if len(latencies) < 2:
+        value = latencies[0] if latencies else 0.0
+        return value, value, value
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return cuts[49], cuts[94], cuts[98]
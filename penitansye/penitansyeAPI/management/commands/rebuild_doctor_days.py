@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from penitansyeAPI import doctor_days
+from penitansyeAPI.models import Doctor, DoctorDay
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the materialized DoctorDay schedules from Appointment and the booked "
+        "records, e.g. after seed_data or a bulk load, or compare them with --check "
+        "without writing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Report differences and fail if there are any")
+        parser.add_argument("--doctor", type=int, nargs="+", help="Only these doctor ids")
+        parser.add_argument("--batch-size", type=int, default=200, help="Doctors rebuilt per transaction")
+
+    def handle(self, *args, **options):
+        doctor_ids = options["doctor"] or list(Doctor.objects.order_by("pk").values_list("pk", flat=True))
+        started = time.perf_counter()
+        totals = {"missing": 0, "stale": 0, "orphaned": 0, "ok": 0}
+        for i in range(0, len(doctor_ids), options["batch_size"]):
+            batch = doctor_ids[i:i + options["batch_size"]]
+            with transaction.atomic():
+                counts = self.rebuild(batch, write=not options["check"])
+            for key, value in counts.items():
+                totals[key] += value
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{i + len(batch)}/{len(doctor_ids)} doctors")
+
+        self.stdout.write(
+            f"{len(doctor_ids)} doctors in {time.perf_counter() - started:.1f}s: {totals['ok']} days up to date, "
+            f"{totals['missing']} missing, {totals['stale']} stale, {totals['orphaned']} orphaned"
+        )
+        if options["check"] and totals["missing"] + totals["stale"] + totals["orphaned"]:
+            raise CommandError("DoctorDay is out of date; run rebuild_doctor_days without --check")
+
+    def rebuild(self, doctor_ids, write):
+        expected = doctor_days.group_days(doctor_days.entries(doctor_ids))
+        stored = {
+            (doctor_id, day): (pk, appointments)
+            for pk, doctor_id, day, appointments in DoctorDay.objects.filter(doctor_id__in=doctor_ids)
+            .values_list("pk", "doctor_id", "day", "appointments").iterator(chunk_size=5000)
+        }
+        missing = {pair: entries for pair, entries in expected.items() if pair not in stored}
+        stale = {
+            pair: entries for pair, entries in expected.items()
+            if pair in stored and stored[pair][1] != entries
+        }
+        orphaned = [pk for pair, (pk, _) in stored.items() if pair not in expected]
+        if write:
+            doctor_days.save_days({**missing, **stale})
+            DoctorDay.objects.filter(pk__in=orphaned).delete()
+        return {
+            "missing": len(missing), "stale": len(stale), "orphaned": len(orphaned),
+            "ok": len(expected) - len(missing) - len(stale),
+        }
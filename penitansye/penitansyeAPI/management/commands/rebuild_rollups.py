@@ -0,0 +1,68 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from penitansyeAPI import rollups
+from penitansyeAPI.models import DailyRollup, Doctor, HourlyRollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the visit rollups from Appointment and Record, e.g. after seed_data or "
+        "a bulk load, or compare them with --check without writing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Report differences and fail if there are any")
+        parser.add_argument("--doctor", type=int, nargs="+", help="Only these doctor ids")
+        parser.add_argument("--start", type=date.fromisoformat, help="First day, YYYY-MM-DD")
+        parser.add_argument("--end", type=date.fromisoformat, help="Last day, YYYY-MM-DD")
+        parser.add_argument("--batch-size", type=int, default=200, help="Doctors rebuilt per transaction")
+
+    def handle(self, *args, **options):
+        if (options["start"] is None) != (options["end"] is None):
+            raise CommandError("Give both --start and --end, or neither")
+        doctor_ids = options["doctor"] or list(Doctor.objects.order_by("pk").values_list("pk", flat=True))
+        started = time.perf_counter()
+        totals = {"missing": 0, "stale": 0, "orphaned": 0, "ok": 0}
+        for i in range(0, len(doctor_ids), options["batch_size"]):
+            batch = doctor_ids[i:i + options["batch_size"]]
+            with transaction.atomic():
+                counts = self.rebuild(batch, options["start"], options["end"], write=not options["check"])
+            for key, value in counts.items():
+                totals[key] += value
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{i + len(batch)}/{len(doctor_ids)} doctors")
+
+        self.stdout.write(
+            f"{len(doctor_ids)} doctors in {time.perf_counter() - started:.1f}s: {totals['ok']} hourly and daily "
+            f"rollups up to date, {totals['missing']} missing, {totals['stale']} stale, {totals['orphaned']} orphaned"
+        )
+        if options["check"] and totals["missing"] + totals["stale"] + totals["orphaned"]:
+            raise CommandError("The rollups are out of date; run rebuild_rollups without --check")
+
+    def rebuild(self, doctor_ids, start, end, write):
+        expected = rollups.tally(doctor_ids, start, end)
+        counts = dict.fromkeys(("missing", "stale", "orphaned", "ok"), 0)
+        for model, keys, fields, wanted in (
+            (HourlyRollup, ("doctor_id", "clinic_id", "day", "hour"), rollups.COUNTS, expected),
+            (DailyRollup, ("doctor_id", "clinic_id", "day"), rollups.DAILY_COUNTS, rollups.daily(expected)),
+        ):
+            stored = model.objects.filter(doctor_id__in=doctor_ids)
+            if start is not None:
+                stored = stored.filter(day__gte=start, day__lte=end)
+            stored = {
+                tuple(row[:len(keys)]): list(row[len(keys):])
+                for row in stored.values_list(*keys, *fields).iterator(chunk_size=5000)
+            }
+            missing = sum(key not in stored for key in wanted)
+            stale = sum(key in stored and stored[key] != row for key, row in wanted.items())
+            counts["missing"] += missing
+            counts["stale"] += stale
+            counts["orphaned"] += sum(key not in wanted for key in stored)
+            counts["ok"] += len(wanted) - missing - stale
+        if write and counts["missing"] + counts["stale"] + counts["orphaned"]:
+            rollups.save(expected, doctor_ids, first_day=start, last_day=end)
+        return counts
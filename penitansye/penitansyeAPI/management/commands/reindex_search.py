@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from penitansyeAPI import search
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the full-text search index from the searchable tables, e.g. after "
+        "seed_data or a bulk load that bypassed the signals."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--only", choices=sorted(search.SEARCHABLE), nargs="+", help="Only these kinds")
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        for kind in options["only"] or search.SEARCHABLE:
+            model, _ = search.SEARCHABLE[kind]
+            started = time.perf_counter()
+            with transaction.atomic(using=options["database"]):
+                search.reindex(model, options["database"])
+            self.stdout.write(f"search index of {kind} rebuilt in {time.perf_counter() - started:.1f}s")
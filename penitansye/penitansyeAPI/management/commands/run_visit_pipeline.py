@@ -0,0 +1,53 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from penitansyeAPI import pipeline
+
+
+class Command(BaseCommand):
+    help = (
+        "Turn past appointments into records, then move records older than the "
+        "archive horizon into the archive, a chunk per transaction. An interrupted "
+        "run is resumed, with the cutoff it started with, by running this again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stage", choices=[*pipeline.STAGES, "all"], default="all")
+        parser.add_argument("--before", type=date.fromisoformat,
+                            help="Close appointments before this day, YYYY-MM-DD; today by default")
+        parser.add_argument("--horizon-days", type=int, default=pipeline.ARCHIVE_HORIZON_DAYS,
+                            help="Archive records older than this many days")
+        parser.add_argument("--chunk-size", type=int, default=pipeline.CHUNK_SIZE)
+        parser.add_argument("--max-chunks", type=int,
+                            help="Stop each stage after this many chunks, to carry on in a later run")
+        parser.add_argument("--restart", action="store_true",
+                            help="Drop an unfinished run's checkpoint and start over with a new cutoff")
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        if options["before"] and options["before"] > today:
+            # An appointment is only a no-show once its day is over
+            raise CommandError("--before can't be later than today")
+        cutoffs = {
+            "records": pipeline.day_start(options["before"] or today),
+            "archive": pipeline.archive_horizon(options["horizon_days"]),
+        }
+        stages = pipeline.STAGES if options["stage"] == "all" else [options["stage"]]
+        for stage in stages:
+            started = time.perf_counter()
+
+            def progress(point):
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"{stage}: {point.moved} moved, up to {point.reached}")
+
+            point = pipeline.run(
+                stage, cutoffs[stage], options["chunk_size"], options["max_chunks"], options["restart"], progress,
+            )
+            state = "finished" if point.finished else "stopped; run again to resume"
+            self.stdout.write(
+                f"{stage} before {point.cutoff:%Y-%m-%d}: {point.moved} moved in "
+                f"{time.perf_counter() - started:.1f}s, {state}"
+            )
@@ -0,0 +1,79 @@
+import random
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from penitansyeAPI import caching
+from penitansyeAPI.models import Appointment, Clinic, Doctor, Patient, Record
+from penitansyeAPI.seeding import (
+    SPECIALIZATIONS, days_needed, first_day_for, seed_clinics, seed_doctors, seed_patients, seed_visits,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-generate clinics, doctors, patients, past records and upcoming "
+        "appointments with bulk_create. Passwords are left unusable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clinics", type=int, default=50)
+        parser.add_argument("--doctors", type=int, default=1000)
+        parser.add_argument("--patients", type=int, default=100_000)
+        parser.add_argument("--appointments", type=int, default=1_000_000)
+        parser.add_argument("--records", type=int, default=1_000_000)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--database", default="default")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        using, batch_size = options["database"], options["batch_size"]
+        rng = random.Random(options["seed"])
+        connection = connections[using]
+        if connection.vendor == "sqlite":
+            # Only the seed run is affected; a crash mid-seed may leave a partial data set.
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA synchronous = OFF")
+
+        clinic_ids = self.timed("clinics", lambda: seed_clinics(
+            options["clinics"], Clinic.objects.using(using).count(), batch_size, using))
+        doctor_ids = self.timed("doctors", lambda: seed_doctors(
+            options["doctors"], Doctor.objects.using(using).count(), batch_size, using, rng))
+        patient_ids = self.timed("patients", lambda: seed_patients(
+            options["patients"], Patient.objects.using(using).count(), batch_size, using, rng))
+        records_from = first_day_for(days_needed(options["records"], len(doctor_ids)))
+        self.timed("records", lambda: seed_visits(
+            Record, options["records"], clinic_ids, doctor_ids, patient_ids,
+            records_from, batch_size, using, rng))
+        self.timed("appointments", lambda: seed_visits(
+            Appointment, options["appointments"], clinic_ids, doctor_ids, patient_ids,
+            first_day_for(0), batch_size, using, rng))
+
+        # bulk_create sends no signals, so drop the cached lists the new rows belong to
+        caching.invalidate("doctor-choices")
+        caching.invalidate("clinic-choices")
+        caching.invalidate("specialization-facets")
+        for specialization in SPECIALIZATIONS:
+            caching.invalidate("doctors-by-specialization", caching.specialization_key(specialization))
+        # nor are the new rows added to the search index
+        call_command("reindex_search", database=using, stdout=self.stdout)
+        # or the new appointments' DoctorDay schedules materialized and visits rolled up
+        if using == "default":
+            call_command("rebuild_doctor_days", doctor=doctor_ids, stdout=self.stdout)
+            call_command("rebuild_rollups", doctor=doctor_ids, stdout=self.stdout)
+        else:
+            self.stdout.write(
+                f"Run rebuild_doctor_days and rebuild_rollups against {using} to materialize the "
+                "day schedules and visit rollups"
+            )
+
+    def timed(self, label, seed):
+        started = time.perf_counter()
+        result = seed()
+        elapsed = time.perf_counter() - started
+        rows = result if isinstance(result, int) else len(result)
+        rate = rows / elapsed if elapsed else 0
+        self.stdout.write(f"{label:<13} {rows:>10} rows in {elapsed:7.1f}s ({rate:,.0f} rows/s)")
+        return result
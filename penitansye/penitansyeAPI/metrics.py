@@ -0,0 +1,318 @@
+"""Per-request performance metrics, kept per view and exported in the Prometheus text format.
+
+MetricsMiddleware measures every request: wall time, the number and total
+time of its SQL queries (through an execute wrapper on every connection),
+its cache hits and misses (counted by caching.CacheStats) and the time
+spent rendering templates (through TimedDjangoTemplates). The same SQL running more than
+N_PLUS_ONE_THRESHOLD times in one request is logged as a likely N+1.
+
+A streamed response is measured until its body has been sent, as queries
+made while it is consumed belong to the request too; its Server-Timing
+header, sent before the body, covers the view alone. That header shows
+any client how long a view spends in the database and on how many
+queries, so it is only added with DEBUG on or for METRICS_ADDRESSES.
+
+Totals are kept in this process only; scrape every worker, or put the
+metrics endpoint behind the server's per-worker address.
+"""
+import logging
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import FileResponse
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template.exceptions import TemplateDoesNotExist
+
+logger = logging.getLogger(__name__)
+
+N_PLUS_ONE_THRESHOLD = 10
+# Upper bounds of the request duration histogram, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UNRESOLVED = "<unresolved>"
+# Loopback only: metrics name every view and are meant for a scraper on the same host
+METRICS_ADDRESSES = ("127.0.0.1", "::1")
+
+_current = ContextVar("penitansye_request_metrics", default=None)
+
+
+class RequestMetrics:
+    """What one request spent, filled in while it runs."""
+    __slots__ = ("queries", "db_time", "statements", "cache_hits", "cache_misses", "template_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = {}  # sql -> times run
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += perf_counter() - started
+            self.queries += 1
+            self.statements[sql] = self.statements.get(sql, 0) + 1
+
+    def repeated(self, threshold):
+        """The statements run more than threshold times, most repeated first."""
+        return sorted(
+            ((count, sql) for sql, count in self.statements.items() if count > threshold), reverse=True
+        )
+
+
+@contextmanager
+def _measuring(metrics):
+    """Count what runs inside towards metrics, restoring the context's own afterwards.
+
+    Set and restored by value rather than with a token: a streamed body may
+    be consumed in another context than the one that served the view.
+    """
+    previous = _current.get()
+    _current.set(metrics)
+    try:
+        yield
+    finally:
+        _current.set(previous)
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def instrument(connection):
+    """Add the query timing wrapper to a connection, once.
+
+    It stays installed and finds the request through a context variable, so
+    queries made from sync_to_async threads (the async ORM, which uses other
+    connections than the event loop's thread) are counted too.
+    """
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+@receiver(connection_created, dispatch_uid="penitansye-metrics")
+def _instrument_new_connection(sender, connection, **kwargs):
+    instrument(connection)
+
+
+def count_cache(hits, misses):
+    """Add cache hits and misses to the current request, if any."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+
+
+class ViewMetrics:
+    __slots__ = ("requests", "buckets", "seconds", "queries", "db_seconds",
+                 "template_seconds", "cache_hits", "cache_misses", "n_plus_one")
+
+    def __init__(self):
+        self.requests = {}  # (method, status) -> count
+        self.buckets = [0] * (len(BUCKETS) + 1)  # the last one is +Inf
+        self.seconds = 0.0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.n_plus_one = 0
+
+
+class Registry:
+    """Totals per view for this process."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._views = {}
+
+    def record(self, view, method, status, seconds, metrics, n_plus_one):
+        with self._lock:
+            totals = self._views.get(view)
+            if totals is None:
+                totals = self._views[view] = ViewMetrics()
+            key = (method, status)
+            totals.requests[key] = totals.requests.get(key, 0) + 1
+            totals.buckets[bisect_left(BUCKETS, seconds)] += 1
+            totals.seconds += seconds
+            totals.queries += metrics.queries
+            totals.db_seconds += metrics.db_time
+            totals.template_seconds += metrics.template_time
+            totals.cache_hits += metrics.cache_hits
+            totals.cache_misses += metrics.cache_misses
+            totals.n_plus_one += n_plus_one
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def prometheus(self):
+        """The totals in the Prometheus text exposition format."""
+        with self._lock:
+            views = sorted(self._views.items())
+            lines = [
+                "# HELP penitansye_requests_total Requests served, by view, method and status.",
+                "# TYPE penitansye_requests_total counter",
+            ]
+            for view, totals in views:
+                for (method, status), count in sorted(totals.requests.items()):
+                    lines.append(
+                        f'penitansye_requests_total{{view="{view}",method="{method}",status="{status}"}} {count}'
+                    )
+            lines += [
+                "# HELP penitansye_request_seconds Wall time of requests, by view.",
+                "# TYPE penitansye_request_seconds histogram",
+            ]
+            for view, totals in views:
+                cumulative = 0
+                for bound, count in zip((*BUCKETS, "+Inf"), totals.buckets):
+                    cumulative += count
+                    lines.append(f'penitansye_request_seconds_bucket{{view="{view}",le="{bound}"}} {cumulative}')
+                lines.append(f'penitansye_request_seconds_sum{{view="{view}"}} {totals.seconds:.6f}')
+                lines.append(f'penitansye_request_seconds_count{{view="{view}"}} {cumulative}')
+            for name, attribute, help_text in COUNTERS:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for view, totals in views:
+                    value = getattr(totals, attribute)
+                    value = f"{value:.6f}" if isinstance(value, float) else value
+                    lines.append(f'{name}{{view="{view}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+COUNTERS = (
+    ("penitansye_db_queries_total", "queries", "SQL queries run, by view."),
+    ("penitansye_db_seconds_total", "db_seconds", "Time spent in SQL queries, by view."),
+    ("penitansye_template_seconds_total", "template_seconds", "Time spent rendering templates, by view."),
+    ("penitansye_cache_hits_total", "cache_hits", "Cache hits, by view."),
+    ("penitansye_cache_misses_total", "cache_misses", "Cache misses, by view."),
+    ("penitansye_n_plus_one_total", "n_plus_one", "Requests that repeated one SQL statement "
+                                                  "more than the N+1 threshold, by view."),
+)
+
+registry = Registry()
+
+
+class MetricsMiddleware:
+    """Measure each request and add it to the registry; list it first in MIDDLEWARE."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _record(self, request, response, metrics, started):
+        seconds = perf_counter() - started
+        match = request.resolver_match
+        view = match.view_name if match else UNRESOLVED
+        repeated = metrics.repeated(N_PLUS_ONE_THRESHOLD)
+        for count, sql in repeated:
+            logger.warning("Possible N+1 in %s: %d runs of %s", view, count, sql)
+        registry.record(view, request.method, response.status_code, seconds, metrics, bool(repeated))
+
+    def _stream(self, chunks, request, response, metrics, started):
+        chunks = iter(chunks)
+        try:
+            while True:
+                with _measuring(metrics):
+                    try:
+                        chunk = next(chunks)
+                    except StopIteration:
+                        return
+                yield chunk
+        finally:
+            self._record(request, response, metrics, started)
+
+    async def _astream(self, chunks, request, response, metrics, started):
+        chunks = aiter(chunks)
+        try:
+            while True:
+                with _measuring(metrics):
+                    try:
+                        chunk = await anext(chunks)
+                    except StopAsyncIteration:
+                        return
+                yield chunk
+        finally:
+            self._record(request, response, metrics, started)
+
+    def _finish(self, request, response, metrics, started):
+        seconds = perf_counter() - started
+        # Files are sent as they are, without queries, and may use the server's sendfile
+        if not response.streaming or isinstance(response, FileResponse):
+            self._record(request, response, metrics, started)
+        else:
+            stream = self._astream if response.is_async else self._stream
+            response.streaming_content = stream(response.streaming_content, request, response, metrics, started)
+        if settings.DEBUG or request.META.get("REMOTE_ADDR") in METRICS_ADDRESSES:
+            response["Server-Timing"] = (
+                f"total;dur={seconds * 1000:.1f}, "
+                f"db;dur={metrics.db_time * 1000:.1f};desc=\"{metrics.queries} queries\", "
+                f"tpl;dur={metrics.template_time * 1000:.1f}"
+            )
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # Connections opened before this module was imported missed connection_created
+        for connection in connections.all(initialized_only=True):
+            instrument(connection)
+        metrics, started = RequestMetrics(), perf_counter()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics, started)
+
+    async def __acall__(self, request):
+        metrics, started = RequestMetrics(), perf_counter()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics, started)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        started = perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics = _current.get()
+            if metrics is not None:
+                metrics.template_time += perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, adding each render's time to the current request's metrics.
+
+    Only top-level renders are timed; includes and extends run inside them.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
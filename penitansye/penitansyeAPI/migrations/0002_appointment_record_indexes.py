@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('penitansyeAPI', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient', 'visit_date'], include=('doctor', 'clinic'), name='appt_patient_visit_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['clinic', 'visit_date'], include=('doctor', 'patient'), name='appt_clinic_visit_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['doctor', 'visit_date'], name='record_doctor_visit_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['patient', 'visit_date'], include=('doctor', 'clinic'), name='record_patient_visit_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['clinic', 'visit_date'], include=('doctor', 'patient'), name='record_clinic_visit_idx'),
+        ),
+    ]
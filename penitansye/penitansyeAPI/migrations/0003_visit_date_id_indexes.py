@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('penitansyeAPI', '0002_appointment_record_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['visit_date', 'id'], name='appt_visit_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='record',
+            index=models.Index(fields=['visit_date', 'id'], name='record_visit_id_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:16
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('penitansyeAPI', '0003_visit_date_id_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(django.db.models.functions.text.Lower('lastname'), name='patient_lastname_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(django.db.models.functions.text.Lower('firstname'), name='patient_firstname_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='patient_email_lower_idx'),
+        ),
+    ]
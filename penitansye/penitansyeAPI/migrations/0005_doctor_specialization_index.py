@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:42
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('penitansyeAPI', '0004_patient_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(django.db.models.functions.text.Lower('specialization'), name='doctor_spec_lower_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:44
+
+import penitansyeAPI.schedule
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('penitansyeAPI', '0005_doctor_specialization_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='clinic',
+            name='opening_hours',
+            field=models.CharField(max_length=255, validators=[penitansyeAPI.schedule.validate_opening_hours]),
+        ),
+    ]
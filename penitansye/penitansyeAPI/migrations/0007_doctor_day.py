@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('penitansyeAPI', '0006_clinic_opening_hours_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('appointments', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='days', to='penitansyeAPI.doctor')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'day'), name='doctor_day_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations
+
+# The searchable columns at this migration; search.py keeps the current list
+SEARCHABLE = (('Patient', 'symptoms'), ('Record', 'treatment'), ('Appointment', 'treatment'))
+
+
+def _index_name(table, field):
+    return f'{table}_{field}_fts'[:63]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for model_name, field in SEARCHABLE:
+        table = apps.get_model('penitansyeAPI', model_name)._meta.db_table
+        if vendor == 'sqlite':
+            # An FTS5 table keyed by the row id, filled from the rows already there
+            schema_editor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS "{table}_fts" '
+                f"USING fts5(body, tokenize='porter unicode61 remove_diacritics 2')"
+            )
+            schema_editor.execute(f'INSERT INTO "{table}_fts"(rowid, body) SELECT id, "{field}" FROM "{table}"')
+        elif vendor == 'postgresql':
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS "{_index_name(table, field)}" ON "{table}" '
+                f"""USING gin ((to_tsvector('english', COALESCE("{field}", ''))))"""
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for model_name, field in SEARCHABLE:
+        table = apps.get_model('penitansyeAPI', model_name)._meta.db_table
+        if vendor == 'sqlite':
+            schema_editor.execute(f'DROP TABLE IF EXISTS "{table}_fts"')
+        elif vendor == 'postgresql':
+            schema_editor.execute(f'DROP INDEX IF EXISTS "{_index_name(table, field)}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('penitansyeAPI', '0007_doctor_day'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('penitansyeAPI', '0008_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('booked', models.PositiveIntegerField(default=0)),
+                ('visits', models.PositiveIntegerField(default=0)),
+                ('no_shows', models.PositiveIntegerField(default=0)),
+                ('day', models.DateField()),
+                ('slots', models.PositiveIntegerField(default=0)),
+                ('clinic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='penitansyeAPI.clinic')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='penitansyeAPI.doctor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='daily_rollup_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'day', 'clinic'), name='daily_rollup_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('booked', models.PositiveIntegerField(default=0)),
+                ('visits', models.PositiveIntegerField(default=0)),
+                ('no_shows', models.PositiveIntegerField(default=0)),
+                ('day', models.DateField()),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('clinic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_rollups', to='penitansyeAPI.clinic')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_rollups', to='penitansyeAPI.doctor')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['clinic', 'day'], name='hourly_rollup_clinic_idx')],
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'day', 'clinic', 'hour'), name='hourly_rollup_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('penitansyeAPI', '0009_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PipelineCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(max_length=50, unique=True)),
+                ('cutoff', models.DateTimeField()),
+                ('reached', models.DateTimeField(null=True)),
+                ('moved', models.PositiveBigIntegerField(default=0)),
+                ('finished', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='record',
+            name='booked',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='record',
+            name='no_show',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='ArchivedRecord',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('visit_date', models.DateTimeField()),
+                ('treatment', models.TextField()),
+                ('booked', models.BooleanField(default=False)),
+                ('no_show', models.BooleanField(default=False)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('clinic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_records', to='penitansyeAPI.clinic')),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_records', to='penitansyeAPI.doctor')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_records', to='penitansyeAPI.patient')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['doctor', 'visit_date'], name='archive_doctor_visit_idx'), models.Index(fields=['patient', 'visit_date'], name='archive_patient_visit_idx'), models.Index(fields=['clinic', 'visit_date'], name='archive_clinic_visit_idx'), models.Index(fields=['visit_date', 'id'], name='archive_visit_id_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+# As migration 0008, for the archive that migration 0010 added
+FIELD = 'treatment'
+
+
+def _table(apps):
+    return apps.get_model('penitansyeAPI', 'ArchivedRecord')._meta.db_table
+
+
+def _index_name(table):
+    return f'{table}_{FIELD}_fts'[:63]
+
+
+def create_search_index(apps, schema_editor):
+    table, vendor = _table(apps), schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS "{table}_fts" '
+            f"USING fts5(body, tokenize='porter unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(f'INSERT INTO "{table}_fts"(rowid, body) SELECT id, "{FIELD}" FROM "{table}"')
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{_index_name(table)}" ON "{table}" '
+            f"""USING gin ((to_tsvector('english', COALESCE("{FIELD}", ''))))"""
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    table, vendor = _table(apps), schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS "{table}_fts"')
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{_index_name(table)}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('penitansyeAPI', '0010_visit_pipeline'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 from django.utils import timezone
+from .schedule import validate_opening_hours
 
 class UserManager(BaseUserManager):
     def create_user(self, email, firstname, lastname, date_of_birth, password=None, **extra_fields):
@@ -47,6 +49,14 @@ class Patient(User):
     bloodType = models.CharField(max_length=50)
     Allergies = models.CharField(max_length= 50)
     symptoms = models.TextField(blank=True, null=True)
+
+    class Meta:
+        # Case-insensitive prefix search (patientSearchView)
+        indexes = [
+            models.Index(Lower('lastname'), name='patient_lastname_lower_idx'),
+            models.Index(Lower('firstname'), name='patient_firstname_lower_idx'),
+            models.Index(Lower('email'), name='patient_email_lower_idx'),
+        ]
     
     def __str__(self):
         return f"Patient - {self.firstname} {self.lastname}"   
@@ -57,6 +67,12 @@ class Doctor(User):
     licence_number = models.CharField(max_length=50)
     years_of_experience = models.PositiveIntegerField()
 
+    class Meta:
+        # Case-insensitive specialization lookups and facets (caching.doctors_by_specialization)
+        indexes = [
+            models.Index(Lower('specialization'), name='doctor_spec_lower_idx'),
+        ]
+
 
 class Clinic(models.Model):
     clinic_name = models.CharField(max_length=100)
@@ -66,7 +82,8 @@ class Clinic(models.Model):
     zipcode = models.CharField(max_length=20)
     phone = models.CharField(max_length=20)
     email = models.EmailField()
-    opening_hours = models.CharField(max_length=50)  # e.g., "8AM-5PM"
+    # e.g. "8AM-5PM" or "Mon-Fri 8AM-12PM, 1PM-5PM; Sat 9AM-1PM; closed 2025-12-25", parsed by schedule.py
+    opening_hours = models.CharField(max_length=255, validators=[validate_opening_hours])
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -80,6 +97,19 @@ class Record(models.Model):
     clinic = models.ForeignKey(Clinic, on_delete=models.CASCADE, related_name="records")
     visit_date = models.DateTimeField()
     treatment = models.TextField()
+    # Set by the visit pipeline (pipeline.py) on the records of past appointments
+    booked = models.BooleanField(default=False)
+    no_show = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Doctor schedule, patient history and clinic day views
+            models.Index(fields=['doctor', 'visit_date'], name='record_doctor_visit_idx'),
+            models.Index(fields=['patient', 'visit_date'], name='record_patient_visit_idx', include=['doctor', 'clinic']),
+            models.Index(fields=['clinic', 'visit_date'], name='record_clinic_visit_idx', include=['doctor', 'patient']),
+            # Keyset pagination of listings
+            models.Index(fields=['visit_date', 'id'], name='record_visit_id_idx'),
+        ]
 
     def __str__(self):
         return f"Record: {self.patient} visited Dr. {self.doctor.lastname} at {self.clinic.clinic_name} on {self.visit_date.strftime('%Y-%m-%d %H:%M')}"
@@ -114,7 +144,13 @@ class Appointment(models.Model):
     class Meta:
         ordering = ['visit_date']
         unique_together = ('doctor', 'visit_date')  
-        # Prevent double-booking a doctor
+        # Prevent double-booking a doctor; its index also serves doctor schedules
+        indexes = [
+            models.Index(fields=['patient', 'visit_date'], name='appt_patient_visit_idx', include=['doctor', 'clinic']),
+            models.Index(fields=['clinic', 'visit_date'], name='appt_clinic_visit_idx', include=['doctor', 'patient']),
+            # Keyset pagination of listings
+            models.Index(fields=['visit_date', 'id'], name='appt_visit_id_idx'),
+        ]
 
     def __str__(self):
         return (
@@ -122,3 +158,101 @@ class Appointment(models.Model):
             f"with Dr. {self.doctor.lastname} at {self.clinic.clinic_name} "
             f"on {self.visit_date.strftime('%Y-%m-%d %H:%M')}"
         )
+
+
+class DoctorDay(models.Model):
+    """One doctor's appointments on one (local) day, kept up to date by doctor_days.py.
+
+    A day or week view reads these rows instead of joining Appointment,
+    Patient and Clinic again on every visit.
+    """
+    doctor = models.ForeignKey('Doctor', on_delete=models.CASCADE, related_name='days')
+    day = models.DateField()
+    # [{"id", "time", "patient", "patient_name", "clinic", "treatment", "status"}] in time order;
+    # status is "booked" for appointments, "visited" or "no_show" for the records made of them
+    appointments = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'day'], name='doctor_day_unique'),
+        ]
+
+
+class RollupCounts(models.Model):
+    booked = models.PositiveIntegerField(default=0)  # appointments
+    visits = models.PositiveIntegerField(default=0)  # records
+    # Past appointments without a record of the same patient, doctor and time
+    no_shows = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class DailyRollup(RollupCounts):
+    """Visit counts of one doctor at one clinic on one (local) day, kept up to date by rollups.py."""
+    doctor = models.ForeignKey('Doctor', on_delete=models.CASCADE, related_name='daily_rollups')
+    clinic = models.ForeignKey('Clinic', on_delete=models.CASCADE, related_name='daily_rollups')
+    day = models.DateField()
+    # Slots the clinic was open that day, by its opening hours when the row was counted
+    slots = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'day', 'clinic'], name='daily_rollup_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='daily_rollup_day_idx'),
+        ]
+
+
+class HourlyRollup(RollupCounts):
+    """DailyRollup split by the (local) hour the visits start in."""
+    doctor = models.ForeignKey('Doctor', on_delete=models.CASCADE, related_name='hourly_rollups')
+    clinic = models.ForeignKey('Clinic', on_delete=models.CASCADE, related_name='hourly_rollups')
+    day = models.DateField()
+    hour = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'day', 'clinic', 'hour'], name='hourly_rollup_unique'),
+        ]
+        indexes = [
+            # Clinic load reports
+            models.Index(fields=['clinic', 'day'], name='hourly_rollup_clinic_idx'),
+        ]
+
+
+class ArchivedRecord(models.Model):
+    """A Record older than the archive horizon, moved here by pipeline.py under the same id.
+
+    Record listings and exports read both tables (pagination.merged_keyset_page,
+    export.export), so history reads the same either side of the horizon.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name="archived_records")
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name="archived_records")
+    clinic = models.ForeignKey(Clinic, on_delete=models.CASCADE, related_name="archived_records")
+    visit_date = models.DateTimeField()
+    treatment = models.TextField()
+    booked = models.BooleanField(default=False)
+    no_show = models.BooleanField(default=False)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['doctor', 'visit_date'], name='archive_doctor_visit_idx'),
+            models.Index(fields=['patient', 'visit_date'], name='archive_patient_visit_idx'),
+            models.Index(fields=['clinic', 'visit_date'], name='archive_clinic_visit_idx'),
+            models.Index(fields=['visit_date', 'id'], name='archive_visit_id_idx'),
+        ]
+
+
+class PipelineCheckpoint(models.Model):
+    """How far a run of one stage of pipeline.py got, saved with each chunk it commits."""
+    stage = models.CharField(max_length=50, unique=True)
+    cutoff = models.DateTimeField()  # the run moves rows from before this
+    reached = models.DateTimeField(null=True)  # visit_date of the last row moved
+    moved = models.PositiveBigIntegerField(default=0)
+    finished = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,125 @@
+"""Clinic opening hours, parsed once into the slot start times of each weekday.
+
+Clinic.opening_hours holds groups separated by semicolons:
+
+    8AM-5PM                         every day
+    Mon-Fri 8AM-12PM, 1PM-5PM       some weekdays, with a lunch break
+    Sat 9:30AM-1PM                  on the half hour
+    Sun closed
+    closed 2025-12-25, 2026-01-01   holidays
+
+Weekdays named in a group take their hours from it; the others take the
+hours of the group without weekdays, or are closed if there is none.
+
+Plain Python, without Django, so that the standalone simulation
+(project.py, at the repository root) parses hours the same way. The model
+validator is in schedule.py.
+"""
+import re
+from datetime import date, datetime, time, timedelta
+
+SLOT_LENGTH = timedelta(minutes=30)
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+_HOUR = re.compile(r"(\d{1,2})(?::(\d{2}))?\s*(AM|PM)", re.IGNORECASE)
+_WEEKDAYS_PREFIX = re.compile(r"([a-z]{3}(?:-[a-z]{3})?(?:\s*,\s*[a-z]{3}(?:-[a-z]{3})?)*)\s+(.+)", re.IGNORECASE)
+
+
+class Schedule:
+    """Opening windows per weekday (Monday first) and holidays, with their slot starts precomputed."""
+
+    def __init__(self, windows, holidays=()):
+        self.windows = tuple(tuple(day_windows) for day_windows in windows)
+        self.holidays = frozenset(holidays)
+        self.slot_times = tuple(self._slot_times(day_windows) for day_windows in self.windows)
+
+    @staticmethod
+    def _slot_times(windows):
+        slots = []
+        for open_time, close_time in windows:
+            current = datetime.combine(date.min, open_time)
+            end = datetime.combine(date.min, close_time)
+            while current < end:
+                slots.append(current.time())
+                current += SLOT_LENGTH
+        return tuple(slots)
+
+    def slot_times_on(self, day):
+        """The slot start times of a day, empty if the clinic is closed."""
+        if day in self.holidays:
+            return ()
+        return self.slot_times[day.weekday()]
+
+    def __eq__(self, other):
+        return isinstance(other, Schedule) and (self.windows, self.holidays) == (other.windows, other.holidays)
+
+    def __repr__(self):
+        return f"Schedule({self.windows!r}, holidays={sorted(self.holidays)!r})"
+
+
+def parse_hour(text):
+    """Parse "8AM", "12PM" or "8:30AM" into a time on the slot grid."""
+    match = _HOUR.fullmatch(text.strip())
+    if not match:
+        raise ValueError(f"Invalid hour {text.strip()!r}")
+    hour, minute = int(match[1]), int(match[2] or 0)
+    if not 1 <= hour <= 12 or minute not in (0, 30):
+        raise ValueError(f"Invalid hour {text.strip()!r}, should be on the hour or half hour")
+    hour %= 12
+    if match[3].upper() == "PM":
+        hour += 12
+    return time(hour, minute)
+
+
+def _parse_windows(text):
+    if text.strip().lower() == "closed":
+        return ()
+    windows = []
+    for window in text.split(","):
+        try:
+            open_str, close_str = window.split("-")
+        except ValueError:
+            raise ValueError(f"Invalid opening window {window.strip()!r}, should be like '8AM-5PM'")
+        open_time, close_time = parse_hour(open_str), parse_hour(close_str)
+        if (windows and open_time < windows[-1][1]) or close_time <= open_time:
+            raise ValueError(f"Opening windows must be in order and not overlap: {text.strip()!r}")
+        windows.append((open_time, close_time))
+    return tuple(windows)
+
+
+def _parse_weekdays(text):
+    weekdays = []
+    for part in text.lower().split(","):
+        first, _, last = part.strip().partition("-")
+        try:
+            start, end = WEEKDAYS.index(first), WEEKDAYS.index(last or first)
+        except ValueError:
+            raise ValueError(f"Invalid weekday in {text!r}, should be like 'Mon-Fri' or 'Sat'")
+        weekdays += range(start, end + 1) if start <= end else [*range(start, 7), *range(0, end + 1)]
+    return weekdays
+
+
+def parse_schedule(opening_hours):
+    """Parse a clinic's opening_hours into a Schedule; raise ValueError on anything malformed."""
+    default, by_weekday, holidays = None, {}, set()
+    for group in filter(None, (group.strip() for group in opening_hours.split(";"))):
+        if group.lower().startswith("closed "):
+            try:
+                holidays.update(date.fromisoformat(day.strip()) for day in group[len("closed "):].split(","))
+            except ValueError:
+                raise ValueError(f"Invalid holidays {group!r}, should be like 'closed 2025-12-25, 2026-01-01'")
+            continue
+        match = _WEEKDAYS_PREFIX.fullmatch(group)
+        if match:
+            windows = _parse_windows(match[2])
+            for weekday in _parse_weekdays(match[1]):
+                if weekday in by_weekday:
+                    raise ValueError(f"{WEEKDAYS[weekday].title()} is given hours twice")
+                by_weekday[weekday] = windows
+        elif default is None:
+            default = _parse_windows(group)
+        else:
+            raise ValueError("Only one group of opening hours can leave out the weekdays")
+    if default is None and not by_weekday:
+        raise ValueError(f"Invalid opening hours {opening_hours!r}, should be like '8AM-5PM'")
+    return Schedule([by_weekday.get(weekday, default or ()) for weekday in range(7)], holidays)
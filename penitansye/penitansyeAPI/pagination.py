@@ -0,0 +1,81 @@
+import base64
+import heapq
+from datetime import datetime
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(visit_date, pk):
+    raw = f"{visit_date.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    """Return the (visit_date, id) a cursor points after; raise ValueError if it is malformed."""
+    try:
+        visit_date, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(visit_date), int(pk)
+    except (UnicodeError, ValueError, TypeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def page_size_from(value):
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    size = int(value)
+    if not 1 <= size <= MAX_PAGE_SIZE:
+        raise ValueError(f"page_size must be between 1 and {MAX_PAGE_SIZE}")
+    return size
+
+
+def _page_query(queryset, cursor, page_size):
+    queryset = queryset.order_by("visit_date", "id")
+    if cursor:
+        visit_date, pk = decode_cursor(cursor)
+        # The redundant visit_date__gte lets the database seek straight to the cursor
+        queryset = queryset.filter(visit_date__gte=visit_date).filter(Q(visit_date__gt=visit_date) | Q(id__gt=pk))
+    return queryset[:page_size + 1]
+
+
+def _split_page(rows, page_size):
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1].visit_date, rows[-1].pk)
+    return rows, next_cursor
+
+
+def keyset_page(queryset, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """Return one page of queryset in (visit_date, id) order and the cursor of the next one.
+
+    Unlike offset pagination, every page is a single index range scan,
+    however deep into the table it is.
+    """
+    return _split_page(list(_page_query(queryset, cursor, page_size)), page_size)
+
+
+async def akeyset_page(queryset, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    rows = [row async for row in _page_query(queryset, cursor, page_size)]
+    return _split_page(rows, page_size)
+
+
+def _position(row):
+    return row.visit_date, row.pk
+
+
+def merged_keyset_page(querysets, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """keyset_page over several tables of visits at once, e.g. Record and ArchivedRecord.
+
+    Each queryset gives its own next page_size + 1 rows, one query apiece,
+    and the page is the first page_size of them merged.
+    """
+    pages = [list(_page_query(queryset, cursor, page_size)) for queryset in querysets]
+    return _split_page(list(heapq.merge(*pages, key=_position)), page_size)
+
+
+async def amerged_keyset_page(querysets, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    pages = [[row async for row in _page_query(queryset, cursor, page_size)] for queryset in querysets]
+    return _split_page(list(heapq.merge(*pages, key=_position)), page_size)
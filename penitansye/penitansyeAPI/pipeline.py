@@ -0,0 +1,134 @@
+"""The visit pipeline: past appointments become records, old records move to the archive.
+
+Stage "records" closes every appointment from before the cutoff (local
+midnight of a day): one that already has a Record of the same patient,
+doctor and time (the visit was documented) flags that record as booked;
+one without becomes a Record flagged booked and no_show. Either way the
+appointment is deleted, and the rollups count the same before and after.
+
+Stage "archive" moves records from before the horizon into ArchivedRecord
+under the same ids, where listings, exports and the search (as
+archived_records) still find them.
+
+Both stages take their rows oldest first, CHUNK_SIZE at a time, and commit
+each chunk in one transaction together with the stage's PipelineCheckpoint.
+Moved rows leave their table, so an interrupted run resumes where it
+stopped by running again with the cutoff saved in its checkpoint.
+Like bulk_create, the deletes here send no signals: each chunk updates
+the day schedules, caches and search index itself.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import caching, doctor_days, search
+from .models import Appointment, ArchivedRecord, PipelineCheckpoint, Record
+
+CHUNK_SIZE = 2000
+ARCHIVE_HORIZON_DAYS = 3 * 365
+VISIT_FIELDS = ("id", "patient_id", "doctor_id", "clinic_id", "visit_date", "treatment")
+RECORD_FIELDS = VISIT_FIELDS + ("booked", "no_show")
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _delete(model, ids):
+    # QuerySet.delete() would send post_delete for every row, each refreshing
+    # its day; the chunk does that work once for all of them instead
+    placeholders = ", ".join(["%s"] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM "{model._meta.db_table}" WHERE id IN ({placeholders})', list(ids))
+
+
+def _oldest(model, fields, cutoff, chunk_size):
+    return list(model.objects.filter(visit_date__lt=cutoff).order_by("visit_date", "id").values_list(*fields)[:chunk_size])
+
+
+def record_appointments(cutoff, chunk_size=CHUNK_SIZE):
+    """Close the oldest chunk of appointments from before cutoff; return them as VISIT_FIELDS tuples."""
+    appointments = _oldest(Appointment, VISIT_FIELDS, cutoff, chunk_size)
+    if not appointments:
+        return appointments
+    documented = {
+        (doctor_id, patient_id, visit_date): pk
+        for pk, doctor_id, patient_id, visit_date in Record.objects.filter(
+            doctor_id__in={row[2] for row in appointments},
+            visit_date__gte=appointments[0][4], visit_date__lte=appointments[-1][4],
+        ).values_list("id", "doctor_id", "patient_id", "visit_date")
+    }
+    flagged, created = [], []
+    for pk, patient_id, doctor_id, clinic_id, visit_date, treatment in appointments:
+        record_id = documented.get((doctor_id, patient_id, visit_date))
+        if record_id is not None:
+            flagged.append(record_id)
+        else:
+            created.append(Record(
+                patient_id=patient_id, doctor_id=doctor_id, clinic_id=clinic_id, visit_date=visit_date,
+                treatment=treatment or "", booked=True, no_show=True,
+            ))
+    Record.objects.filter(pk__in=flagged).update(booked=True)
+    Record.objects.bulk_create(created)
+    _delete(Appointment, [row[0] for row in appointments])
+
+    tz = timezone.get_current_timezone()
+    days = {(row[2], row[4].astimezone(tz).date()) for row in appointments}
+    doctor_days.refresh(days)
+    search.index(Record, [record.pk for record in created])
+    search.remove(Appointment, [row[0] for row in appointments])
+    caching.invalidate_on_commit("booked", days)
+    return appointments
+
+
+def archive_records(cutoff, chunk_size=CHUNK_SIZE):
+    """Move the oldest chunk of records from before cutoff to ArchivedRecord; return them as RECORD_FIELDS tuples."""
+    records = _oldest(Record, RECORD_FIELDS, cutoff, chunk_size)
+    if not records:
+        return records
+    ArchivedRecord.objects.bulk_create([ArchivedRecord(**dict(zip(RECORD_FIELDS, row))) for row in records])
+    _delete(Record, [row[0] for row in records])
+    search.remove(Record, [row[0] for row in records])
+    search.index(ArchivedRecord, [row[0] for row in records])
+    return records
+
+
+STAGES = {"records": record_appointments, "archive": archive_records}
+
+
+def checkpoint(stage, cutoff, restart=False):
+    """The checkpoint of stage's unfinished run to resume, or a fresh one for a run up to cutoff."""
+    point, created = PipelineCheckpoint.objects.get_or_create(stage=stage, defaults={"cutoff": cutoff})
+    if not created and (point.finished or restart):
+        point.cutoff, point.reached, point.moved, point.finished = cutoff, None, 0, False
+        point.save()
+    return point
+
+
+def run(stage, cutoff, chunk_size=CHUNK_SIZE, max_chunks=None, restart=False, progress=None):
+    """Run (or resume) stage over the rows from before cutoff; return its checkpoint.
+
+    A resumed run keeps the cutoff it started with. max_chunks stops the run
+    early, unfinished, for a later call to carry on.
+    """
+    move = STAGES[stage]
+    point = checkpoint(stage, cutoff, restart)
+    chunks = 0
+    while not point.finished and (max_chunks is None or chunks < max_chunks):
+        with transaction.atomic():
+            rows = move(point.cutoff, chunk_size)
+            if rows:
+                point.moved += len(rows)
+                point.reached = rows[-1][VISIT_FIELDS.index("visit_date")]
+            else:
+                point.finished = True
+            point.save()
+        chunks += 1
+        if progress is not None and rows:
+            progress(point)
+    return point
+
+
+def archive_horizon(days=ARCHIVE_HORIZON_DAYS):
+    return day_start(timezone.localdate() - timedelta(days=days))
@@ -0,0 +1,236 @@
+"""Pre-aggregated visit counts for the reports: DailyRollup and HourlyRollup.
+
+Each row counts, for one doctor at one clinic and one local day (and hour),
+the appointments booked, the visits recorded and the no-shows: past
+appointments without a record of the same patient, doctor and time, and
+the records pipeline.py made of them.
+
+Booking, moving or cancelling an appointment on a day not over yet only
+changes its booked count, which count() does in place with F() in the
+booking's transaction. Everything else (records, past days, bulk writes)
+is recounted from the tables by refresh(), after the transaction commits
+so that it doesn't hold the write lock. The nightly compact_rollups
+recounts the days that just ended (an appointment only becomes a no-show
+once its day is over) and drops old hourly rows, and rebuild_rollups
+rebuilds or checks any range.
+
+The report functions read the rollups only, never the raw tables.
+"""
+from collections import defaultdict
+from itertools import chain
+from datetime import datetime, time, timedelta
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from . import caching
+from .models import Appointment, ArchivedRecord, DailyRollup, HourlyRollup, Record
+
+COUNTS = ("booked", "visits", "no_shows")
+DAILY_COUNTS = COUNTS + ("slots",)
+BOOKED, VISITS, NO_SHOWS, SLOTS = range(4)
+# The first day of the week (Monday) or month of a day
+GRAINS = {
+    "week": lambda day: day - timedelta(days=day.weekday()),
+    "month": lambda day: day.replace(day=1),
+}
+# Hourly rows older than this are dropped by compact_rollups; daily rows are kept
+HOURLY_RETENTION_DAYS = 730
+
+
+def _visits(model, doctor_ids, first_day, last_day, *fields):
+    queryset = model.objects.order_by()
+    if doctor_ids is not None:
+        queryset = queryset.filter(doctor_id__in=doctor_ids)
+    if first_day is not None:
+        queryset = queryset.filter(
+            visit_date__gte=timezone.make_aware(datetime.combine(first_day, time.min)),
+            visit_date__lt=timezone.make_aware(datetime.combine(last_day + timedelta(days=1), time.min)),
+        )
+    return queryset.values_list("doctor_id", "clinic_id", "patient_id", "visit_date", *fields).iterator(chunk_size=5000)
+
+
+def tally(doctor_ids=None, first_day=None, last_day=None):
+    """{(doctor_id, clinic_id, day, hour): [booked, visits, no_shows]} counted from Appointment and Record.
+
+    Records closed by the visit pipeline count as they did as appointments:
+    booked, plus a visit or a no-show. Archived records count as records.
+    """
+    counts = defaultdict(lambda: [0, 0, 0])
+    # Looked up once: timezone.localtime() would do it for every row
+    tz = timezone.get_current_timezone()
+    today = timezone.localdate()
+    visited = set()
+    records = chain(*(
+        _visits(model, doctor_ids, first_day, last_day, "booked", "no_show") for model in (Record, ArchivedRecord)
+    ))
+    for doctor_id, clinic_id, patient_id, visit_date, booked, no_show in records:
+        local = visit_date.astimezone(tz)
+        row = counts[doctor_id, clinic_id, local.date(), local.hour]
+        row[BOOKED] += booked
+        if no_show:
+            row[NO_SHOWS] += 1
+        else:
+            visited.add((doctor_id, patient_id, visit_date))
+            row[VISITS] += 1
+    for doctor_id, clinic_id, patient_id, visit_date in _visits(Appointment, doctor_ids, first_day, last_day):
+        local = visit_date.astimezone(tz)
+        row = counts[doctor_id, clinic_id, local.date(), local.hour]
+        row[BOOKED] += 1
+        if local.date() < today and (doctor_id, patient_id, visit_date) not in visited:
+            row[NO_SHOWS] += 1
+    return counts
+
+
+def _slots(clinic_id, day, schedules):
+    if clinic_id not in schedules:
+        clinic = caching.clinic_info(clinic_id)
+        schedules[clinic_id] = clinic["schedule"] if clinic else None
+    return len(schedules[clinic_id].slot_times_on(day)) if schedules[clinic_id] is not None else 0
+
+
+def daily(hourly):
+    """{(doctor_id, clinic_id, day): [booked, visits, no_shows, slots]} summed from a tally."""
+    days = defaultdict(lambda: [0, 0, 0, 0])
+    for (doctor_id, clinic_id, day, _), row in hourly.items():
+        total = days[doctor_id, clinic_id, day]
+        for i, count in enumerate(row):
+            total[i] += count
+    schedules = {}
+    for (_, clinic_id, day), total in days.items():
+        total[SLOTS] = _slots(clinic_id, day, schedules)
+    return days
+
+
+def save(hourly, doctor_ids, days=None, first_day=None, last_day=None):
+    """Replace the rollups of doctor_ids on days (or from first_day to last_day) with those of a tally."""
+    stale_hourly, stale_daily = HourlyRollup.objects.all(), DailyRollup.objects.all()
+    if doctor_ids is not None:
+        stale_hourly, stale_daily = stale_hourly.filter(doctor_id__in=doctor_ids), stale_daily.filter(doctor_id__in=doctor_ids)
+    if days is not None:
+        stale_hourly, stale_daily = stale_hourly.filter(day__in=days), stale_daily.filter(day__in=days)
+    elif first_day is not None:
+        stale_hourly = stale_hourly.filter(day__gte=first_day, day__lte=last_day)
+        stale_daily = stale_daily.filter(day__gte=first_day, day__lte=last_day)
+    stale_hourly.delete()
+    stale_daily.delete()
+    HourlyRollup.objects.bulk_create(
+        [HourlyRollup(doctor_id=doctor_id, clinic_id=clinic_id, day=day, hour=hour, **dict(zip(COUNTS, row)))
+         for (doctor_id, clinic_id, day, hour), row in hourly.items()],
+        batch_size=2000,
+    )
+    DailyRollup.objects.bulk_create(
+        [DailyRollup(doctor_id=doctor_id, clinic_id=clinic_id, day=day, **dict(zip(DAILY_COUNTS, row)))
+         for (doctor_id, clinic_id, day), row in daily(hourly).items()],
+        batch_size=2000,
+    )
+
+
+def refresh(pairs):
+    """Recount the rollups of the given (doctor_id, day) pairs, e.g. those doctor_days.day_of() gives."""
+    pairs = set(pairs)
+    if not pairs:
+        return
+    doctor_ids = {doctor_id for doctor_id, _ in pairs}
+    days = {day for _, day in pairs}
+    hourly = tally(doctor_ids, min(days), max(days))
+    # Every (doctor, day) of the cross product is recounted: the tally covers
+    # them all, and it spares an OR of one condition per pair
+    save({key: row for key, row in hourly.items() if key[2] in days}, doctor_ids, days=days)
+
+
+def refresh_on_commit(pairs, using=DEFAULT_DB_ALIAS):
+    """refresh() once the current transaction commits."""
+    pairs = set(pairs)
+    if pairs:
+        transaction.on_commit(lambda: refresh(pairs), using)
+
+
+def count(appointment, delta, using=DEFAULT_DB_ALIAS):
+    """Add delta to the booked count of an appointment's hour and day, or recount a past day after commit."""
+    local = timezone.localtime(appointment.visit_date)
+    day = local.date()
+    if day < timezone.localdate():
+        # The day's no-shows depend on the records too
+        refresh_on_commit([(appointment.doctor_id, day)], using)
+        return
+    keys = {"doctor_id": appointment.doctor_id, "clinic_id": appointment.clinic_id, "day": day}
+    for model, fields in ((HourlyRollup, {"hour": local.hour}), (DailyRollup, {})):
+        rows = model.objects.filter(**keys, **fields)
+        if delta < 0:
+            # A missing or zero row is already stale; rebuild_rollups fixes it
+            rows.filter(booked__gte=-delta).update(booked=F("booked") + delta)
+            # As a recount would, keep no rows for hours and days left empty
+            rows.filter(booked=0, visits=0, no_shows=0).delete()
+        elif not rows.update(booked=F("booked") + delta):
+            if model is DailyRollup:
+                fields = {"slots": _slots(appointment.clinic_id, day, {})}
+            # A concurrent first booking of the day may have created it meanwhile
+            model.objects.bulk_create([model(**keys, **fields)], ignore_conflicts=True)
+            rows.update(booked=F("booked") + delta)
+
+
+def _period(start, end):
+    return {"day__gte": start, "day__lte": end}
+
+
+def _totals(row):
+    totals = {name: row[name] or 0 for name in COUNTS}
+    past = totals["visits"] + totals["no_shows"]
+    totals["no_show_rate"] = round(totals["no_shows"] / past, 4) if past else None
+    return totals
+
+
+def utilization(start, end, doctor_id=None, clinic_id=None):
+    """Per doctor: counts, and booked slots over the slots the clinics were open on the days they worked."""
+    queryset = DailyRollup.objects.filter(**_period(start, end))
+    if doctor_id is not None:
+        queryset = queryset.filter(doctor_id=doctor_id)
+    if clinic_id is not None:
+        queryset = queryset.filter(clinic_id=clinic_id)
+    rows = queryset.values("doctor_id").annotate(**{name: Sum(name) for name in DAILY_COUNTS}).order_by("doctor_id")
+    return [
+        {
+            "doctor": row["doctor_id"], **_totals(row), "slots": row["slots"],
+            "utilization": round(row["booked"] / row["slots"], 4) if row["slots"] else None,
+        }
+        for row in rows
+    ]
+
+
+def clinic_load(clinic_id, start, end):
+    """Appointments booked at a clinic by weekday (Monday is 0) and hour."""
+    load = defaultdict(int)
+    rows = (
+        HourlyRollup.objects.filter(clinic_id=clinic_id, **_period(start, end))
+        .values("day", "hour").annotate(booked=Sum("booked")).values_list("day", "hour", "booked")
+    )
+    for day, hour, booked in rows:
+        load[day.weekday(), hour] += booked
+    return [
+        {"weekday": weekday, "hour": hour, "booked": booked}
+        for (weekday, hour), booked in sorted(load.items())
+    ]
+
+
+def specialization_demand(start, end, grain="week"):
+    """Counts per specialization and week or month, oldest first.
+
+    Summed per specialization and day in SQL and bucketed here: a date
+    truncation in the query would run a Python function per row on SQLite.
+    """
+    periods = defaultdict(lambda: dict.fromkeys(COUNTS, 0))
+    rows = (
+        DailyRollup.objects.filter(**_period(start, end))
+        .values("doctor__specialization", "day")
+        .annotate(**{name: Sum(name) for name in COUNTS}).order_by()
+    )
+    for row in rows:
+        total = periods[GRAINS[grain](row["day"]), row["doctor__specialization"]]
+        for name in COUNTS:
+            total[name] += row[name]
+    return [
+        {"specialization": specialization, "period": period, **_totals(counts)}
+        for (period, specialization), counts in sorted(periods.items())
+    ]
@@ -0,0 +1,168 @@
+"""Read-replica routing with read-your-writes stickiness.
+
+Views decorated with replica_reads (availability, listings, exports) read
+from settings.READ_REPLICA; everything else, and every write, uses the
+primary. Once a request writes (a booking, say), the rest of it reads
+from the primary, and StickyPrimaryMiddleware sets a cookie keeping the
+client's reads there for REPLICA_STICKY_SECONDS, so it doesn't get a page
+from a replica that has not caught up with its own booking yet.
+
+Without a replica configured the router has no opinion and every query
+goes to "default".
+"""
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+STICKY_COOKIE = "penitansye_primary"
+# Writes to these apps pin the client to the primary; sessions and the like don't
+STICKY_APPS = {"penitansyeAPI"}
+
+_routing = ContextVar("penitansye_routing", default=None)
+
+
+class Routing:
+    """Where the current request may read from, filled in while it runs."""
+    __slots__ = ("sticky", "replica", "wrote")
+
+    def __init__(self, sticky=False):
+        self.sticky = sticky  # the client wrote recently: stay on the primary
+        self.replica = False  # inside a replica_reads view
+        self.wrote = False
+
+    def use_replica(self):
+        return self.replica and not (self.sticky or self.wrote)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if settings.READ_REPLICA and routing is not None and routing.use_replica():
+            return settings.READ_REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None and model._meta.app_label in STICKY_APPS:
+            routing.wrote = True
+        instance = hints.get("instance")
+        db = instance._state.db if instance is not None else None
+        if db is not None and db == settings.READ_REPLICA:
+            # A row read from the replica is saved to the primary
+            return DEFAULT_DB_ALIAS
+        # Otherwise the row's own database, or no opinion (explicit using= wins)
+        return db
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        aliases = {DEFAULT_DB_ALIAS, settings.READ_REPLICA}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica follows the primary's schema through replication
+        if settings.READ_REPLICA and db == settings.READ_REPLICA:
+            return False
+        return None
+
+
+def _streamed(chunks, routing):
+    # A streamed body is produced after the view has returned: route the
+    # reads made for each chunk as the view's own
+    chunks = iter(chunks)
+    while True:
+        token = _routing.set(routing)
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        finally:
+            _routing.reset(token)
+        yield chunk
+
+
+def _enter(request):
+    routing = _routing.get()
+    token = None
+    if routing is None:  # called without StickyPrimaryMiddleware, e.g. from a test
+        routing = Routing(sticky=STICKY_COOKIE in request.COOKIES)
+        token = _routing.set(routing)
+    previous, routing.replica = routing.replica, True
+    return routing, previous, token
+
+
+def _leave(routing, previous, token, response):
+    routing.replica = previous
+    if token is not None:
+        _routing.reset(token)
+    if getattr(response, "streaming", False) and not response.is_async:
+        streamed = Routing(routing.sticky)
+        streamed.replica, streamed.wrote = True, routing.wrote
+        response.streaming_content = _streamed(response.streaming_content, streamed)
+    return response
+
+
+def replica_reads(view):
+    """Let the reads of a view go to the read replica. Put it above @api_view and the like."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            routing, previous, token = _enter(request)
+            response = None
+            try:
+                response = await view(request, *args, **kwargs)
+            finally:
+                _leave(routing, previous, token, response)
+            return response
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            routing, previous, token = _enter(request)
+            response = None
+            try:
+                response = view(request, *args, **kwargs)
+            finally:
+                _leave(routing, previous, token, response)
+            return response
+    return wrapper
+
+
+class StickyPrimaryMiddleware:
+    """Track each request's writes and keep a client that wrote on the primary for a while."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _finish(self, routing, response):
+        if routing.wrote:
+            response.set_cookie(STICKY_COOKIE, "1", max_age=settings.REPLICA_STICKY_SECONDS,
+                                httponly=True, samesite="Lax")
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = Routing(sticky=STICKY_COOKIE in request.COOKIES)
+        token = _routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self._finish(routing, response)
+
+    async def __acall__(self, request):
+        routing = Routing(sticky=STICKY_COOKIE in request.COOKIES)
+        token = _routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self._finish(routing, response)
@@ -0,0 +1,11 @@
+"""Validation of Clinic.opening_hours; the parser itself is in opening_hours.py."""
+from django.core.exceptions import ValidationError
+
+from .opening_hours import parse_schedule
+
+
+def validate_opening_hours(value):
+    try:
+        parse_schedule(value)
+    except ValueError as exc:
+        raise ValidationError(str(exc))
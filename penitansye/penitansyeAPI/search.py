@@ -0,0 +1,228 @@
+"""Full-text search over patient symptoms and visit treatments.
+
+On SQLite each searchable model gets an FTS5 table keyed by the row id
+(created by migrations 0008 and 0011), kept in sync by the receivers in signals.py
+and by the bulk writers that bypass them. On PostgreSQL the search runs
+on GIN expression indexes over to_tsvector(), which the database keeps up
+to date itself. Other backends fall back to an icontains scan.
+
+Ranking every match of a common word costs time in proportion to the
+number of matches, so results are ranked (bm25 / ts_rank) among the
+RANK_WINDOW most recent matches only. order="recent" pages through all
+of them by id instead.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .models import Appointment, ArchivedRecord, Patient, Record
+
+SEARCHABLE = {
+    "patients": (Patient, "symptoms"),
+    "records": (Record, "treatment"),
+    # Records moved past the archive horizon by pipeline.py, under the same ids
+    "archived_records": (ArchivedRecord, "treatment"),
+    "appointments": (Appointment, "treatment"),
+}
+RANK_WINDOW = 1000
+ORDERS = ("rank", "recent")
+_WORD = re.compile(r"\w+")
+
+
+def _table(model):
+    return model._meta.db_table
+
+
+class SQLiteSearch:
+    """FTS5 tables named <model table>_fts, one "body" column, rowid = the model's id."""
+
+    def fts_table(self, model):
+        return f"{_table(model)}_fts"
+
+    def create(self, cursor, model, field):
+        """Create the FTS5 table and fill it from the rows already there."""
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS "{self.fts_table(model)}" '
+            f"USING fts5(body, tokenize='porter unicode61 remove_diacritics 2')"
+        )
+        self.reindex(cursor, model, field)
+
+    def drop(self, cursor, model, field):
+        cursor.execute(f'DROP TABLE IF EXISTS "{self.fts_table(model)}"')
+
+    def reindex(self, cursor, model, field):
+        fts = self.fts_table(model)
+        cursor.execute(f'DELETE FROM "{fts}"')
+        cursor.execute(f'INSERT INTO "{fts}"(rowid, body) SELECT id, "{field}" FROM "{_table(model)}"')
+        cursor.execute(f"""INSERT INTO "{fts}"("{fts}") VALUES ('optimize')""")
+
+    def index(self, cursor, model, field, pks):
+        placeholders = ", ".join(["%s"] * len(pks))
+        cursor.execute(
+            f'INSERT OR REPLACE INTO "{self.fts_table(model)}"(rowid, body) '
+            f'SELECT id, "{field}" FROM "{_table(model)}" WHERE id IN ({placeholders})',
+            list(pks),
+        )
+
+    def remove(self, cursor, model, field, pks):
+        placeholders = ", ".join(["%s"] * len(pks))
+        cursor.execute(f'DELETE FROM "{self.fts_table(model)}" WHERE rowid IN ({placeholders})', list(pks))
+
+    @staticmethod
+    def match(words):
+        # Every word must appear; the last one may be a prefix, for search-as-you-type
+        return " ".join(f'"{word}"' for word in words) + "*"
+
+    def ranked(self, cursor, model, field, words, offset, limit):
+        fts, match = self.fts_table(model), self.match(words)
+        cursor.execute(
+            f'SELECT rowid, -rank FROM "{fts}" WHERE "{fts}" MATCH %s AND rowid >= COALESCE('
+            f'(SELECT rowid FROM "{fts}" WHERE "{fts}" MATCH %s ORDER BY rowid DESC LIMIT 1 OFFSET %s), 0) '
+            f"ORDER BY rank LIMIT %s OFFSET %s",
+            [match, match, RANK_WINDOW - 1, limit, offset],
+        )
+        return cursor.fetchall()
+
+    def recent(self, cursor, model, field, words, before, limit):
+        fts = self.fts_table(model)
+        cursor.execute(
+            f'SELECT rowid, NULL FROM "{fts}" WHERE "{fts}" MATCH %s AND rowid < %s ORDER BY rowid DESC LIMIT %s',
+            [self.match(words), before, limit],
+        )
+        return cursor.fetchall()
+
+
+class PostgresSearch:
+    """GIN indexes on to_tsvector('english', ...) of each searchable column.
+
+    The queries repeat the indexed expression word for word, as PostgreSQL
+    only uses an expression index for the same expression.
+    """
+
+    def index_name(self, model, field):
+        return f"{_table(model)}_{field}_fts"[:63]
+
+    def document(self, field):
+        return f"""to_tsvector('english', COALESCE("{field}", ''))"""
+
+    def create(self, cursor, model, field):
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{self.index_name(model, field)}" '
+            f'ON "{_table(model)}" USING gin (({self.document(field)}))'
+        )
+
+    def drop(self, cursor, model, field):
+        cursor.execute(f'DROP INDEX IF EXISTS "{self.index_name(model, field)}"')
+
+    def reindex(self, cursor, model, field):
+        cursor.execute(f'REINDEX INDEX "{self.index_name(model, field)}"')
+
+    def index(self, cursor, model, field, pks):
+        pass  # the index follows the table
+
+    def remove(self, cursor, model, field, pks):
+        pass
+
+    def ranked(self, cursor, model, field, words, offset, limit):
+        table, document = _table(model), self.document(field)
+        query = "websearch_to_tsquery('english', %s)"
+        cursor.execute(
+            f"SELECT id, ts_rank({document}, {query}) AS score FROM \"{table}\" "
+            f"WHERE id IN (SELECT id FROM \"{table}\" WHERE {document} @@ {query} ORDER BY id DESC LIMIT %s) "
+            f"ORDER BY score DESC, id DESC LIMIT %s OFFSET %s",
+            [" ".join(words), " ".join(words), RANK_WINDOW, limit, offset],
+        )
+        return cursor.fetchall()
+
+    def recent(self, cursor, model, field, words, before, limit):
+        table, document = _table(model), self.document(field)
+        cursor.execute(
+            f"SELECT id, NULL FROM \"{table}\" WHERE {document} @@ websearch_to_tsquery('english', %s) "
+            f"AND id < %s ORDER BY id DESC LIMIT %s",
+            [" ".join(words), before, limit],
+        )
+        return cursor.fetchall()
+
+
+class ScanSearch:
+    """icontains on every word, for databases without full-text support here."""
+
+    def create(self, cursor, model, field):
+        pass
+
+    drop = reindex = create
+
+    def index(self, cursor, model, field, pks):
+        pass
+
+    remove = index
+
+    def _matches(self, model, field, words):
+        queryset = model.objects.order_by("-id")
+        for word in words:
+            queryset = queryset.filter(**{f"{field}__icontains": word})
+        return queryset
+
+    def ranked(self, cursor, model, field, words, offset, limit):
+        ids = self._matches(model, field, words).values_list("id", flat=True)[:RANK_WINDOW][offset:offset + limit]
+        return [(pk, None) for pk in ids]
+
+    def recent(self, cursor, model, field, words, before, limit):
+        ids = self._matches(model, field, words).filter(id__lt=before).values_list("id", flat=True)[:limit]
+        return [(pk, None) for pk in ids]
+
+
+BACKENDS = {"sqlite": SQLiteSearch(), "postgresql": PostgresSearch()}
+
+
+def backend(vendor):
+    return BACKENDS.get(vendor, ScanSearch())
+
+
+def words_of(query):
+    return _WORD.findall(query.lower())
+
+
+def index(model, pks, using=DEFAULT_DB_ALIAS):
+    """Bring the search index up to date with these rows of a searchable model, e.g. after a bulk_create."""
+    pks = list(pks)
+    if pks:
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            backend(connection.vendor).index(cursor, model, _field_of(model), pks)
+
+
+def remove(model, pks, using=DEFAULT_DB_ALIAS):
+    pks = list(pks)
+    if pks:
+        connection = connections[using]
+        with connection.cursor() as cursor:
+            backend(connection.vendor).remove(cursor, model, _field_of(model), pks)
+
+
+def reindex(model, using=DEFAULT_DB_ALIAS):
+    """Rebuild the search index of a searchable model from its table."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        backend(connection.vendor).reindex(cursor, model, _field_of(model))
+
+
+def _field_of(model):
+    return next(field for searchable, field in SEARCHABLE.values() if searchable is model)
+
+
+def search(kind, query, order="rank", page=1, page_size=20, before=None, using=DEFAULT_DB_ALIAS):
+    """[(id, score)] of the kind's rows matching every word of query; score is None when unranked."""
+    model, field = SEARCHABLE[kind]
+    words = words_of(query)
+    if not words:
+        return []
+    connection = connections[using]
+    search_backend = backend(connection.vendor)
+    with connection.cursor() as cursor:
+        if order == "recent":
+            return search_backend.recent(cursor, model, field, words, before or 2**63 - 1, page_size)
+        offset = (page - 1) * page_size
+        if offset >= RANK_WINDOW:
+            return []
+        return search_backend.ranked(cursor, model, field, words, offset, min(page_size, RANK_WINDOW - offset))
@@ -0,0 +1,129 @@
+"""Bulk generation of realistic volumes of data for tests, benchmarks and load tests."""
+import random
+from datetime import date, datetime, timedelta
+
+from django.utils import timezone
+
+from .models import Appointment, Clinic, Doctor, Patient, Record
+
+SLOTS_PER_DAY = 18  # 8AM-5PM in 30-minute slots
+# Passwords starting with "!" are unusable, which skips hashing every row
+UNUSABLE_PASSWORD = "!seeded"
+
+SPECIALIZATIONS = [
+    "Cardiology", "Dermatology", "Pediatrics", "Neurology", "Orthopedics",
+    "General Practice", "Gynecology", "Ophthalmology", "Psychiatry", "Oncology",
+]
+TREATMENTS = [
+    "General checkup", "Chest pain evaluation", "Blood pressure follow-up",
+    "Skin rash treatment", "Vaccination", "Physiotherapy session",
+    "Migraine consultation", "Fracture follow-up", "Prescription renewal",
+    "Blood test review", "Allergy testing", "Prenatal visit",
+]
+SYMPTOMS = [
+    "cough", "fever", "chest pain", "headache", "back pain", "rash",
+    "fatigue", "dizziness", "shortness of breath", "nausea", "joint pain",
+]
+BLOOD_TYPES = ["O+", "O-", "A+", "A-", "B+", "B-", "AB+", "AB-"]
+
+
+def slot(first_day, n):
+    """Return the n-th 30-minute slot after first_day at 8AM, skipping closed hours."""
+    day, i = divmod(n, SLOTS_PER_DAY)
+    return first_day + timedelta(days=day, hours=8, minutes=30 * i)
+
+
+def batches(objects, batch_size):
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bulk_insert(model, objects, batch_size, using="default"):
+    """Insert objects with bulk_create in batches and return the new primary keys."""
+    pks = []
+    for batch in batches(objects, batch_size):
+        pks.extend(obj.pk for obj in model.objects.using(using).bulk_create(batch))
+    return pks
+
+
+def seed_clinics(n, offset=0, batch_size=10000, using="default"):
+    return bulk_insert(Clinic, (
+        Clinic(
+            clinic_name=f"Clinic {offset + i}", address=f"{i + 1} Main St", city="Metropolis",
+            province="MetroState", zipcode="12345", phone="555-1111",
+            email=f"clinic{offset + i}@seed.example.com", opening_hours="8AM-5PM",
+        )
+        for i in range(n)
+    ), batch_size, using)
+
+
+def seed_doctors(n, offset=0, batch_size=10000, using="default", rng=None):
+    rng = rng or random.Random(0)
+    return bulk_insert(Doctor, (
+        Doctor(
+            firstname="Doc", lastname=f"Tor{offset + i}", date_of_birth=date(1980, 1, 1),
+            email=f"doctor{offset + i}@seed.example.com", password=UNUSABLE_PASSWORD,
+            specialization=rng.choice(SPECIALIZATIONS), licence_number=f"LIC{offset + i}",
+            years_of_experience=rng.randint(1, 40),
+        )
+        for i in range(n)
+    ), batch_size, using)
+
+
+def seed_patients(n, offset=0, batch_size=10000, using="default", rng=None):
+    rng = rng or random.Random(0)
+    return bulk_insert(Patient, (
+        Patient(
+            firstname="Pat", lastname=f"Ient{offset + i}", date_of_birth=date(1990, 1, 1),
+            email=f"patient{offset + i}@seed.example.com", password=UNUSABLE_PASSWORD,
+            emmergencycontactname="Next Of Kin", emmergencycontactphone="555-2222",
+            bloodType=rng.choice(BLOOD_TYPES), Allergies="None",
+            symptoms=", ".join(rng.sample(SYMPTOMS, 2)),
+        )
+        for i in range(n)
+    ), batch_size, using)
+
+
+def seed_visits(model, n, clinic_ids, doctor_ids, patient_ids, first_day,
+                batch_size=10000, using="default", rng=None):
+    """Bulk-create n appointments or records, one per doctor and slot from first_day on.
+
+    Slots are filled doctor by doctor, so the ('doctor', 'visit_date')
+    constraint holds however many rows are asked for.
+    """
+    rng = rng or random.Random(0)
+    doctors = len(doctor_ids)
+
+    def visits():
+        for i in range(n):
+            n_slot, doctor = divmod(i, doctors)
+            yield model(
+                patient_id=rng.choice(patient_ids),
+                doctor_id=doctor_ids[doctor],
+                clinic_id=rng.choice(clinic_ids),
+                visit_date=slot(first_day, n_slot),
+                treatment=rng.choice(TREATMENTS),
+            )
+
+    created = 0
+    for batch in batches(visits(), batch_size):
+        model.objects.using(using).bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+def first_day_for(days_back=0):
+    """Midnight of today minus days_back, in the current time zone."""
+    today = timezone.localdate() - timedelta(days=days_back)
+    return timezone.make_aware(datetime.combine(today, datetime.min.time()))
+
+
+def days_needed(rows, doctors):
+    return rows // doctors // SLOTS_PER_DAY + 1
+
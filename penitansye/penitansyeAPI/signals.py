@@ -0,0 +1,143 @@
+"""Cache invalidation: every cached read in caching.py is dropped here once its rows' change commits.
+
+The DoctorDay rows of doctor_days.py, the visit rollups of rollups.py and
+the full-text index of search.py are kept up to date here as well, and
+the slot changes of feed.py are published from here.
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import caching, doctor_days, feed, rollups, search
+from .models import Appointment, ArchivedRecord, Clinic, Doctor, Patient, Record
+
+
+@receiver(pre_save, sender=Doctor, dispatch_uid="doctor-previous")
+@receiver(pre_save, sender=Appointment, dispatch_uid="appointment-previous")
+@receiver(pre_save, sender=Record, dispatch_uid="record-previous")
+def remember_previous(sender, instance, **kwargs):
+    # An update can move a row out of the entry it was cached under (a doctor
+    # changing specialization, an appointment moving day), so remember where
+    # it was. Inserts, including every booking, skip the lookup.
+    instance._previous = None
+    if instance.pk is not None:
+        instance._previous = sender._default_manager.filter(pk=instance.pk).first()
+
+
+# The Patient fields shown in the day schedules
+PATIENT_NAME_FIELDS = {"firstname", "lastname"}
+
+
+@receiver(pre_save, sender=Patient, dispatch_uid="patient-previous-name")
+def remember_previous_name(sender, instance, update_fields=None, **kwargs):
+    # Saves that leave the names out of update_fields (last_login on every
+    # login) skip the lookup
+    instance._previous_name = None
+    if instance.pk is not None and (update_fields is None or PATIENT_NAME_FIELDS & set(update_fields)):
+        instance._previous_name = (
+            sender._default_manager.filter(pk=instance.pk).values_list("firstname", "lastname").first()
+        )
+
+
+@receiver([post_save, post_delete], sender=Doctor, dispatch_uid="doctor-cache")
+def doctor_changed(sender, instance, using, **kwargs):
+    caching.invalidate_on_commit("doctor-choices", [()], using)
+    caching.invalidate_on_commit("specialization-facets", [()], using)
+    caching.invalidate_on_commit("doctors-by-specialization", {
+        (caching.specialization_key(doctor.specialization),)
+        for doctor in (instance, getattr(instance, "_previous", None)) if doctor is not None
+    }, using)
+
+
+@receiver([post_save, post_delete], sender=Clinic, dispatch_uid="clinic-cache")
+def clinic_changed(sender, instance, using, **kwargs):
+    caching.invalidate_on_commit("clinic-choices", [()], using)
+    caching.invalidate_on_commit("clinic", [(instance.pk,)], using)
+
+
+@receiver([post_save, post_delete], sender=Appointment, dispatch_uid="appointment-cache")
+def appointment_changed(sender, instance, using, **kwargs):
+    days = {
+        doctor_days.day_of(appointment)
+        for appointment in (instance, getattr(instance, "_previous", None)) if appointment is not None
+    }
+    caching.invalidate_on_commit("booked", days, using)
+    doctor_days.refresh_on_commit(days, using)
+
+
+def _moved(previous, appointment):
+    return previous is not None and feed.change("booked", previous) != feed.change("booked", appointment)
+
+
+@receiver(post_save, sender=Appointment, dispatch_uid="appointment-rollups")
+def appointment_counted(sender, instance, created, using, **kwargs):
+    previous = getattr(instance, "_previous", None)
+    if created:
+        rollups.count(instance, 1, using)
+    elif _moved(previous, instance):
+        rollups.count(previous, -1, using)
+        rollups.count(instance, 1, using)
+
+
+@receiver(post_delete, sender=Appointment, dispatch_uid="appointment-rollups-delete")
+def appointment_uncounted(sender, instance, using, **kwargs):
+    rollups.count(instance, -1, using)
+
+
+@receiver(post_save, sender=Appointment, dispatch_uid="appointment-feed")
+def appointment_saved(sender, instance, created, using, **kwargs):
+    previous = getattr(instance, "_previous", None)
+    changes = []
+    if _moved(previous, instance):
+        changes.append(feed.change("freed", previous))
+    if created or changes:
+        changes.append(feed.change("booked", instance))
+    feed.publish_on_commit(changes, using)
+
+
+@receiver(post_delete, sender=Appointment, dispatch_uid="appointment-feed-delete")
+def appointment_deleted(sender, instance, using, **kwargs):
+    feed.publish_on_commit([feed.change("freed", instance)], using)
+
+
+@receiver([post_save, post_delete], sender=Record, dispatch_uid="record-rollups")
+def record_changed(sender, instance, using, **kwargs):
+    records = [record for record in (instance, getattr(instance, "_previous", None)) if record is not None]
+    rollups.refresh_on_commit((doctor_days.day_of(record) for record in records), using)
+    # The records of appointments show in the day schedules
+    doctor_days.refresh_on_commit((doctor_days.day_of(record) for record in records if record.booked), using)
+
+
+@receiver(post_save, sender=Patient, dispatch_uid="patient-doctor-days")
+def patient_changed(sender, instance, created, using, **kwargs):
+    # Day schedules show patient names, so a rename rewrites every day the
+    # patient is on. That includes the archived ones: their DoctorDay rows are
+    # still served, and rebuild_doctor_days --check compares them to the
+    # archive with today's names. Renames are rare; other saves (symptoms,
+    # passwords) and new patients, who have no visits yet, read nothing.
+    previous = getattr(instance, "_previous_name", None)
+    if not created and previous is not None and previous != (instance.firstname, instance.lastname):
+        visits = (
+            model.objects.filter(patient=instance, **filters).values_list("doctor_id", "visit_date")
+            for model, filters in ((Appointment, {}), (Record, {"booked": True}), (ArchivedRecord, {"booked": True}))
+        )
+        doctor_days.refresh_on_commit(
+            ((doctor_id, timezone.localtime(visit_date).date()) for rows in visits for doctor_id, visit_date in rows),
+            using,
+        )
+
+
+@receiver(post_save, sender=Patient, dispatch_uid="patient-search")
+@receiver(post_save, sender=Record, dispatch_uid="record-search")
+@receiver(post_save, sender=ArchivedRecord, dispatch_uid="archived-record-search")
+@receiver(post_save, sender=Appointment, dispatch_uid="appointment-search")
+def searchable_saved(sender, instance, using, **kwargs):
+    search.index(sender, [instance.pk], using)
+
+
+@receiver(post_delete, sender=Patient, dispatch_uid="patient-search-delete")
+@receiver(post_delete, sender=Record, dispatch_uid="record-search-delete")
+@receiver(post_delete, sender=ArchivedRecord, dispatch_uid="archived-record-search-delete")
+@receiver(post_delete, sender=Appointment, dispatch_uid="appointment-search-delete")
+def searchable_deleted(sender, instance, using, **kwargs):
+    search.remove(sender, [instance.pk], using)
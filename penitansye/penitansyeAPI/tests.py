@@ -1,3 +1,1121 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, router
+from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import LiveServerTestCase, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from . import caching, feed, pipeline, search
+from .availability import booked_by_day
+from .booking import SlotTaken, book_appointment
+from .caching import clinic_info, doctors_with_specialization
+from .importing import PatientImport
+from .metrics import N_PLUS_ONE_THRESHOLD, MetricsMiddleware, registry
+from .models import Appointment, ArchivedRecord, Clinic, DailyRollup, Doctor, DoctorDay, HourlyRollup, Patient, PipelineCheckpoint, Record
+from .routers import STICKY_COOKIE, ReplicaRouter, StickyPrimaryMiddleware, replica_reads
+from .opening_hours import parse_schedule
+from .schedule import validate_opening_hours
+from .seeding import days_needed, seed_clinics, seed_doctors, seed_patients, seed_visits
+from .views import _patient_matches
+
+# Set PLAN_TEST_ROWS=1000000 for the full-size run
+PLAN_TEST_ROWS = int(os.environ.get('PLAN_TEST_ROWS', 5000))
+
+
+class ScheduleTests(SimpleTestCase):
+    """Opening hours parse into each weekday's slots, and malformed ones are refused with the reason."""
+
+    def test_parse(self):
+        schedule = parse_schedule('Mon-Fri 8AM-12PM, 1PM-5PM; Sat 9:30AM-1PM; closed 2025-12-25, 2026-01-01')
+        monday, saturday, sunday = date(2025, 12, 22), date(2025, 12, 27), date(2025, 12, 28)
+        slots = schedule.slot_times_on(monday)
+        self.assertEqual((len(slots), slots[0], slots[-1]), (16, time(8), time(16, 30)))
+        self.assertNotIn(time(12, 30), slots)
+        self.assertEqual(schedule.slot_times_on(saturday)[:2], (time(9, 30), time(10)))
+        self.assertEqual(schedule.slot_times_on(sunday), ())  # no group for the other days
+        self.assertEqual(schedule.slot_times_on(date(2025, 12, 25)), ())
+        self.assertEqual(schedule.holidays, {date(2025, 12, 25), date(2026, 1, 1)})
+
+        # The group without weekdays gives every weekday not named its hours; ranges wrap around Sunday
+        schedule = parse_schedule('8AM-5PM; Fri-Mon 12PM-2PM')
+        self.assertEqual([len(schedule.slot_times_on(monday + timedelta(days=i))) for i in range(7)],
+                         [4, 18, 18, 18, 4, 4, 4])
+        self.assertEqual(parse_schedule('8am-5pm'), parse_schedule('Mon-Sun 8AM-5PM'))
+
+    def test_malformed(self):
+        for opening_hours in ('', 'whenever', '8AM', '8AM-17', '9AM-8AM', '8:15AM-5PM', '8AM-12PM, 11AM-5PM',
+                              'Mon 8AM-5PM; mon 9AM-1PM', '8AM-5PM; 9AM-1PM', 'Xyz 8AM-5PM', 'closed 2025-13-01'):
+            with self.subTest(opening_hours), self.assertRaises(ValueError):
+                parse_schedule(opening_hours)
+
+    def test_validator(self):
+        validate_opening_hours('Mon-Fri 8AM-5PM')
+        with self.assertRaisesMessage(ValidationError, 'Sat is given hours twice'):
+            Clinic._meta.get_field('opening_hours').clean('Sat 9AM-1PM; Fri-Sat 8AM-5PM', None)
+
+
+class QueryPlanTests(TestCase):
+    """The canonical schedule, history and day-view queries must stay on an index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clinics, cls.doctors, cls.patients = seed_clinics(5), seed_doctors(50), seed_patients(500)
+        first_day = timezone.make_aware(datetime(2020, 1, 1))
+        for model in (Appointment, Record):
+            seed_visits(model, PLAN_TEST_ROWS, cls.clinics, cls.doctors, cls.patients, first_day)
+        cls.day_start = first_day + timedelta(days=days_needed(PLAN_TEST_ROWS, 50) // 2)
+        cls.day_end = cls.day_start + timedelta(days=1)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Small tables are cheaper to scan; penalise scans so that only a
+            # missing index makes the planner fall back to one.
+            with connection.cursor() as cursor:
+                cursor.execute('SET enable_seqscan = off')
+
+    def canonical_queries(self):
+        doctor, patient, clinic = self.doctors[0], self.patients[0], self.clinics[0]
+        day = {'visit_date__gte': self.day_start, 'visit_date__lt': self.day_end}
+        return {
+            'appointment doctor schedule': Appointment.objects.filter(doctor_id=doctor, **day).order_by('visit_date'),
+            'appointment patient history': Appointment.objects.filter(patient_id=patient).order_by('-visit_date'),
+            'appointment clinic day': Appointment.objects.filter(clinic_id=clinic, **day).order_by('visit_date'),
+            'availability': Appointment.objects.filter(
+                doctor_id__in=self.doctors[:5], **day
+            ).order_by().values_list('doctor_id', 'visit_date'),
+            'record doctor schedule': Record.objects.filter(doctor_id=doctor, **day).order_by('visit_date'),
+            'record patient history': Record.objects.filter(patient_id=patient).order_by('-visit_date'),
+            'record clinic day': Record.objects.filter(clinic_id=clinic, **day).order_by('visit_date'),
+            'appointment listing page': Appointment.objects.filter(visit_date__gte=self.day_start).filter(
+                Q(visit_date__gt=self.day_start) | Q(id__gt=0)
+            ).order_by('visit_date', 'id')[:51],
+        }
+
+    def assertIndexed(self, name, queryset, sorted_by_index=True):
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            table = queryset.model._meta.db_table
+            self.assertNotIn(f'SCAN {table}', plan, f"{name} scans the table:\n{plan}")
+            if sorted_by_index:
+                self.assertNotIn('TEMP B-TREE', plan, f"{name} sorts outside the index:\n{plan}")
+        else:
+            self.assertNotIn('Seq Scan', plan, f"{name} scans the table:\n{plan}")
+
+    def test_canonical_queries_use_indexes(self):
+        for name, queryset in self.canonical_queries().items():
+            with self.subTest(name):
+                self.assertIndexed(name, queryset)
+
+    def test_patient_search_uses_indexes(self):
+        # The few matches are sorted after the index seeks
+        self.assertIndexed('patient search', _patient_matches('ient12'), sorted_by_index=False)
+
+    def test_specialization_lookup_uses_index(self):
+        self.assertIndexed('doctors by specialization', doctors_with_specialization('Cardiology'), sorted_by_index=False)
+
+
+class ListingQueryCountTests(TestCase):
+    """Listing pages cost one query per table listed (records include the archive) whatever their size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        clinics, doctors, patients = seed_clinics(3), seed_doctors(10), seed_patients(50)
+        first_day = timezone.make_aware(datetime(2025, 1, 1))
+        for model in (Appointment, Record):
+            seed_visits(model, 1100, clinics, doctors, patients, first_day)
+        cls.staff = User.objects.create_user('staff', is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def fetch_all(self, url_name, page_size, queries):
+        seen, cursor = [], None
+        while True:
+            params = {'page_size': page_size}
+            if cursor:
+                params['cursor'] = cursor
+            with self.assertNumQueries(queries):
+                body = self.client.get(reverse(url_name), params).json()
+            self.assertLessEqual(len(body['results']), page_size)
+            seen.extend((row['visit_date'], row['id']) for row in body['results'])
+            cursor = body['next']
+            if cursor is None:
+                return seen
+
+    def test_query_count_is_constant_per_page(self):
+        # The session and its user, then one query per table
+        for url_name, queries in (('penitansye:appointments_list', 3), ('penitansye:records_list', 4)):
+            for page_size in (10, 1000):
+                with self.subTest(url_name, page_size=page_size):
+                    seen = self.fetch_all(url_name, page_size, queries)
+                    self.assertEqual(len(seen), 1100)
+                    self.assertEqual(seen, sorted(seen))
+                    self.assertEqual(len(set(seen)), 1100)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('penitansye:appointments_list'), {'cursor': 'nope'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_staff_only(self):
+        token = Token.objects.create(user=self.staff)
+        names = ('appointments_list', 'records_list', 'appointments_list_async', 'records_list_async')
+        for url_name in names:
+            url = reverse(f'penitansye:{url_name}')
+            with self.subTest(url_name):
+                self.client.logout()
+                self.assertEqual(self.client.get(url).status_code, 401)
+                self.assertEqual(self.client.get(url, headers={'Authorization': f'Token {token.key}'}).status_code, 200)
+                self.client.force_login(User.objects.get_or_create(username='patient')[0])
+                self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class PatientSearchTests(TestCase):
+    """Staff find patients by the start of a name or email, whatever its case."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_patients(30)
+        cls.staff = User.objects.create_user('staff', is_staff=True)
+
+    def search(self, q):
+        return self.client.get(reverse('penitansye:patient_search'), {'q': q})
+
+    def test_prefix_matches(self):
+        self.client.force_login(self.staff)
+        labels = [row['label'] for row in self.search('IENT1').json()['results']]
+        self.assertEqual(len(labels), 11)
+        self.assertTrue(all(label.startswith('Pat Ient1') for label in labels))
+        self.assertEqual(self.search('i').json()['results'], [])
+
+    def test_staff_only(self):
+        self.assertEqual(self.search('ient1').status_code, 403)
+        self.client.force_login(User.objects.create_user('patient'))
+        self.assertEqual(self.search('ient1').status_code, 403)
+
+
+class AvailabilityTests(TestCase):
+    """Free slots of several doctors cost two queries, then none while cached; long ranges stream."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clinic, = seed_clinics(1)
+        cls.doctors = seed_doctors(2)
+        cls.patient, = seed_patients(1)
+        cls.nine = timezone.make_aware(datetime(2025, 1, 6, 9))  # a Monday
+        Appointment.objects.create(patient_id=cls.patient, doctor_id=cls.doctors[0], clinic_id=cls.clinic,
+                                   visit_date=cls.nine)
+
+    def setUp(self):
+        cache.clear()
+
+    def availability(self, **params):
+        params = {'doctors': ','.join(map(str, self.doctors)), 'clinic': self.clinic, 'start': '2025-01-06', **params}
+        return self.client.get(reverse('penitansye:availability'), params)
+
+    def test_free_slots_per_doctor_and_day(self):
+        # The clinic, then the booked slots of every doctor and day at once
+        with self.assertNumQueries(2):
+            body = self.availability().json()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.availability().json(), body)
+        first, second = body['slots']
+        self.assertEqual((first['doctor'], first['date']), (self.doctors[0], '2025-01-06'))
+        self.assertEqual(len(first['free']), 17)
+        self.assertNotIn('09:00', first['free'])
+        self.assertEqual((second['free'][0], second['free'][-1], len(second['free'])), ('08:00', '16:30', 18))
+
+    def test_long_ranges_stream(self):
+        response = self.availability(end='2025-01-19')
+        self.assertTrue(response.streaming)
+        slots = json.loads(b''.join(response.streaming_content))['slots']
+        self.assertEqual(len(slots), 2 * 14)
+        self.assertEqual([row['date'] for row in slots[:3]], ['2025-01-06', '2025-01-06', '2025-01-07'])
+
+    def test_refusals(self):
+        self.assertEqual(self.availability(doctors='x').status_code, 400)
+        self.assertEqual(self.availability(end='2024-01-01').status_code, 400)
+        self.assertEqual(self.availability(clinic=0).status_code, 404)
+        Clinic.objects.filter(pk=self.clinic).update(opening_hours='whenever')
+        self.assertEqual(self.availability().status_code, 422)
+
+
+class BatchBookingTests(TestCase):
+    """A batch costs the same few queries whatever its size, and reports on every appointment."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clinic, = seed_clinics(1)
+        cls.doctor, = seed_doctors(1)
+        cls.patient, = seed_patients(1)
+        cls.first_visit = timezone.make_aware(datetime(2025, 1, 6, 9))
+        cls.token = Token.objects.create(user=User.objects.create_user('client'))
+
+    def setUp(self):
+        cache.clear()
+
+    def item(self, visit_date, **extra):
+        return {'patient': self.patient, 'doctor': self.doctor, 'clinic': self.clinic,
+                'visit_date': visit_date.isoformat(), **extra}
+
+    def post(self, items, **headers):
+        headers.setdefault('HTTP_AUTHORIZATION', f'Token {self.token.key}')
+        return self.client.post(reverse('penitansye:appointments_batch'), {'appointments': items},
+                                content_type='application/json', **headers)
+
+    def test_recurring_batch_reports_each_appointment(self):
+        Appointment.objects.create(
+            patient_id=self.patient, doctor_id=self.doctor, clinic_id=self.clinic,
+            visit_date=self.first_visit + timedelta(weeks=2),
+        )
+        items = [
+            self.item(self.first_visit, repeat={'every_days': 7, 'count': 4}),
+            self.item(self.first_visit),
+            self.item(self.first_visit.replace(hour=20)),
+            {**self.item(self.first_visit), 'doctor': 0},
+        ]
+        # The token, then the batch; the cache, day schedules and rollups are
+        # updated after the commit, outside the batch's transaction
+        with self.captureOnCommitCallbacks() as callbacks, self.assertNumQueries(9):
+            response = self.post(items)
+        self.assertEqual(len(callbacks), 4)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(
+            [(row['index'], row['status']) for row in body['results']],
+            [(0, 'booked'), (0, 'booked'), (0, 'conflict'), (0, 'booked'),
+             (1, 'conflict'), (2, 'closed'), (3, 'invalid')],
+        )
+        self.assertEqual(body['booked'], 3)
+        self.assertEqual(Appointment.objects.filter(doctor_id=self.doctor).count(), 4)
+
+    def test_oversized_batch(self):
+        items = [self.item(self.first_visit, repeat={'every_days': 1, 'count': 5000})]
+        self.assertEqual(self.post(items).status_code, 400)
+
+    def test_anonymous_batch(self):
+        items = [self.item(self.first_visit)]
+        for headers in ({'HTTP_AUTHORIZATION': ''}, {'HTTP_AUTHORIZATION': 'Token nope'}):
+            with self.subTest(**headers):
+                response = self.post(items, **headers)
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(response['WWW-Authenticate'], 'Token')
+        self.assertFalse(Appointment.objects.exists())
+
+
+class BookingConflictTests(TestCase):
+    """A taken slot raises SlotTaken with the nearest free ones; other integrity errors are not mistaken for it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clinic, = seed_clinics(1)
+        cls.doctor, = seed_doctors(1)
+        cls.patients = seed_patients(2)
+        monday = timezone.localdate() + timedelta(days=7 - timezone.localdate().weekday())
+        cls.nine = timezone.make_aware(datetime.combine(monday, datetime.min.time()).replace(hour=9))
+
+    def setUp(self):
+        cache.clear()
+
+    def appointment(self, patient, **fields):
+        return Appointment(**{'patient_id': patient, 'doctor_id': self.doctor, 'clinic_id': self.clinic,
+                               'visit_date': self.nine, **fields})
+
+    def test_conflict_offers_nearest_free_slots(self):
+        first, second = self.patients
+        book_appointment(self.appointment(first))
+        booked_by_day([self.doctor], self.nine.date(), self.nine.date())
+        clinic_info(self.clinic)
+        # The rolled back insert, and nothing more: the rest comes from the cache
+        with self.assertNumQueries(4), self.assertRaises(SlotTaken) as raised:
+            book_appointment(self.appointment(second))
+        self.assertEqual(
+            [timezone.localtime(slot).strftime('%H:%M') for slot in raised.exception.alternatives],
+            ['08:00', '08:30', '09:30'],
+        )
+
+    def test_form_shows_nearest_free_slots(self):
+        first, second = self.patients
+        book_appointment(self.appointment(first))
+        response = self.client.post(reverse('penitansye:appointment'), {
+            'patient': second, 'doctor': self.doctor, 'clinic': self.clinic,
+            'visit_date': timezone.localtime(self.nine).strftime('%Y-%m-%d %H:%M'),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([str(message) for message in response.context['messages']], [
+            'This time slot is already taken.', 'Nearest free slots that day: 08:00, 08:30, 09:30',
+        ])
+        self.assertEqual(Appointment.objects.filter(doctor_id=self.doctor).count(), 1)
+
+    def test_form_for_non_staff(self):
+        # The patient picker's search is staff only: the page falls back to typing the id
+        self.client.force_login(User.objects.create_user('desk'))
+        self.assertEqual(self.client.get(reverse('penitansye:patient_search'), {'q': 'pat'}).status_code, 403)
+        form = self.client.get(reverse('penitansye:appointment'))
+        self.assertContains(form, 'type="hidden" name="patient"')
+        self.assertContains(form, 'typeIdInstead')
+        response = self.client.post(reverse('penitansye:appointment'), {
+            'patient': self.patients[0], 'doctor': self.doctor, 'clinic': self.clinic,
+            'visit_date': timezone.localtime(self.nine).strftime('%Y-%m-%d %H:%M'),
+        }, follow=True)
+        self.assertRedirects(response, reverse('penitansye:appointment'))
+        self.assertEqual([str(message) for message in response.context['messages']],
+                         ['Appointment successfully created!'])
+        self.assertTrue(Appointment.objects.filter(patient_id=self.patients[0], visit_date=self.nine).exists())
+
+    def test_other_integrity_errors_are_raised(self):
+        with self.assertRaises(IntegrityError):
+            book_appointment(self.appointment(self.patients[0], clinic_id=None))
+
+
+class CachingTests(TestCase):
+    """Cached reads cost no query until the write behind them commits."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clinic, = seed_clinics(1)
+        cls.doctor, = seed_doctors(1)
+        cls.patient, = seed_patients(1)
+        monday = timezone.localdate() + timedelta(days=7 - timezone.localdate().weekday())
+        cls.nine = timezone.make_aware(datetime.combine(monday, datetime.min.time()).replace(hour=9))
+
+    def setUp(self):
+        cache.clear()
+        caching.stats.reset()
+
+    def test_booked_days_dropped_on_commit(self):
+        day = self.nine.date()
+        self.assertEqual(booked_by_day([self.doctor], day, day), {(self.doctor, day): set()})
+        with self.captureOnCommitCallbacks() as callbacks:
+            Appointment.objects.create(
+                patient_id=self.patient, doctor_id=self.doctor, clinic_id=self.clinic, visit_date=self.nine,
+            )
+            # Not committed: a read now would cache the day without the booking
+            with self.assertNumQueries(0):
+                self.assertEqual(booked_by_day([self.doctor], day, day), {(self.doctor, day): set()})
+        for callback in callbacks:
+            callback()
+        with self.assertNumQueries(1):
+            self.assertEqual(booked_by_day([self.doctor], day, day), {(self.doctor, day): {self.nine}})
+        self.assertEqual(caching.stats.snapshot()['booked'], {'hits': 1, 'misses': 2, 'hit_rate': 1 / 3})
+
+    def test_stats_endpoint_is_loopback_only(self):
+        booked_by_day([self.doctor], self.nine.date(), self.nine.date())
+        response = self.client.get(reverse('penitansye:cache_stats'))
+        self.assertEqual(response.json()['booked'], {'hits': 0, 'misses': 1, 'hit_rate': 0.0})
+        response = self.client.get(reverse('penitansye:cache_stats'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+    def test_doctor_lists_dropped_on_commit(self):
+        doctor = Doctor.objects.get(pk=self.doctor)
+        old = doctor.specialization
+        self.assertEqual([row['id'] for row in caching.doctors_by_specialization(old.upper())], [self.doctor])
+        self.assertEqual(caching.specialization_facets(), [{'specialization': old, 'count': 1}])
+        with self.assertNumQueries(0):
+            caching.doctors_by_specialization(old)
+            caching.specialization_facets()
+        doctor.specialization = 'Dermatology' if old != 'Dermatology' else 'Neurology'
+        with self.captureOnCommitCallbacks(execute=True):
+            doctor.save()
+        self.assertEqual(caching.doctors_by_specialization(old), [])
+        self.assertEqual([row['id'] for row in caching.doctors_by_specialization(doctor.specialization)], [self.doctor])
+        self.assertEqual(caching.specialization_facets(), [{'specialization': doctor.specialization, 'count': 1}])
+
+    def test_clinic_dropped_on_commit(self):
+        self.assertEqual(clinic_info(self.clinic)['opening_hours'], '8AM-5PM')
+        clinic = Clinic.objects.get(pk=self.clinic)
+        clinic.opening_hours = '9AM-1PM'
+        with self.captureOnCommitCallbacks(execute=True):
+            clinic.save()
+        self.assertEqual(clinic_info(self.clinic)['opening_hours'], '9AM-1PM')
+
+
+class ExportTests(TestCase):
+    """Exports stream every matching row, in either format, gzipped or not."""
+
+    @classmethod
+    def setUpTestData(cls):
+        clinics, cls.doctors, patients = seed_clinics(2), seed_doctors(5), seed_patients(20)
+        seed_visits(Record, 4500, clinics, cls.doctors, patients, timezone.make_aware(datetime(2025, 1, 1)))
+        cls.staff = User.objects.create_user('staff', is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def export(self, **params):
+        response = self.client.get(reverse('penitansye:records_export'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_csv_and_ndjson_agree(self):
+        rows = list(csv.DictReader(self.export().decode().splitlines()))
+        lines = gzip.decompress(self.export(format='ndjson', gzip=1)).decode().splitlines()
+        self.assertEqual(len(rows), 4500)
+        self.assertEqual([int(row['id']) for row in rows], [json.loads(line)['id'] for line in lines])
+
+    def test_filters(self):
+        doctor = self.doctors[0]
+        rows = list(csv.DictReader(self.export(doctor=doctor, start='2025-01-02', end='2025-01-03').decode().splitlines()))
+        expected = Record.objects.filter(
+            doctor_id=doctor,
+            visit_date__gte=timezone.make_aware(datetime(2025, 1, 2)),
+            visit_date__lt=timezone.make_aware(datetime(2025, 1, 4)),
+        )
+        self.assertEqual(sorted(int(row['id']) for row in rows), sorted(expected.values_list('id', flat=True)))
+        self.assertTrue(rows)
+
+    def test_bad_parameters(self):
+        for params in ({'format': 'xml'}, {'start': 'soon'}, {'start': '2025-02-01', 'end': '2025-01-01'}):
+            response = self.client.get(reverse('penitansye:records_export'), params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_staff_only(self):
+        self.client.logout()
+        response = self.client.get(reverse('penitansye:records_export'))
+        self.assertRedirects(response, reverse('admin:login') + '?next=' + reverse('penitansye:records_export'))
+        self.client.force_login(User.objects.create_user('patient'))
+        self.assertEqual(self.client.get(reverse('penitansye:records_export')).status_code, 302)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class PatientImportTests(TestCase):
+    """Bad rows are reported by line and skipped; the rest of the batch is imported in one go."""
+
+    def rows(self, *emails):
+        return [
+            (line, {
+                'firstname': 'Imp', 'lastname': f'Ort{line}', 'date_of_birth': '1990-01-01', 'email': email,
+                'password': f'secret{line}', 'emmergencycontactname': 'Kin', 'emmergencycontactphone': '555',
+                'bloodType': 'O+', 'Allergies': 'None',
+            })
+            for line, email in enumerate(emails, start=2)
+        ]
+
+    def test_batch_with_bad_rows(self):
+        seed_patients(1)
+        rows = self.rows('a@Example.com', 'a@example.com', 'patient0@seed.example.com', 'not an email', 'b@example.com')
+        rows[4][1]['date_of_birth'] = 'yesterday'
+        importer = PatientImport()
+        with self.assertNumQueries(6):
+            importer.import_batch(rows)
+        self.assertEqual(importer.imported, 1)
+        self.assertEqual([line for line, _, _ in importer.errors], [3, 5, 6, 4])
+        self.assertTrue(Patient.objects.get(email='a@example.com').check_password('secret2'))
+
+    def test_unusable_passwords_and_update(self):
+        importer = PatientImport(passwords='unusable')
+        importer.import_batch(self.rows('a@example.com'))
+        self.assertFalse(Patient.objects.get(email='a@example.com').has_usable_password())
+        rows = self.rows('a@example.com', 'b@example.com')
+        rows[0][1]['lastname'] = 'Renamed'
+        importer = PatientImport(passwords='unusable', on_conflict='update')
+        importer.import_batch(rows)
+        self.assertEqual((importer.imported, importer.updated, importer.errors), (1, 1, []))
+        self.assertEqual(Patient.objects.get(email='a@example.com').lastname, 'Renamed')
+
+    def test_rows_inserted_meanwhile(self):
+        # Patients added between the check for taken emails and the insert
+        def hash_all(passwords, pool):
+            seed_patients(1)
+            return [f'md5$$hash{i}' for i in range(len(passwords))]
+
+        for on_conflict, counts in (('skip', (1, 0)), ('update', (1, 1))):
+            with self.subTest(on_conflict=on_conflict):
+                Patient.objects.all().delete()
+                importer = PatientImport(on_conflict=on_conflict)
+                with mock.patch('penitansyeAPI.importing._hash_all', hash_all):
+                    importer.import_batch(self.rows('patient0@seed.example.com', 'b@example.com'))
+                self.assertEqual((importer.imported, importer.updated), counts)
+                self.assertEqual([line for line, _, _ in importer.errors], [2] if on_conflict == 'skip' else [])
+                self.assertEqual(Patient.objects.count(), 2)
+
+
+class MetricsTests(TestCase):
+    """Requests are measured per view and exported for Prometheus; repeated statements are flagged."""
+
+    def setUp(self):
+        registry.reset()
+        self.addCleanup(registry.reset)
+
+    def test_n_plus_one_is_flagged(self):
+        patient_ids = seed_patients(N_PLUS_ONE_THRESHOLD + 1)
+
+        def view(request):
+            for pk in patient_ids:
+                Patient.objects.get(pk=pk)
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        request.resolver_match = None
+        with self.assertLogs('penitansyeAPI.metrics', 'WARNING') as logs:
+            response = MetricsMiddleware(view)(request)
+        self.assertIn(f'{N_PLUS_ONE_THRESHOLD + 1} runs of SELECT', logs.output[0])
+        self.assertIn(f'desc="{N_PLUS_ONE_THRESHOLD + 1} queries"', response['Server-Timing'])
+        self.assertIn('penitansye_n_plus_one_total{view="<unresolved>"} 1', registry.prometheus())
+
+    def test_server_timing_for_loopback_or_debug(self):
+        view = MetricsMiddleware(lambda request: HttpResponse())
+        for remote_addr, debug, sent in (('127.0.0.1', False, True), ('10.0.0.1', False, False), ('10.0.0.1', True, True)):
+            with self.subTest(remote_addr=remote_addr, debug=debug), self.settings(DEBUG=debug):
+                request = RequestFactory().get('/', REMOTE_ADDR=remote_addr)
+                request.resolver_match = None
+                self.assertEqual(view(request).has_header('Server-Timing'), sent)
+
+    def test_streamed_body_is_measured(self):
+        patient_ids = seed_patients(3)
+
+        def view(request):
+            return StreamingHttpResponse(Patient.objects.get(pk=pk).email for pk in patient_ids)
+
+        request = RequestFactory().get('/')
+        request.resolver_match = None
+        response = MetricsMiddleware(view)(request)
+        self.assertIn('desc="0 queries"', response['Server-Timing'])
+        self.assertNotIn('view="<unresolved>"', registry.prometheus())  # recorded once the body is sent
+        self.assertEqual(len(list(response.streaming_content)), 3)
+        self.assertIn('penitansye_db_queries_total{view="<unresolved>"} 3', registry.prometheus())
+
+    def test_async_streamed_body_is_measured(self):
+        patient_ids = seed_patients(2)
+
+        async def emails():
+            for pk in patient_ids:
+                yield (await Patient.objects.aget(pk=pk)).email
+
+        async def view(request):
+            return StreamingHttpResponse(emails())
+
+        async def consume():
+            request = RequestFactory().get('/')
+            request.resolver_match = None
+            response = await MetricsMiddleware(view)(request)
+            return [chunk async for chunk in response.streaming_content]
+
+        self.assertEqual(len(async_to_sync(consume)()), 2)
+        self.assertIn('penitansye_db_queries_total{view="<unresolved>"} 2', registry.prometheus())
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('penitansye:homepage'))
+        body = self.client.get(reverse('penitansye:metrics')).content.decode()
+        self.assertIn('penitansye_requests_total{view="penitansye:homepage",method="GET",status="200"} 1', body)
+        self.assertIn('penitansye_request_seconds_count{view="penitansye:homepage"} 1', body)
+        self.assertNotIn('penitansye_template_seconds_total{view="penitansye:homepage"} 0.000000', body)
+        response = self.client.get(reverse('penitansye:metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+
+class DoctorDayTests(TestCase):
+    """Day schedules follow appointment changes and read as one query."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clinic, = seed_clinics(1)
+        cls.doctor, = seed_doctors(1)
+        cls.patient, = seed_patients(1)
+        cls.nine = timezone.make_aware(datetime(2025, 1, 6, 9))
+        cls.staff = User.objects.create_user('staff', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.staff)
+
+    def schedule(self, start='2025-01-06', days=2):
+        url = reverse('penitansye:doctor_schedule', args=[self.doctor])
+        clinic_info(self.clinic)  # clinic names come from the cache
+        # The session and its user, then the days
+        with self.assertNumQueries(3):
+            body = self.client.get(url, {'start': start, 'days': days}).json()
+        return [[(entry['time'], entry['patient_name']) for entry in day['appointments']] for day in body['days']]
+
+    def test_follows_appointment_changes(self):
+        # The days are refreshed once each change commits
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = Appointment.objects.create(
+                patient_id=self.patient, doctor_id=self.doctor, clinic_id=self.clinic, visit_date=self.nine,
+            )
+        self.assertEqual(self.schedule(), [[('09:00', 'Pat Ient0')], []])
+
+        appointment.visit_date += timedelta(days=1, hours=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.save()
+        self.assertEqual(self.schedule(), [[], [('10:00', 'Pat Ient0')]])
+
+        patient = Patient.objects.get(pk=self.patient)
+        patient.lastname = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            patient.save()
+        self.assertEqual(self.schedule(), [[], [('10:00', 'Pat Renamed')]])
+
+        # Other changes leave the days alone: the name lookup, the update and the search index
+        patient.symptoms = 'cough'
+        with self.captureOnCommitCallbacks() as callbacks, self.assertNumQueries(3):
+            patient.save(update_fields=['symptoms', 'lastname'])
+        self.assertEqual(callbacks, [])
+        with self.assertNumQueries(2):
+            patient.save(update_fields=['symptoms'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.delete()
+        self.assertEqual(self.schedule(), [[], []])
+
+    def test_past_days_keep_their_visits(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for when in (self.nine, self.nine + timedelta(hours=1)):
+                Appointment.objects.create(patient_id=self.patient, doctor_id=self.doctor, clinic_id=self.clinic, visit_date=when)
+            Record.objects.create(patient_id=self.patient, doctor_id=self.doctor, clinic_id=self.clinic,
+                                  visit_date=self.nine, treatment='checkup')
+        pipeline.run('records', pipeline.day_start(self.nine.date() + timedelta(days=1)))
+        pipeline.run('archive', pipeline.day_start(self.nine.date() + timedelta(days=1)))
+        self.assertEqual(Appointment.objects.count() + Record.objects.count(), 0)
+        self.assertEqual(self.schedule(days=1), [[('09:00', 'Pat Ient0'), ('10:00', 'Pat Ient0')]])
+        day, = DoctorDay.objects.values_list('appointments', flat=True)
+        self.assertEqual([entry['status'] for entry in day], ['visited', 'no_show'])
+        call_command('rebuild_doctor_days', check=True, stdout=StringIO())
+
+        # Archived days still show, so a rename rewrites them too
+        patient = Patient.objects.get(pk=self.patient)
+        patient.firstname = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            patient.save()
+        self.assertEqual(self.schedule(days=1), [[('09:00', 'Renamed Ient0'), ('10:00', 'Renamed Ient0')]])
+        call_command('rebuild_doctor_days', check=True, stdout=StringIO())
+
+    def test_staff_only(self):
+        url = reverse('penitansye:doctor_schedule', args=[self.doctor])
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create_user('patient'))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_rebuild_and_check(self):
+        seed_visits(Appointment, 40, [self.clinic], [self.doctor], [self.patient], self.nine.replace(hour=0))
+        with self.assertRaises(CommandError):
+            call_command('rebuild_doctor_days', check=True, stdout=StringIO())
+        call_command('rebuild_doctor_days', stdout=StringIO())
+        call_command('rebuild_doctor_days', check=True, stdout=StringIO())
+        self.assertEqual(len(self.schedule(days=3)[2]), 4)
+
+
+class SearchTests(TestCase):
+    """The search index follows saves, deletes and bulk writes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clinic, = seed_clinics(1)
+        cls.doctor, = seed_doctors(1)
+        cls.patient, = seed_patients(1)
+        cls.nine = timezone.make_aware(datetime(2025, 1, 6, 9))
+        cls.staff = User.objects.create_user('staff', is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def visit(self, treatment, hours=0):
+        return Record.objects.create(
+            patient_id=self.patient, doctor_id=self.doctor, clinic_id=self.clinic,
+            visit_date=self.nine + timedelta(hours=hours), treatment=treatment,
+        )
+
+    def ids(self, q, **params):
+        response = self.client.get(reverse('penitansye:text_search'), {'q': q, 'in': 'records', **params})
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        return [row['id'] for row in body['results']], body['next']
+
+    def test_ranked_and_recent(self):
+        knee = self.visit('Knee pain, ice and rest')
+        both = self.visit('Knee brace; knee pain after running', hours=1)
+        self.visit('Flu shot', hours=2)
+        # The session and its user, then the matches and their rows
+        with self.assertNumQueries(4):
+            self.assertEqual(self.ids('knee')[0], [both.pk, knee.pk])
+        self.assertEqual(self.ids('pain kne')[0], [both.pk, knee.pk])  # the last word is a prefix
+        self.assertEqual(self.ids('knee', order='recent', page_size=1), ([both.pk], str(both.pk)))
+        self.assertEqual(self.ids('knee', order='recent', page_size=1, cursor=both.pk), ([knee.pk], str(knee.pk)))
+
+        knee.treatment = 'Shoulder strain'
+        knee.save()
+        both.delete()
+        self.assertEqual(self.ids('knee'), ([], None))
+        self.assertEqual(self.ids('shoulder')[0], [knee.pk])
+
+    def test_bulk_writes_and_reindex(self):
+        booked = self.client.post(reverse('penitansye:appointments_batch'), {'appointments': [{
+            'patient': self.patient, 'doctor': self.doctor, 'clinic': self.clinic,
+            'visit_date': self.nine.isoformat(), 'treatment': 'Dental cleaning',
+        }]}, content_type='application/json').json()
+        response = self.client.get(reverse('penitansye:text_search'), {'q': 'dental'})
+        self.assertEqual([row['id'] for row in response.json()['results']], [booked['results'][0]['id']])
+
+        seed_visits(Record, 3, [self.clinic], [self.doctor], [self.patient], self.nine)
+        seeded = Record.objects.first()
+        self.assertEqual(self.ids(seeded.treatment)[0], [])
+        call_command('reindex_search', only=['records'], stdout=StringIO())
+        self.assertIn(seeded.pk, self.ids(seeded.treatment)[0])
+
+    def test_archived_records(self):
+        archived = ArchivedRecord.objects.create(
+            id=10**9, patient_id=self.patient, doctor_id=self.doctor, clinic_id=self.clinic,
+            visit_date=self.nine, treatment='Knee arthroscopy',
+        )
+        self.visit('Knee pain')
+        self.assertEqual(self.ids('knee', **{'in': 'archived_records'})[0], [archived.pk])
+        archived.delete()
+        self.assertEqual(self.ids('knee', **{'in': 'archived_records'}), ([], None))
+
+    def test_bad_parameters(self):
+        for params in ({'in': 'doctors'}, {'order': 'oldest'}, {'page': 0}):
+            response = self.client.get(reverse('penitansye:text_search'), {'q': 'knee', **params})
+            self.assertEqual(response.status_code, 400)
+
+    def test_staff_only(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('penitansye:text_search'), {'q': 'knee'}).status_code, 403)
+
+
+@override_settings(READ_REPLICA='replica')
+class ReplicaRoutingTests(TestCase):
+    """Only replica_reads views read from the replica, and a write pins the client to the primary."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clinic, = seed_clinics(1)
+        cls.doctor, = seed_doctors(1)
+        cls.patient, = seed_patients(1)
+
+    def route(self, view, cookies=None):
+        seen = []
+
+        def record(request):
+            seen.append(router.db_for_read(Appointment))
+            if request.method == 'POST':
+                Appointment.objects.create(
+                    patient_id=self.patient, doctor_id=self.doctor, clinic_id=self.clinic,
+                    visit_date=timezone.make_aware(datetime(2025, 1, 6, 9)),
+                )
+                seen.append(router.db_for_read(Appointment))
+            return HttpResponse()
+
+        factory = RequestFactory()
+        request = factory.post('/') if view == 'write' else factory.get('/')
+        request.COOKIES.update(cookies or {})
+        response = StickyPrimaryMiddleware(replica_reads(record) if view != 'plain' else record)(request)
+        return seen, STICKY_COOKIE in response.cookies
+
+    def test_routing(self):
+        self.assertEqual(self.route('plain'), (['default'], False))
+        self.assertEqual(self.route('replica'), (['replica'], False))
+        self.assertEqual(self.route('replica', {STICKY_COOKIE: '1'}), (['default'], False))
+        self.assertEqual(self.route('write'), (['replica', 'default'], True))
+
+    def test_writes_stay_on_the_row_database(self):
+        self.assertIsNone(ReplicaRouter().db_for_write(Appointment))
+        # Appointments get the database of the rows they are given, as in bench_booking --database
+        patient = Patient.objects.get(pk=self.patient)
+        patient._state.db = 'other'
+        self.assertEqual(Appointment(patient=patient)._state.db, 'other')
+        patient._state.db = 'replica'
+        self.assertEqual(Appointment(patient=patient)._state.db, 'default')
+
+
+class RollupTests(TestCase):
+    """The rollups follow visit changes, match the raw tables and answer the reports."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clinic, = seed_clinics(1)
+        cls.doctor, = seed_doctors(1)
+        cls.patients = seed_patients(2)
+        cls.nine = timezone.make_aware(datetime(2025, 1, 6, 9))  # a Monday
+
+    def setUp(self):
+        cache.clear()
+
+    def visit(self, model, patient, when):
+        # Past days are recounted once the transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            return model.objects.create(patient_id=patient, doctor_id=self.doctor, clinic_id=self.clinic, visit_date=when)
+
+    def report(self, name, *args, **params):
+        response = self.client.get(reverse(f'penitansye:report_{name}', args=args),
+                                   {'start': '2025-01-01', 'end': '2025-01-31', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_reports_follow_visits(self):
+        first, second = self.patients
+        self.visit(Appointment, first, self.nine)
+        self.visit(Record, first, self.nine)
+        no_show = self.visit(Appointment, second, self.nine + timedelta(hours=1))
+        self.visit(Appointment, first, self.nine + timedelta(days=1))
+        self.visit(Record, second, self.nine + timedelta(days=1, hours=2))
+
+        utilization, = self.report('utilization')
+        self.assertEqual(
+            {key: utilization[key] for key in ('booked', 'visits', 'no_shows', 'no_show_rate')},
+            {'booked': 3, 'visits': 2, 'no_shows': 2, 'no_show_rate': 0.5},
+        )
+        schedule = clinic_info(self.clinic)['schedule']
+        self.assertEqual(utilization['slots'], sum(
+            len(schedule.slot_times_on(self.nine.date() + timedelta(days=i))) for i in range(2)
+        ))
+        self.assertEqual(
+            [(row['weekday'], row['hour'], row['booked']) for row in self.report('clinic_load', self.clinic)],
+            [(0, 9, 1), (0, 10, 1), (1, 9, 1), (1, 11, 0)],
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            no_show.delete()
+        demand, = self.report('specializations', grain='month')
+        self.assertEqual((demand['booked'], demand['no_shows']), (2, 1))
+
+    def test_bookings_count_in_place(self):
+        first, second = self.patients
+        # A day not over yet
+        nine = timezone.make_aware(datetime.combine(timezone.localdate() + timedelta(days=7), datetime.min.time()).replace(hour=9))
+        # No commit callbacks run here: the counts change in the booking's own transaction
+        booked = [
+            Appointment.objects.create(patient_id=patient, doctor_id=self.doctor, clinic_id=self.clinic, visit_date=when)
+            for patient, when in ((first, nine), (second, nine + timedelta(minutes=30)))
+        ]
+        self.assertEqual(list(HourlyRollup.objects.values_list('hour', 'booked')), [(9, 2)])
+        self.assertEqual(DailyRollup.objects.get().booked, 2)
+
+        booked[1].visit_date += timedelta(hours=1)
+        booked[1].save()
+        booked[0].delete()
+        self.assertEqual(sorted(HourlyRollup.objects.values_list('hour', 'booked')), [(10, 1)])
+        self.assertEqual(DailyRollup.objects.get().booked, 1)
+        call_command('rebuild_rollups', check=True, stdout=StringIO())
+
+    def test_rebuild_and_check(self):
+        seed_visits(Appointment, 40, [self.clinic], [self.doctor], self.patients, self.nine.replace(hour=0))
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', check=True, stdout=StringIO())
+        call_command('rebuild_rollups', stdout=StringIO())
+        call_command('rebuild_rollups', check=True, stdout=StringIO())
+        tampered = DailyRollup.objects.first()
+        DailyRollup.objects.filter(pk=tampered.pk).update(booked=99)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', '--check', '--start=2025-01-01', '--end=2025-12-31', stdout=StringIO())
+        self.assertEqual(sum(row['booked'] for row in self.report('utilization', end='2025-12-31')), 40 - tampered.booked + 99)
+
+
+class VisitPipelineTests(TestCase):
+    """Past appointments become records and old records move to the archive, resumably, leaving the rollups as they were."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clinic, = seed_clinics(1)
+        cls.doctor, = seed_doctors(1)
+        first, second = seed_patients(2)
+        nine = timezone.make_aware(datetime(2025, 1, 6, 9))
+        for model, patient, when in ((Appointment, first, nine), (Record, first, nine),
+                                     (Appointment, second, nine + timedelta(hours=1)),
+                                     (Appointment, first, nine + timedelta(days=1)),
+                                     (Appointment, second, nine + timedelta(days=14))):
+            with cls.captureOnCommitCallbacks(execute=True):
+                model.objects.create(
+                    patient_id=patient, doctor_id=cls.doctor, clinic_id=cls.clinic, visit_date=when,
+                )
+
+    def utilization(self):
+        response = self.client.get(reverse('penitansye:report_utilization'), {'start': '2025-01-01', 'end': '2025-01-31'})
+        return response.json()['results']
+
+    def test_records_then_archive(self):
+        before = self.utilization()
+        out = StringIO()
+        call_command('run_visit_pipeline', '--stage=records', '--before=2025-01-10', '--chunk-size=2', '--max-chunks=1', stdout=out)
+        self.assertIn('run again to resume', out.getvalue())
+        # The resumed run keeps the cutoff it started with
+        call_command('run_visit_pipeline', '--stage=records', '--before=2025-02-01', '--chunk-size=2', stdout=StringIO())
+        point = PipelineCheckpoint.objects.get(stage='records')
+        self.assertEqual((point.moved, point.finished), (3, True))
+        self.assertEqual(Appointment.objects.count(), 1)
+        self.assertEqual(
+            sorted(Record.objects.values_list('booked', 'no_show')),
+            [(True, False), (True, True), (True, True)],
+        )
+        call_command('rebuild_rollups', check=True, stdout=StringIO())
+        self.assertEqual(self.utilization(), before)
+
+        point = pipeline.run('archive', pipeline.day_start(datetime(2025, 1, 7).date()))
+        self.assertEqual((point.moved, Record.objects.count(), ArchivedRecord.objects.count()), (2, 1, 2))
+        call_command('rebuild_rollups', check=True, stdout=StringIO())
+        self.assertEqual(self.utilization(), before)
+
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        listed = self.client.get(reverse('penitansye:records_list')).json()['results']
+        self.assertEqual([row['visit_date'][:10] for row in listed], ['2025-01-06', '2025-01-06', '2025-01-07'])
+        exported = self.client.get(reverse('penitansye:records_export')).getvalue().decode().splitlines()
+        self.assertEqual(len(exported), 4)
+
+    def test_archived_records_stay_searchable(self):
+        knee = Record.objects.create(patient=Patient.objects.first(), doctor_id=self.doctor, clinic_id=self.clinic,
+                                     visit_date=timezone.make_aware(datetime(2024, 3, 4, 9)), treatment='Knee brace')
+        self.assertEqual([pk for pk, _ in search.search('records', 'knee')], [knee.pk])
+        pipeline.run('archive', pipeline.day_start(datetime(2025, 1, 1).date()))
+        self.assertEqual(search.search('records', 'knee'), [])
+        self.assertEqual([pk for pk, _ in search.search('archived_records', 'knee')], [knee.pk])
+
+
+class AsyncViewTests(TestCase):
+    """The /api/async/ views answer like the synchronous ones; booking takes an API token."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clinic, = seed_clinics(1)
+        cls.doctors = seed_doctors(2)
+        cls.patient, = seed_patients(1)
+        cls.nine = timezone.make_aware(datetime(2025, 1, 6, 9))
+        Appointment.objects.create(patient_id=cls.patient, doctor_id=cls.doctors[0], clinic_id=cls.clinic,
+                                   visit_date=cls.nine)
+        cls.token = Token.objects.create(user=User.objects.create_user('client'))
+
+    def setUp(self):
+        cache.clear()
+
+    def book(self, token=None, **fields):
+        body = {'patient': self.patient, 'doctor': self.doctors[0], 'clinic': self.clinic,
+                'visit_date': self.nine.isoformat(), **fields}
+        headers = {'Authorization': f'Token {token or self.token.key}'}
+        return self.client.post(reverse('penitansye:booking_async'), body, content_type='application/json',
+                                headers=headers)
+
+    def test_reads_match_the_sync_views(self):
+        params = {'doctors': ','.join(map(str, self.doctors)), 'clinic': self.clinic, 'start': '2025-01-06'}
+        self.assertEqual(self.client.get(reverse('penitansye:availability_async'), params).json(),
+                         self.client.get(reverse('penitansye:availability'), params).json())
+        self.assertEqual(self.client.get(reverse('penitansye:availability_async'), {'doctors': 'x'}).status_code, 400)
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        listed = self.client.get(reverse('penitansye:appointments_list_async')).json()
+        self.assertEqual([row['id'] for row in listed['results']],
+                         [row['id'] for row in self.client.get(reverse('penitansye:appointments_list')).json()['results']])
+
+    def test_booking(self):
+        response = self.book(visit_date=(self.nine + timedelta(hours=1)).isoformat(), treatment='Checkup')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Appointment.objects.get(pk=response.json()['id']).treatment, 'Checkup')
+        taken = self.book()
+        self.assertEqual(taken.status_code, 409)
+        self.assertEqual(len(taken.json()['alternatives']), 3)
+        self.assertEqual(self.book(clinic=0).status_code, 404)
+        self.assertEqual(self.book(visit_date='soon').status_code, 400)
+
+    def test_booking_needs_a_token(self):
+        response = self.client.post(reverse('penitansye:booking_async'), {}, content_type='application/json')
+        self.assertEqual((response.status_code, response['WWW-Authenticate']), (401, 'Token'))
+        self.assertEqual(self.book(token='nope').status_code, 401)
+        User.objects.filter(pk=self.token.user_id).update(is_active=False)
+        self.assertEqual(self.book().status_code, 401)
+        self.assertFalse(Appointment.objects.filter(visit_date__gt=self.nine).exists())
+
+
+class LoadToolTests(LiveServerTestCase):
+    """loadtest and bench_servers drive the views without errors, in process or against a running server."""
+
+    def setUp(self):
+        clinics, doctors, patients = seed_clinics(1), seed_doctors(2), seed_patients(5)
+        seed_visits(Appointment, 20, clinics, doctors, patients, timezone.make_aware(datetime(2025, 1, 6)))
+
+    def rows(self, command, **options):
+        out = StringIO()
+        call_command(command, stdout=out, **options)
+        header, *rows = out.getvalue().splitlines()
+        self.assertIn('p99 ms', header)
+        return [row.split() for row in rows]
+
+    def test_loadtest(self):
+        rows = self.rows('loadtest', requests=3)
+        self.assertEqual([' '.join(row[:2]) for row in rows], [
+            'GET /api/home/', 'GET /api/patient/', 'GET /api/appointment/',
+            'POST /api/patient/', 'POST /api/appointment/',
+        ])
+        self.assertEqual({(row[2], row[3]) for row in rows}, {('3', '0')})
+        self.assertEqual(len(self.rows('loadtest', requests=2, url=self.live_server_url)), 3)
+
+    def test_bench_servers(self):
+        token = Token.objects.create(user=User.objects.create_user('staff', is_staff=True))
+        rows = self.rows('bench_servers', wsgi_url=self.live_server_url, concurrency=[2], requests=6, token=token.key)
+        self.assertEqual([(row[0], row[1], row[3], row[4]) for row in rows],
+                         [('wsgi', 'availability', '6', '0'), ('wsgi', 'appointments', '6', '0')])
+        with self.assertRaises(CommandError):
+            call_command('bench_servers', stdout=StringIO())
+
+
+class SlotFeedTests(TestCase):
+    """Appointment changes reach the subscribers of their doctor or clinic, and reconnecting clients catch up."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clinic, = seed_clinics(1)
+        cls.doctor, cls.other = seed_doctors(2)
+        cls.patient, = seed_patients(1)
+        cls.nine = timezone.make_aware(datetime(2025, 1, 6, 9))
+
+    def test_changes_are_published_on_commit(self):
+        head = async_to_sync(feed.broadcaster().head)()
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = Appointment.objects.create(
+                patient_id=self.patient, doctor_id=self.doctor, clinic_id=self.clinic, visit_date=self.nine,
+            )
+            appointment.treatment = 'checkup'
+            appointment.save()
+            appointment.visit_date += timedelta(hours=1)
+            appointment.save()
+            appointment.delete()
+        events = async_to_sync(feed.broadcaster().since)(head)
+        self.assertEqual([event.kind for event in events], ['booked', 'freed', 'booked', 'freed'])
+        self.assertIn('"visit_date": "2025-01-06T10:00:00', events[2].frame)
+
+    def test_failed_publish_keeps_the_booking(self):
+        with mock.patch.object(feed.broadcaster(), 'publish', side_effect=ConnectionError), \
+                self.assertLogs('django', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.create(
+                patient_id=self.patient, doctor_id=self.doctor, clinic_id=self.clinic, visit_date=self.nine,
+            )
+        self.assertTrue(Appointment.objects.filter(doctor_id=self.doctor).exists())
+
+    def test_needs_asgi(self):
+        self.assertEqual(self.client.get(reverse('penitansye:slot_feed')).status_code, 501)
+
+    async def test_stream_filters_and_resumes(self):
+        broadcaster = feed.broadcaster()
+        head = await broadcaster.head()
+        response = await self.async_client.get(reverse('penitansye:slot_feed'), {'doctors': self.doctor})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = response.streaming_content
+        self.assertTrue((await anext(chunks)).startswith(b'retry:'))
+
+        broadcaster.publish([('booked', 1, self.other, self.clinic, self.nine),
+                             ('freed', 2, self.doctor, self.clinic, self.nine)])
+        frame = (await anext(chunks)).decode()
+        self.assertIn('event: freed', frame)
+        self.assertNotIn('booked', frame)
+
+        response = await self.async_client.get(reverse('penitansye:slot_feed'), headers={'Last-Event-ID': head})
+        chunks = response.streaming_content
+        await anext(chunks)
+        self.assertEqual((await anext(chunks)).decode().count('data: '), 2)
+
+        response = await self.async_client.get(reverse('penitansye:slot_feed'), {'last_event_id': '1-1'})
+        chunks = response.streaming_content
+        await anext(chunks)
+        self.assertIn(b'event: reset', await anext(chunks))
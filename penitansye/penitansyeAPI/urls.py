@@ -4,9 +4,31 @@ from . import views
 app_name = 'penitansye'
 urlpatterns = [
     path('home/', views.homeView, name='home'),
+    path('availability/', views.availabilityView, name='availability'),
     path('',views.homepage, name ="homepage"),
     path('appointment/',views.appointmentView, name ="appointment"),
+    path('appointments/', views.appointmentListView, name='appointments_list'),
+    path('appointments/batch/', views.appointmentBatchView, name='appointments_batch'),
+    path('records/', views.recordListView, name='records_list'),
+    path('appointments/export/', views.visitExportView, {'kind': 'appointments'}, name='appointments_export'),
+    path('records/export/', views.visitExportView, {'kind': 'records'}, name='records_export'),
     path('patient/', views.patientView, name='patient'),
+    path('patients/search/', views.patientSearchView, name='patient_search'),
+    path('doctors/', views.doctorListView, name='doctors_list'),
+    path('doctors/search/', views.doctorSearchView, name='doctor_search'),
+    path('search/', views.textSearchView, name='text_search'),
+    path('doctors/<int:doctor_id>/schedule/', views.doctorScheduleView, name='doctor_schedule'),
+    path('doctors/specializations/', views.specializationFacetView, name='doctor_specializations'),
+    path('reports/utilization/', views.utilizationReportView, name='report_utilization'),
+    path('reports/clinics/<int:clinic_id>/load/', views.clinicLoadReportView, name='report_clinic_load'),
+    path('reports/specializations/', views.specializationDemandReportView, name='report_specializations'),
+    path('cache/stats/', views.cacheStatsView, name='cache_stats'),
+    path('metrics/', views.metricsView, name='metrics'),
+    path('async/availability/', views.availabilityAsyncView, name='availability_async'),
+    path('async/availability/feed/', views.slotFeedView, name='slot_feed'),
+    path('async/appointments/', views.appointmentListAsyncView, name='appointments_list_async'),
+    path('async/appointments/book/', views.bookingAsyncView, name='booking_async'),
+    path('async/records/', views.recordListAsyncView, name='records_list_async'),
     path('appointment/<int:patient_id>/', views.appointmentView, name='appointment')
 
 
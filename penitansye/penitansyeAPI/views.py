@@ -1,11 +1,32 @@
+import json
+from datetime import date, datetime, timedelta
+
 from django.shortcuts import render, redirect
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.db import IntegrityError
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.decorators import api_view
-from .models import Appointment, Patient
+from rest_framework.authtoken.models import Token
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from .models import Appointment, ArchivedRecord, Patient, Clinic, Record
 from .forms import AppointmentForm, PatientForm
+from . import caching, doctor_days, export, feed, metrics, rollups, search
+from .availability import afree_slots, free_slots
+from .booking import MAX_BATCH, BookingRequest, SlotTaken, abook_appointment, book_appointment, book_many, recurring
+from .pagination import amerged_keyset_page, merged_keyset_page, page_size_from
+from .routers import replica_reads
+from .choices import doctor_choices
 # Create your views here.
 
 def homepage(request):
@@ -20,20 +41,97 @@ def homepage(request):
 def homeView(request):
     return Response({'message':"Welcome to my homepage"}, status=status.HTTP_200_OK)
 
+
+# Ranges longer than this are streamed instead of built in memory
+AVAILABILITY_STREAM_DAYS = 7
+AVAILABILITY_MAX_DAYS = 366
+
+
+def _availability_rows(doctor_ids, schedule, start_date, end_date):
+    for doctor_id, day, slots in free_slots(doctor_ids, schedule, start_date, end_date):
+        yield _availability_row(doctor_id, day, slots)
+
+
+def _stream_availability(clinic_id, rows):
+    yield '{"clinic": %d, "slots": [' % clinic_id
+    for i, row in enumerate(rows):
+        yield (',' if i else '') + json.dumps(row)
+    yield ']}'
+
+
+def _availability_params(params):
+    """Return (doctor_ids, clinic_id, start_date, end_date, days); raise ValueError with the reason."""
+    try:
+        doctor_ids = [int(pk) for pk in params['doctors'].split(',')]
+        clinic_id = int(params['clinic'])
+        start_date = date.fromisoformat(params['start'])
+        end_date = date.fromisoformat(params.get('end', params['start']))
+    except (KeyError, ValueError):
+        raise ValueError(
+            "Expected doctors=<id,id,...>, clinic=<id>, start=YYYY-MM-DD and optional end=YYYY-MM-DD"
+        )
+    days = (end_date - start_date).days + 1
+    if not 1 <= days <= AVAILABILITY_MAX_DAYS:
+        raise ValueError(f"The date range must cover 1 to {AVAILABILITY_MAX_DAYS} days")
+    return doctor_ids, clinic_id, start_date, end_date, days
+
+
+def _clinic_error(clinic):
+    """The (message, status) to refuse availability for this clinic with, or None."""
+    if clinic is None:
+        return "Clinic not found", status.HTTP_404_NOT_FOUND
+    if clinic['schedule'] is None:
+        return clinic['schedule_error'], status.HTTP_422_UNPROCESSABLE_ENTITY
+    return None
+
+
+def _availability_row(doctor_id, day, slots):
+    return {
+        'doctor': doctor_id,
+        'date': day.isoformat(),
+        'free': [slot.strftime('%H:%M') for slot in slots],
+    }
+
+
+@replica_reads
+@api_view(['GET'])
+def availabilityView(request):
+    """Free 30-minute slots of several doctors at one clinic over a date range.
+
+    GET /api/availability/?doctors=1,2&clinic=1&start=2025-11-18&end=2025-11-20
+    """
+    try:
+        doctor_ids, clinic_id, start_date, end_date, days = _availability_params(request.query_params)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    clinic = caching.clinic_info(clinic_id)
+    error = _clinic_error(clinic)
+    if error:
+        message, code = error
+        return Response({'error': message}, status=code)
+
+    rows = _availability_rows(doctor_ids, clinic['schedule'], start_date, end_date)
+    if days > AVAILABILITY_STREAM_DAYS:
+        return StreamingHttpResponse(_stream_availability(clinic_id, rows), content_type='application/json')
+    return Response({'clinic': clinic_id, 'slots': list(rows)}, status=status.HTTP_200_OK)
+
 def appointmentView(request, patient_id=None):
     if request.method == "POST":
         form = AppointmentForm(request.POST)
         if form.is_valid():
             appointment = form.save(commit=False)
-            if Appointment.objects.filter(
-                doctor=appointment.doctor,
-                visit_date=appointment.visit_date
-            ).exists():
-                messages.error(request, "This time slot is already taken.")
+            try:
+                book_appointment(appointment)
+            except SlotTaken as taken:
+                messages.error(request, str(taken))
+                if taken.alternatives:
+                    nearest = ", ".join(timezone.localtime(slot).strftime('%H:%M') for slot in taken.alternatives)
+                    messages.info(request, f"Nearest free slots that day: {nearest}")
                 return render(request, "penitansyeAPI/appointment_form.html", {"form": form})
-            appointment.save()
             messages.success(request, "Appointment successfully created!")
-            return redirect("appointments_list")
+            # The listing is staff only; others book the next one
+            return redirect("penitansye:appointments_list" if request.user.is_staff else "penitansye:appointment")
     else:
         if patient_id:
             form = AppointmentForm(initial={'patient': patient_id})
@@ -43,6 +141,74 @@ def appointmentView(request, patient_id=None):
     return render(request, "penitansyeAPI/appointment_form.html", {"form": form})
 
 
+def _batch_requests(items):
+    """BookingRequests for the items of a batch, a "repeat" item expanding into its recurrences."""
+    requests = []
+    for index, item in enumerate(items):
+        visit_date = datetime.fromisoformat(item['visit_date'])
+        if timezone.is_naive(visit_date):
+            visit_date = timezone.make_aware(visit_date)
+        treatment = item.get('treatment')
+        if treatment is not None and not isinstance(treatment, str):
+            raise TypeError('treatment')
+        repeat = item.get('repeat') or {'every_days': 1, 'count': 1}
+        every_days, count = int(repeat['every_days']), int(repeat['count'])
+        if every_days < 1 or count < 1:
+            raise ValueError('repeat')
+        requests += recurring(
+            index, int(item['patient']), int(item['doctor']), int(item['clinic']), visit_date, treatment,
+            every=timedelta(days=every_days), count=min(count, MAX_BATCH + 1),
+        )
+    return requests
+
+
+@api_view(['POST'])
+@authentication_classes([TokenAuthentication, SessionAuthentication])
+@permission_classes([IsAuthenticated])
+def appointmentBatchView(request):
+    """Book many appointments at once, e.g. a course of weekly sessions.
+
+    POST /api/appointments/batch/
+    Authorization: Token <key>  (or a logged-in session)
+    {"appointments": [
+        {"patient": 1, "doctor": 2, "clinic": 3, "visit_date": "2025-11-18T09:30",
+         "treatment": "...", "repeat": {"every_days": 7, "count": 10}},
+        ...
+    ]}
+
+    Every appointment is checked and reported on its own: "booked" with its
+    id, or "conflict", "closed" or "invalid" with an error. As for
+    bookingAsyncView, anonymous clients get 401.
+    """
+    try:
+        items = request.data['appointments']
+        if not isinstance(items, list):
+            raise TypeError('appointments')
+        requests = _batch_requests(items)
+    except (KeyError, TypeError, ValueError):
+        return Response(
+            {'error': "Expected appointments: a list of patient, doctor, clinic, visit_date, "
+                      "optional treatment and optional repeat {every_days, count}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if len(requests) > MAX_BATCH:
+        return Response(
+            {'error': f"At most {MAX_BATCH} appointments can be booked at once"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    book_many(requests)
+    results = []
+    for booking in requests:
+        row = {'index': booking.index, 'visit_date': booking.visit_date, 'status': booking.status}
+        if booking.appointment is not None:
+            row['id'] = booking.appointment.pk
+        else:
+            row['error'] = booking.error
+        results.append(row)
+    booked = sum(booking.status == 'booked' for booking in requests)
+    return Response({'booked': booked, 'rejected': len(requests) - booked, 'results': results}, status=status.HTTP_200_OK)
+
+
 def patientView(request):
     if request.method == 'POST':
         form = PatientForm(request.POST)
@@ -55,3 +221,485 @@ def patientView(request):
         form = PatientForm()
 
     return render(request, 'penitansyeAPI/patient_form.html', {'form': form})
+
+
+# Columns a listing row needs; everything else stays in the database
+VISIT_LIST_FIELDS = (
+    'id', 'visit_date', 'treatment',
+    'patient__id', 'patient__firstname', 'patient__lastname',
+    'doctor__id', 'doctor__firstname', 'doctor__lastname', 'doctor__specialization',
+    'clinic__id', 'clinic__clinic_name', 'clinic__city',
+)
+
+
+def _visit_row(visit):
+    return {
+        'id': visit.id,
+        'visit_date': visit.visit_date,
+        'treatment': visit.treatment,
+        'patient': {'id': visit.patient.id, 'firstname': visit.patient.firstname, 'lastname': visit.patient.lastname},
+        'doctor': {
+            'id': visit.doctor.id, 'firstname': visit.doctor.firstname, 'lastname': visit.doctor.lastname,
+            'specialization': visit.doctor.specialization,
+        },
+        'clinic': {'id': visit.clinic.id, 'clinic_name': visit.clinic.clinic_name, 'city': visit.clinic.city},
+    }
+
+
+# The tables a listing reads: records older than the archive horizon live in ArchivedRecord
+VISIT_TABLES = {Appointment: (Appointment,), Record: (Record, ArchivedRecord)}
+
+
+def _visit_querysets(params, model):
+    """The filtered listing queryset of each of the model's tables and the page size; raise ValueError."""
+    querysets = []
+    for table in VISIT_TABLES[model]:
+        queryset = table.objects.select_related('patient', 'doctor', 'clinic').only(*VISIT_LIST_FIELDS)
+        for name in ('doctor', 'patient', 'clinic'):
+            if name in params:
+                queryset = queryset.filter(**{f'{name}_id': int(params[name])})
+        querysets.append(queryset)
+    return querysets, page_size_from(params.get('page_size'))
+
+
+def _visit_list(request, model):
+    """One keyset page of appointments or records, optionally filtered by doctor, patient or clinic.
+
+    Each page costs a single query per table whatever its size (records read
+    the archive too): the related rows come from one join and only the
+    listed columns are loaded.
+    """
+    try:
+        querysets, page_size = _visit_querysets(request.query_params, model)
+        rows, next_cursor = merged_keyset_page(querysets, request.query_params.get('cursor'), page_size)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'results': [_visit_row(row) for row in rows],
+        'next': next_cursor,
+    }, status=status.HTTP_200_OK)
+
+
+# Listings name every patient and treatment: staff only, as for the export.
+# Load tools (bench_servers) send a staff user's API token.
+@replica_reads
+@api_view(['GET'])
+@authentication_classes([TokenAuthentication, SessionAuthentication])
+@permission_classes([IsAdminUser])
+def appointmentListView(request):
+    return _visit_list(request, Appointment)
+
+
+@replica_reads
+@api_view(['GET'])
+@authentication_classes([TokenAuthentication, SessionAuthentication])
+@permission_classes([IsAdminUser])
+def recordListView(request):
+    return _visit_list(request, Record)
+
+
+# A plain Django view: DRF would take ?format= for its own renderer override
+@staff_member_required
+@replica_reads
+@require_GET
+def visitExportView(request, kind):
+    """Stream every appointment or record matching the filters, e.g.
+
+    GET /api/records/export/?format=ndjson&gzip=1&doctor=3&start=2025-01-01&end=2025-03-31
+
+    format is csv (default) or ndjson; gzip=1 compresses on the fly. Staff
+    only: an export holds every patient's visits; others are sent to the
+    admin login.
+    """
+    params = request.GET
+    fmt, gzipped = params.get('format', 'csv'), params.get('gzip') in ('1', 'true')
+    try:
+        if fmt not in export.FORMATS:
+            raise ValueError(f"format must be one of {', '.join(export.FORMATS)}")
+        querysets = export.export_querysets(kind, **export.export_params(params))
+    except ValueError as exc:
+        return _json({'error': str(exc)}, status.HTTP_400_BAD_REQUEST)
+    filename = f'{kind}.{fmt}' + ('.gz' if gzipped else '')
+    response = StreamingHttpResponse(
+        export.export(querysets, fmt, gzipped),
+        content_type='application/gzip' if gzipped else export.CONTENT_TYPES[fmt],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+SEARCH_LIMIT = 20
+# Sorts after any character a name or email can contain, so [q, q + PREFIX_END) is a prefix range
+PREFIX_END = '\U0010ffff'
+
+
+def _prefix(field, q):
+    return Q(**{f'{field}__gte': q, f'{field}__lt': q + PREFIX_END})
+
+
+def _patient_matches(q):
+    return Patient.objects.annotate(
+        firstname_lower=Lower('firstname'), lastname_lower=Lower('lastname'), email_lower=Lower('email'),
+    ).filter(
+        _prefix('lastname_lower', q) | _prefix('firstname_lower', q) | _prefix('email_lower', q)
+    ).only('id', 'firstname', 'lastname', 'email').order_by('lastname', 'firstname')
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def patientSearchView(request):
+    """Patients whose first name, last name or email starts with ``q``, case-insensitively.
+
+    Written as ranges over the lower-cased columns so each branch is a seek
+    on the matching functional index rather than a LIKE scan. Staff only,
+    as it lists patients' names and emails.
+    """
+    q = request.query_params.get('q', '').strip().lower()
+    if len(q) < 2:
+        return Response({'results': []}, status=status.HTTP_200_OK)
+    patients = _patient_matches(q)[:SEARCH_LIMIT]
+    return Response({'results': [
+        {'id': p.id, 'label': f"{p.firstname} {p.lastname} <{p.email}>"} for p in patients
+    ]}, status=status.HTTP_200_OK)
+
+
+SEARCH_FIELDS = {
+    'patients': ('id', 'firstname', 'lastname', 'symptoms'),
+    'records': ('id', 'visit_date', 'treatment', 'patient_id', 'doctor_id', 'clinic_id'),
+    'archived_records': ('id', 'visit_date', 'treatment', 'patient_id', 'doctor_id', 'clinic_id'),
+    'appointments': ('id', 'visit_date', 'treatment', 'patient_id', 'doctor_id', 'clinic_id'),
+}
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def textSearchView(request):
+    """Full-text search of patient symptoms or visit treatments, e.g.
+
+    GET /api/search/?q=knee+pain&in=records&order=rank&page=1
+
+    order=rank (default) pages through the best matches among the most recent
+    search.RANK_WINDOW; order=recent pages through every match, newest first,
+    with the cursor from the previous page's ``next``. Staff only: symptoms
+    and treatments are medical details.
+    """
+    params = request.query_params
+    kind, order = params.get('in', 'appointments'), params.get('order', 'rank')
+    try:
+        if kind not in search.SEARCHABLE:
+            raise ValueError(f"in must be one of {', '.join(search.SEARCHABLE)}")
+        if order not in search.ORDERS:
+            raise ValueError(f"order must be one of {', '.join(search.ORDERS)}")
+        page_size = page_size_from(params.get('page_size'))
+        page = int(params.get('page', 1))
+        before = int(params['cursor']) if params.get('cursor') else None
+        if page < 1:
+            raise ValueError("page must be 1 or more")
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    hits = search.search(kind, params.get('q', ''), order, page, page_size, before)
+    model, _ = search.SEARCHABLE[kind]
+    rows = {row['id']: row for row in model.objects.filter(pk__in=[pk for pk, _ in hits]).values(*SEARCH_FIELDS[kind])}
+    results = []
+    for pk, score in hits:
+        if pk in rows:  # deleted since it was matched
+            results.append({**rows[pk], 'score': score})
+    if len(hits) < page_size:
+        next_page = None
+    elif order == 'recent':
+        next_page = str(hits[-1][0])
+    else:
+        next_page = page + 1 if page * page_size < search.RANK_WINDOW else None
+    return Response({'results': results, 'next': next_page}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def doctorSearchView(request):
+    """Doctors whose label contains ``q``, filtered from the cached doctor list."""
+    q = request.query_params.get('q', '').strip().lower()
+    results = [
+        {'id': pk, 'label': label} for pk, label in doctor_choices() if q in label.lower()
+    ]
+    return Response({'results': results[:SEARCH_LIMIT]}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def doctorListView(request):
+    """Doctors of one specialization, GET /api/doctors/?specialization=cardiology"""
+    specialization = request.query_params.get('specialization', '').strip()
+    if not specialization:
+        return Response({'error': "Expected specialization=<name>"}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'results': caching.doctors_by_specialization(specialization)}, status=status.HTTP_200_OK)
+
+
+SCHEDULE_MAX_DAYS = 31
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def doctorScheduleView(request, doctor_id):
+    """A doctor's appointments day by day, GET /api/doctors/<id>/schedule/?start=YYYY-MM-DD&days=7
+
+    Read from the materialized DoctorDay rows (doctor_days.py) in one
+    indexed query; clinic names come from the clinic cache. Staff only: the
+    entries name the patients and their treatments.
+    """
+    try:
+        start = date.fromisoformat(request.query_params['start']) if 'start' in request.query_params else timezone.localdate()
+        days = int(request.query_params.get('days', 1))
+        if not 1 <= days <= SCHEDULE_MAX_DAYS:
+            raise ValueError
+    except ValueError:
+        return Response(
+            {'error': f"Expected start=YYYY-MM-DD and days between 1 and {SCHEDULE_MAX_DAYS}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    schedule = doctor_days.doctor_days(doctor_id, start, days)
+    clinic_names = {}
+    for _, entries in schedule:
+        for entry in entries:
+            if entry['clinic'] not in clinic_names:
+                clinic = caching.clinic_info(entry['clinic'])
+                clinic_names[entry['clinic']] = clinic['clinic_name'] if clinic else None
+            entry['clinic_name'] = clinic_names[entry['clinic']]
+    return Response({
+        'doctor': doctor_id,
+        'days': [{'date': day, 'appointments': entries} for day, entries in schedule],
+    }, status=status.HTTP_200_OK)
+
+
+def _report_period(params):
+    """Return the (start, end) dates of a report; raise ValueError."""
+    try:
+        start, end = date.fromisoformat(params['start']), date.fromisoformat(params['end'])
+    except (KeyError, ValueError):
+        raise ValueError("Expected start=YYYY-MM-DD and end=YYYY-MM-DD")
+    if end < start:
+        raise ValueError("end must not be before start")
+    return start, end
+
+
+def _report_id(params, name):
+    return int(params[name]) if params.get(name) else None
+
+
+@replica_reads
+@api_view(['GET'])
+def utilizationReportView(request):
+    """Per doctor: appointments, visits, no-shows and booked share of the open slots, from the rollups.
+
+    GET /api/reports/utilization/?start=2025-01-01&end=2025-03-31&clinic=2
+    """
+    try:
+        start, end = _report_period(request.query_params)
+        doctor_id, clinic_id = _report_id(request.query_params, 'doctor'), _report_id(request.query_params, 'clinic')
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'results': rollups.utilization(start, end, doctor_id, clinic_id)}, status=status.HTTP_200_OK)
+
+
+@replica_reads
+@api_view(['GET'])
+def clinicLoadReportView(request, clinic_id):
+    """Appointments at a clinic by weekday and hour, GET /api/reports/clinics/<id>/load/?start=...&end=..."""
+    try:
+        start, end = _report_period(request.query_params)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'clinic': clinic_id, 'results': rollups.clinic_load(clinic_id, start, end)},
+                    status=status.HTTP_200_OK)
+
+
+@replica_reads
+@api_view(['GET'])
+def specializationDemandReportView(request):
+    """Counts per specialization and week or month, GET /api/reports/specializations/?start=...&end=...&grain=month"""
+    grain = request.query_params.get('grain', 'week')
+    try:
+        start, end = _report_period(request.query_params)
+        if grain not in rollups.GRAINS:
+            raise ValueError(f"grain must be one of {', '.join(rollups.GRAINS)}")
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'results': rollups.specialization_demand(start, end, grain)}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def specializationFacetView(request):
+    """Specializations with their number of doctors, GET /api/doctors/specializations/"""
+    return Response({'results': caching.specialization_facets()}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def cacheStatsView(request):
+    """Cache hits and misses per namespace since this process started; loopback only, as metricsView."""
+    if request.META.get('REMOTE_ADDR') not in metrics.METRICS_ADDRESSES:
+        return Response(status=status.HTTP_403_FORBIDDEN)
+    return Response(caching.stats.snapshot(), status=status.HTTP_200_OK)
+
+
+@require_GET
+def metricsView(request):
+    """Request metrics of this process in the Prometheus text format, see metrics.py."""
+    if request.META.get('REMOTE_ADDR') not in metrics.METRICS_ADDRESSES:
+        return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+    return HttpResponse(metrics.registry.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# -----------------------
+# Async views, for deployments under ASGI (penitansye/asgi.py)
+#
+# Plain Django views rather than DRF ones: DRF runs every view synchronously,
+# so awaiting the async ORM is only possible outside it. Under ASGI these
+# release the event loop while they wait on the database or the cache
+# instead of holding a worker thread each.
+# -----------------------
+
+def _json(data, status_code=200):
+    return JsonResponse(data, status=status_code, encoder=DjangoJSONEncoder)
+
+
+@replica_reads
+@require_GET
+async def availabilityAsyncView(request):
+    """Async availabilityView, always answered in one piece."""
+    try:
+        doctor_ids, clinic_id, start_date, end_date, days = _availability_params(request.GET)
+    except ValueError as exc:
+        return _json({'error': str(exc)}, status.HTTP_400_BAD_REQUEST)
+
+    clinic = await caching.aclinic_info(clinic_id)
+    error = _clinic_error(clinic)
+    if error:
+        message, code = error
+        return _json({'error': message}, code)
+
+    rows = await afree_slots(doctor_ids, clinic['schedule'], start_date, end_date)
+    return _json({'clinic': clinic_id, 'slots': [_availability_row(*row) for row in rows]})
+
+
+BOOKING_FIELDS = ('patient', 'doctor', 'clinic', 'visit_date')
+
+
+async def _token_user(request):
+    """The active user of an "Authorization: Token <key>" header, as DRF's TokenAuthentication reads it, or None."""
+    keyword, _, key = request.headers.get('Authorization', '').partition(' ')
+    if keyword != 'Token' or not key.strip():
+        return None
+    token = await Token.objects.select_related('user').filter(key=key.strip()).afirst()
+    return token.user if token is not None and token.user.is_active else None
+
+
+async def _staff_error(request):
+    """None if the API token or the session is an active staff user's, else the 401 or 403 to answer."""
+    user = await _token_user(request) or await request.auser()
+    if not user.is_authenticated:
+        response = _json({'error': "Authentication credentials were not provided"}, status.HTTP_401_UNAUTHORIZED)
+        response['WWW-Authenticate'] = 'Token'
+        return response
+    if not (user.is_active and user.is_staff):
+        return _json({'error': "Staff only"}, status.HTTP_403_FORBIDDEN)
+    return None
+
+
+# No cookie is looked at, only the token header, so there is no session for CSRF to protect
+@csrf_exempt
+@require_POST
+async def bookingAsyncView(request):
+    """Book one appointment from a JSON body, for clients sending an API token.
+
+    POST /api/async/appointments/book/
+    Authorization: Token <key>
+    {"patient": 1, "doctor": 2, "clinic": 3, "visit_date": "2025-11-18T09:30", "treatment": "..."}
+
+    Answers 201 with the appointment, or 409 with the nearest free slots
+    that day if the doctor is already booked at that time; 401 without a
+    valid token.
+    """
+    if await _token_user(request) is None:
+        response = _json({'error': "A valid API token is required"}, status.HTTP_401_UNAUTHORIZED)
+        response['WWW-Authenticate'] = 'Token'
+        return response
+    try:
+        payload = json.loads(request.body)
+        visit_date = datetime.fromisoformat(payload['visit_date'])
+        ids = {f'{name}_id': int(payload[name]) for name in BOOKING_FIELDS if name != 'visit_date'}
+        treatment = payload.get('treatment')
+        if treatment is not None and not isinstance(treatment, str):
+            raise TypeError('treatment')
+    except (KeyError, TypeError, ValueError):
+        return _json(
+            {'error': "Expected a JSON body with patient, doctor, clinic, visit_date and optional treatment"},
+            status.HTTP_400_BAD_REQUEST,
+        )
+    if timezone.is_naive(visit_date):
+        visit_date = timezone.make_aware(visit_date)
+
+    clinic = await caching.aclinic_info(ids['clinic_id'])
+    if clinic is None:
+        return _json({'error': "Clinic not found"}, status.HTTP_404_NOT_FOUND)
+    appointment = Appointment(visit_date=visit_date, treatment=treatment, **ids)
+    try:
+        await abook_appointment(appointment)
+    except SlotTaken as taken:
+        return _json({'error': str(taken), 'alternatives': taken.alternatives}, status.HTTP_409_CONFLICT)
+    except IntegrityError:
+        return _json({'error': "Unknown patient or doctor"}, status.HTTP_400_BAD_REQUEST)
+    return _json({
+        'id': appointment.pk,
+        'visit_date': appointment.visit_date,
+        'treatment': appointment.treatment,
+        **{name: ids[f'{name}_id'] for name in ('patient', 'doctor', 'clinic')},
+    }, status.HTTP_201_CREATED)
+
+
+@require_GET
+async def slotFeedView(request):
+    """Slots booked and freed, as Server-Sent Events, for screens to update availability without polling.
+
+    GET /api/async/availability/feed/?doctors=1,2&clinic=3 (both optional)
+
+    Events are "booked" and "freed", with data {"appointment", "doctor",
+    "clinic", "visit_date"}. A client reconnecting with Last-Event-ID (or
+    ?last_event_id=) is sent the events it missed, or "reset" if they are no
+    longer kept: it should reload availability then.
+    """
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI every open feed would hold a worker thread
+        return _json({'error': "The feed needs an ASGI server (penitansye/asgi.py)"}, status.HTTP_501_NOT_IMPLEMENTED)
+    try:
+        doctor_ids = [int(pk) for pk in request.GET['doctors'].split(',')] if request.GET.get('doctors') else None
+        clinic_id = int(request.GET['clinic']) if request.GET.get('clinic') else None
+    except ValueError:
+        return _json({'error': "doctors must be comma-separated ids and clinic an id"}, status.HTTP_400_BAD_REQUEST)
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    response = StreamingHttpResponse(
+        feed.stream(doctor_ids, clinic_id, last_event_id), content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # or nginx holds the events back
+    return response
+
+
+async def _avisit_list(request, model):
+    if error := await _staff_error(request):
+        return error
+    try:
+        querysets, page_size = _visit_querysets(request.GET, model)
+        rows, next_cursor = await amerged_keyset_page(querysets, request.GET.get('cursor'), page_size)
+    except ValueError as exc:
+        return _json({'error': str(exc)}, status.HTTP_400_BAD_REQUEST)
+    return _json({'results': [_visit_row(row) for row in rows], 'next': next_cursor})
+
+
+@replica_reads
+@require_GET
+async def appointmentListAsyncView(request):
+    return await _avisit_list(request, Appointment)
+
+
+@replica_reads
+@require_GET
+async def recordListAsyncView(request):
+    return await _avisit_list(request, Record)
@@ -1,10 +1,32 @@
+import gc
+import io
+import mmap
+import pickle
+import struct
+import sys
 from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left, insort
+from collections.abc import Sequence
+from itertools import repeat
 from datetime import datetime, timedelta, time
 
+# Opening hours are parsed by the web app's parser, which doesn't need Django
+from penitansye.penitansyeAPI.opening_hours import SLOT_LENGTH, Schedule, parse_schedule
+
+try:
+    import numpy as np
+except ImportError:  # only AvailabilityMatrix needs it
+    np = None
+
 # -----------------------
 # Abstract User Class
 # -----------------------
 class User(ABC):
+    # __slots__ throughout: no per-instance __dict__, which matters once a
+    # simulation holds millions of records
+    __slots__ = ("firstname", "lastname", "dateOfBirth", "phone", "email")
+
     def __init__(self, firstname, lastname, dateOfBirth, phone, email):
         self.firstname = firstname
         self.lastname = lastname
@@ -27,6 +49,8 @@ class User(ABC):
 # Patient Class
 # -----------------------
 class Patient(User):
+    __slots__ = ("symptoms", "records")
+
     def __init__(self, firstname, lastname, dateOfBirth, phone, email, symptoms):
         super().__init__(firstname, lastname, dateOfBirth, phone, email)
         self.symptoms = symptoms
@@ -64,32 +88,12 @@ class Patient(User):
             print("Invalid date format. Please use YYYY-MM-DD.")
             return None
         
-        # Helper to parse opening hours like "8AM-5PM"
-        def parse_hour(hour_str):
-            hour = int(hour_str[:-2])
-            if "PM" in hour_str and hour != 12:
-                hour += 12
-            if "AM" in hour_str and hour == 12:
-                hour = 0
-            return hour
-        
-        try:
-            open_str, close_str = clinic.openingHours.split('-')
-            open_hour = parse_hour(open_str.strip())
-            close_hour = parse_hour(close_str.strip())
-        except Exception:
+        if clinic.schedule is None:
             print("Invalid clinic opening hours format. Should be like '8AM-5PM'")
             return None
         
-        # Generate 30-minute slots
-        slots = []
-        current_time = datetime.combine(appointment_day, time(open_hour, 0))
-        end_time = datetime.combine(appointment_day, time(close_hour, 0))
-        
-        while current_time < end_time:
-            if hospital_system.is_slot_available(doctor, current_time):
-                slots.append(current_time)
-            current_time += timedelta(minutes=30)
+        # Free 30-minute slots: the day's precomputed slot starts, checked against the booking index
+        slots = hospital_system.free_slots_on(doctor, clinic, appointment_day)
         
         if not slots:
             print("No available time slots for this doctor on that day.")
@@ -115,9 +119,7 @@ class Patient(User):
         
         # Create record and store visitDate as datetime
         record = Record(self, doctor, clinic, selected_slot, treatment)
-        self.records.append(record)
-        doctor.records.append(record)
-        hospital_system.records.append(record)
+        hospital_system.add_record(record)
         
         print(f"Appointment scheduled for {self} with Dr. {doctor.lastname} on {selected_slot.strftime('%Y-%m-%d %H:%M')} at {clinic.clinicName}")
         return record
@@ -133,6 +135,8 @@ class Patient(User):
 # Doctor Class
 # -----------------------
 class Doctor(User):
+    __slots__ = ("specialization", "licenceNumber", "yearsOfExperience", "records")
+
     def __init__(self, firstname, lastname, dateOfBirth, phone, email, specialization, licenceNumber, yearsOfExperience):
         super().__init__(firstname, lastname, dateOfBirth, phone, email)
         self.specialization = specialization
@@ -154,6 +158,11 @@ class Doctor(User):
 # Clinic Class
 # -----------------------
 class Clinic:
+    __slots__ = (
+        "clinicID", "clinicName", "address", "city", "province", "zipcode",
+        "phone", "email", "_openingHours", "schedule", "createdAt", "updatedAt",
+    )
+
     def __init__(self, clinicID, clinicName, address, city, province, zipcode, phone, email, openingHours, createdAt=None, updatedAt=None):
         self.clinicID = clinicID
         self.clinicName = clinicName
@@ -167,13 +176,50 @@ class Clinic:
         self.createdAt = createdAt or datetime.now()
         self.updatedAt = updatedAt or datetime.now()
         
+    @property
+    def openingHours(self):
+        return self._openingHours
+
+    @openingHours.setter
+    def openingHours(self, openingHours):
+        """Parse the hours once, here; schedule is None if they are malformed."""
+        self._openingHours = openingHours
+        try:
+            self.schedule = ClinicSchedule.parse(openingHours)
+        except ValueError:
+            self.schedule = None
+
     def __str__(self):
         return f"{self.clinicName} - at {self.city}, {self.province}"
 
+# -----------------------
+# ClinicSchedule Class
+# -----------------------
+class ClinicSchedule(Schedule):
+    """The Schedule of penitansyeAPI/opening_hours.py, which parses opening hours for the web app too,
+    with the slots as the naive datetimes records are booked at.
+    """
+
+    def slots(self, day):
+        """The slot start datetimes of a day, empty if the clinic is closed."""
+        return [datetime.combine(day, slot_time) for slot_time in self.slot_times_on(day)]
+
+    def is_slot(self, visit_datetime):
+        """Whether a slot starts at visit_datetime on a day the clinic is open."""
+        return visit_datetime.time() in self.slot_times_on(visit_datetime.date())
+
+    @classmethod
+    def parse(cls, openingHours):
+        """Parse opening hours like "8AM-5PM" (see parse_schedule); raise ValueError if they are malformed."""
+        schedule = parse_schedule(openingHours)
+        return cls(schedule.windows, schedule.holidays)
+
 # -----------------------
 # Record Class
 # -----------------------
 class Record:
+    __slots__ = ("patient", "doctor", "clinic", "visitDate", "treatment")
+
     def __init__(self, patient: Patient, doctor: Doctor, clinic: Clinic, visitDate: datetime, treatment):
         self.patient = patient
         self.doctor = doctor
@@ -181,28 +227,700 @@ class Record:
         self.visitDate = visitDate  # datetime object
         self.treatment = treatment
         
+    @classmethod
+    def recurring(cls, patient, doctor, clinic, firstVisit, treatment, every=timedelta(weeks=1), count=1):
+        """count Records every `every` from firstVisit, e.g. a course of weekly sessions."""
+        return [cls(patient, doctor, clinic, firstVisit + i * every, treatment) for i in range(count)]
+
     def __str__(self):
         return f"Record: {self.patient} visited Dr. {self.doctor.lastname} at {self.clinic.clinicName} on {self.visitDate.strftime('%Y-%m-%d %H:%M')}. Treatment: {self.treatment}"
 
+# -----------------------
+# BookingIndex Class
+# -----------------------
+def _seconds_of_day(visit_datetime):
+    return visit_datetime.hour * 3600 + visit_datetime.minute * 60 + visit_datetime.second
+
+
+class BookingIndex:
+    """Booked start times of one doctor, bucketed by day.
+
+    Each day maps to a sorted array of seconds since midnight, so a
+    single-slot check is a hash lookup followed by a binary search and never
+    touches other days. Times are kept to the second.
+    """
+    __slots__ = ("days",)
+
+    def __init__(self, visit_datetimes=()):
+        self.days = {}
+        for visit_datetime in visit_datetimes:
+            self.add(visit_datetime)
+
+    def __len__(self):
+        return sum(len(booked) for booked in self.days.values())
+
+    def add(self, visit_datetime):
+        booked = self.days.get(visit_datetime.date())
+        if booked is None:
+            booked = self.days[visit_datetime.date()] = array("i")
+        insort(booked, _seconds_of_day(visit_datetime))
+
+    def remove(self, visit_datetime):
+        day = visit_datetime.date()
+        booked = self.days.get(day)
+        if not booked:
+            return
+        seconds = _seconds_of_day(visit_datetime)
+        i = bisect_left(booked, seconds)
+        if i < len(booked) and booked[i] == seconds:
+            del booked[i]
+            if not booked:
+                del self.days[day]
+
+    def is_booked(self, visit_datetime):
+        booked = self.days.get(visit_datetime.date())
+        if not booked:
+            return False
+        seconds = _seconds_of_day(visit_datetime)
+        i = bisect_left(booked, seconds)
+        return i < len(booked) and booked[i] == seconds
+
+    def free_slots(self, start, end, step=timedelta(minutes=30)):
+        """Return the slot starts in [start, end) that are not booked."""
+        slots = []
+        current_time = start
+        booked_day, booked = None, ()
+        while current_time < end:
+            if current_time.date() != booked_day:
+                booked_day = current_time.date()
+                booked = set(self.days.get(booked_day, ()))
+            if _seconds_of_day(current_time) not in booked:
+                slots.append(current_time)
+            current_time += step
+        return slots
+
+# -----------------------
+# NameTrie Class
+# -----------------------
+class NameTrie:
+    """Prefix index of names. Every node keeps the values under it, so a lookup walks the prefix only."""
+    __slots__ = ("root",)
+
+    def __init__(self):
+        # char -> [children, values]; values maps each value to how many of its names pass through
+        self.root = {}
+
+    def add(self, name, value):
+        node = self.root
+        for char in name.casefold():
+            children, values = node.setdefault(char, [{}, {}])
+            values[value] = values.get(value, 0) + 1
+            node = children
+
+    def remove(self, name, value):
+        path, node = [], self.root
+        for char in name.casefold():
+            if char not in node:
+                return
+            path.append((node, char))
+            node = node[char][0]
+        for node, char in reversed(path):
+            children, values = node[char]
+            if values.get(value, 0) > 1:
+                values[value] -= 1
+            else:
+                values.pop(value, None)
+            if not values:
+                del node[char]
+
+    def find(self, prefix):
+        """Values added under a name starting with prefix, case-insensitively, in insertion order."""
+        node, values = self.root, {}
+        for char in prefix.casefold():
+            if char not in node:
+                return []
+            children, values = node[char]
+            node = children
+        return list(values)
+
+# -----------------------
+# RecordStore Class
+# -----------------------
+class RecordStore(Sequence):
+    """Records kept column by column, for HospitalSystem(compact=True).
+
+    Doctors, patients and clinics are stored once and referred to by their
+    position in a table; treatments go in a string table of NUL-terminated
+    UTF-8. Each record is then five int32 columns, 20 bytes instead of a
+    Record object and its datetime. Indexing builds a new Record each time,
+    so the same record read twice is two objects. Visit dates must be naive
+    and are kept to the minute; treatments are kept as text.
+
+    The columns are arrays, or read-only memoryviews over a snapshot (see
+    load_snapshot) until the first append copies them.
+    """
+    EPOCH = datetime(1970, 1, 1)
+    COLUMNS = ("doctor_ids", "patient_ids", "clinic_ids", "visit_minutes", "treatment_offsets")
+
+    def __init__(self, doctors=(), patients=(), clinics=(), columns=None, strings=b""):
+        self.doctors = list(doctors)
+        self.patients = list(patients)
+        self.clinics = list(clinics)
+        for name in self.COLUMNS:
+            setattr(self, name, columns[name] if columns else array("i"))
+        self.strings = strings
+        self._positions = None  # id() of each doctor, patient and clinic -> its position in its table
+        self._text_offsets = None  # treatment -> its offset in strings
+        self._texts = {}
+
+    def _writable(self):
+        if self._positions is None:
+            for name in self.COLUMNS:
+                column = getattr(self, name)
+                if not isinstance(column, array):
+                    setattr(self, name, array("i", column))
+            self.strings = bytearray(self.strings)
+            self._positions = {
+                id(obj): i
+                for table in (self.doctors, self.patients, self.clinics)
+                for i, obj in enumerate(table)
+            }
+            self._text_offsets = self._string_offsets()
+
+    def _string_offsets(self):
+        offsets, start = {}, 0
+        while start < len(self.strings):
+            end = self.strings.find(b"\0", start)
+            offsets[bytes(self.strings[start:end]).decode()] = start
+            start = end + 1
+        return offsets
+
+    def _intern(self, table, obj):
+        i = self._positions.get(id(obj))
+        if i is None:
+            i = self._positions[id(obj)] = len(table)
+            table.append(obj)
+        return i
+
+    def _text_offset(self, text):
+        if text is None:
+            return -1
+        text = str(text)
+        offset = self._text_offsets.get(text)
+        if offset is None:
+            offset = self._text_offsets[text] = len(self.strings)
+            self.strings += text.encode() + b"\0"
+        return offset
+
+    def append(self, record):
+        """Store a record and return its offset."""
+        self._writable()
+        self.doctor_ids.append(self._intern(self.doctors, record.doctor))
+        self.patient_ids.append(self._intern(self.patients, record.patient))
+        self.clinic_ids.append(self._intern(self.clinics, record.clinic))
+        self.visit_minutes.append((record.visitDate - self.EPOCH) // timedelta(minutes=1))
+        self.treatment_offsets.append(self._text_offset(record.treatment))
+        return len(self.visit_minutes) - 1
+
+    def visit_date(self, offset):
+        return self.EPOCH + timedelta(minutes=self.visit_minutes[offset])
+
+    def treatment(self, offset):
+        start = self.treatment_offsets[offset]
+        if start < 0:
+            return None
+        text = self._texts.get(start)
+        if text is None:
+            end = self.strings.find(b"\0", start)
+            text = self._texts[start] = bytes(self.strings[start:end]).decode()
+        return text
+
+    def __len__(self):
+        return len(self.visit_minutes)
+
+    def __getitem__(self, offset):
+        if isinstance(offset, slice):
+            return [self[i] for i in range(*offset.indices(len(self)))]
+        return Record(
+            self.patients[self.patient_ids[offset]],
+            self.doctors[self.doctor_ids[offset]],
+            self.clinics[self.clinic_ids[offset]],
+            self.visit_date(offset),
+            self.treatment(offset),
+        )
+
+
+class StoredRecords(Sequence):
+    """The records of one patient or doctor: offsets into a RecordStore."""
+    __slots__ = ("store", "offsets")
+
+    def __init__(self, store, offsets=None):
+        self.store = store
+        self.offsets = array("i") if offsets is None else offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.store[offset] for offset in self.offsets[i]]
+        return self.store[self.offsets[i]]
+
+    def append_offset(self, offset):
+        if not isinstance(self.offsets, array):
+            self.offsets = array("i", self.offsets)
+        self.offsets.append(offset)
+
 # -----------------------
 # HospitalSystem Class
 # -----------------------
 class HospitalSystem:
-    def __init__(self):
-        self.records = []
+    def __init__(self, compact=False):
+        """compact=True keeps records in a RecordStore, see there for the trade-offs."""
+        self.records = RecordStore() if compact else []
         self.doctors = []
+        self.bookings = {}  # doctor -> BookingIndex
+        self.by_specialization = {}  # casefolded specialization -> {doctor: None}
+        self.doctor_names = NameTrie()  # first and last names
+
+    @property
+    def compact(self):
+        return isinstance(self.records, RecordStore)
 
     def add_doctor(self, doctor):
         self.doctors.append(doctor)
+        self._index_doctor(doctor)
+
+    def remove_doctor(self, doctor):
+        self.doctors.remove(doctor)
+        self._unindex_doctor(doctor)
+
+    def update_doctor(self, doctor, **changes):
+        """Change a doctor's attributes, e.g. specialization="Cardiology", keeping the indexes current."""
+        self._unindex_doctor(doctor)
+        try:
+            for name, value in changes.items():
+                setattr(doctor, name, value)
+        finally:
+            self._index_doctor(doctor)
+
+    def _index_doctor(self, doctor):
+        self.by_specialization.setdefault(doctor.specialization.casefold(), {})[doctor] = None
+        self.doctor_names.add(doctor.firstname, doctor)
+        self.doctor_names.add(doctor.lastname, doctor)
+
+    def _unindex_doctor(self, doctor):
+        key = doctor.specialization.casefold()
+        doctors = self.by_specialization.get(key, {})
+        doctors.pop(doctor, None)
+        if not doctors:
+            self.by_specialization.pop(key, None)
+        self.doctor_names.remove(doctor.firstname, doctor)
+        self.doctor_names.remove(doctor.lastname, doctor)
 
     def get_doctors(self, specialization=None):
         if specialization:
-            return [doc for doc in self.doctors if doc.specialization.lower() == specialization.lower()]
+            return list(self.by_specialization.get(specialization.casefold(), ()))
         return self.doctors
 
+    def find_doctors(self, prefix):
+        """Doctors whose first or last name starts with prefix, case-insensitively."""
+        return self.doctor_names.find(prefix)
+
+    def add_record(self, record):
+        """Attach a record to its patient, its doctor and the booking index."""
+        index = self.booking_index(record.doctor)
+        if self.compact:
+            patient_records = self._stored_records(record.patient)
+            doctor_records = self._stored_records(record.doctor)
+            offset = self.records.append(record)
+            patient_records.append_offset(offset)
+            doctor_records.append_offset(offset)
+        else:
+            record.patient.records.append(record)
+            record.doctor.records.append(record)
+            self.records.append(record)
+        index.add(record.visitDate)
+
+    def _stored_records(self, owner):
+        """Swap the owner's empty record list for a view into this system's store."""
+        records = owner.records
+        if isinstance(records, StoredRecords) and records.store is self.records:
+            return records
+        if records:
+            raise ValueError(f"{owner!r} already has records kept outside this system")
+        owner.records = StoredRecords(self.records)
+        return owner.records
+
+    def booking_index(self, doctor):
+        """Return the doctor's BookingIndex, building it from doctor.records on first use."""
+        index = self.bookings.get(doctor)
+        if index is None:
+            records = doctor.records
+            if isinstance(records, StoredRecords):
+                # Straight from the visit column, without building Records
+                visits = (records.store.visit_date(offset) for offset in records.offsets)
+            else:
+                visits = (r.visitDate for r in records)
+            index = self.bookings[doctor] = BookingIndex(visits)
+        return index
+
     def is_slot_available(self, doctor, visit_datetime: datetime) -> bool:
         """Check if the doctor has an appointment at the given datetime."""
-        return all(record.visitDate != visit_datetime for record in doctor.records)
+        return not self.booking_index(doctor).is_booked(visit_datetime)
+
+    def free_slots(self, doctor, start: datetime, end: datetime, step=timedelta(minutes=30)):
+        """Return the doctor's free slot starts between start and end."""
+        return self.booking_index(doctor).free_slots(start, end, step)
+
+    def availability_matrix(self, clinic, first_day, days, specialization=None):
+        """An AvailabilityMatrix of the doctors (of one specialization) at a clinic over days from first_day.
+
+        Raise ValueError if the clinic's opening hours don't parse.
+        """
+        if clinic.schedule is None:
+            raise ValueError(f"The opening hours of {clinic.clinicName} are malformed: {clinic.openingHours!r}")
+        doctors = self.get_doctors(specialization)
+        matrix = AvailabilityMatrix(doctors, first_day, days, clinic.schedule)
+        # Straight from the booking indexes' per-day arrays, without a datetime per booking
+        rows, day_offsets, seconds = array("i"), array("i"), array("i")
+        for doctor in doctors:
+            row = matrix.rows[doctor]
+            for day, booked in self.booking_index(doctor).days.items():
+                offset = (day - first_day).days
+                if 0 <= offset < days:
+                    rows.extend(repeat(row, len(booked)))
+                    day_offsets.extend(repeat(offset, len(booked)))
+                    seconds.extend(booked)
+        matrix.book_seconds(rows, day_offsets, seconds)
+        return matrix
+
+    def free_slots_on(self, doctor, clinic, day):
+        """Return the doctor's free slot starts on a day, within the clinic's opening hours."""
+        index = self.booking_index(doctor)
+        return [slot for slot in clinic.schedule.slots(day) if not index.is_booked(slot)]
+
+    def book_many(self, records):
+        """Book a batch of Records; return one status per record, in order.
+
+        A record is "booked", or left out as "closed" (outside its clinic's
+        hours, or the hours don't parse) or "conflict" (the doctor is already
+        booked then, including by an earlier record of the same batch). Each
+        check is a lookup in the doctor's BookingIndex, without listing the
+        day's free slots as make_appointment does.
+        """
+        statuses = []
+        for record in records:
+            schedule = record.clinic.schedule
+            if schedule is None or not schedule.is_slot(record.visitDate):
+                statuses.append("closed")
+            elif self.booking_index(record.doctor).is_booked(record.visitDate):
+                statuses.append("conflict")
+            else:
+                self.add_record(record)
+                statuses.append("booked")
+        return statuses
+
+    def save(self, path):
+        """Write the system to a snapshot file, see save_snapshot."""
+        save_snapshot(self, path)
+
+    @classmethod
+    def load(cls, path):
+        """Open a snapshot written by save() as a compact system, see load_snapshot."""
+        return load_snapshot(path)
+
+# -----------------------
+# AvailabilityMatrix Class
+# -----------------------
+class AvailabilityMatrix:
+    """Free slots of many doctors over many days, as a doctors x slots boolean matrix.
+
+    Columns are the slots of each day, day after day, from the earliest
+    opening to the latest closing of the clinic's schedule; those outside
+    the day's hours (a break, a weekend, a holiday) start taken, so that
+    questions about every doctor at once ("the earliest free slot of any
+    cardiologist in the next two weeks") are a few NumPy operations instead
+    of a loop over doctors and days. Needs numpy. Visit dates are naive.
+    """
+    def __init__(self, doctors, first_day, days, schedule):
+        if np is None:
+            raise ImportError("AvailabilityMatrix needs numpy: pip install numpy")
+        self.doctors = list(doctors)
+        self.rows = {doctor: i for i, doctor in enumerate(self.doctors)}
+        self.first_day = first_day
+        self.days = days
+        self.step = SLOT_LENGTH
+        windows = [window for day_windows in schedule.windows for window in day_windows]
+        self.open_time = min((open_time for open_time, _ in windows), default=time(0))
+        close_time = max((close_time for _, close_time in windows), default=self.open_time)
+        day_length = datetime.combine(first_day, close_time) - datetime.combine(first_day, self.open_time)
+        self.slots_per_day = day_length // self.step
+        self.open = self._open_slots(schedule)
+        self.free = np.repeat(self.open[np.newaxis, :], len(self.doctors), axis=0)
+
+    def _open_slots(self, schedule):
+        """Which columns are slots the clinic is open for."""
+        opening = datetime.combine(self.first_day, self.open_time)
+        weekdays = np.zeros((8, self.slots_per_day), dtype=bool)  # Monday to Sunday, then closed
+        for weekday in range(7):
+            for slot_time in schedule.slot_times[weekday]:
+                weekdays[weekday, (datetime.combine(self.first_day, slot_time) - opening) // self.step] = True
+        day_rows = [
+            7 if day in schedule.holidays else day.weekday()
+            for day in (self.first_day + timedelta(days=offset) for offset in range(self.days))
+        ]
+        return weekdays[day_rows].reshape(-1)
+
+    @classmethod
+    def from_bookings(cls, doctors, bookings, first_day, days, schedule):
+        """Build from (doctor, visit datetime) pairs, e.g. Appointment (doctor_id, visit_date) rows."""
+        matrix = cls(doctors, first_day, days, schedule)
+        matrix.book_many(bookings)
+        return matrix
+
+    @classmethod
+    def from_records(cls, records, doctors, first_day, days, schedule):
+        return cls.from_bookings(doctors, ((r.doctor, r.visitDate) for r in records), first_day, days, schedule)
+
+    def column(self, visit_datetime):
+        """The column of the slot starting at visit_datetime, or None if it isn't one."""
+        day = (visit_datetime.date() - self.first_day).days
+        since_open = visit_datetime - datetime.combine(visit_datetime.date(), self.open_time)
+        slot, rest = divmod(since_open, self.step)
+        if 0 <= day < self.days and 0 <= slot < self.slots_per_day and not rest:
+            return day * self.slots_per_day + slot
+        return None
+
+    def slot(self, column):
+        day, slot = divmod(int(column), self.slots_per_day)
+        start = datetime.combine(self.first_day + timedelta(days=day), self.open_time)
+        return start + slot * self.step
+
+    def book_many(self, bookings):
+        """Mark slots taken; bookings of other doctors or outside the matrix are ignored."""
+        rows, columns = [], []
+        for doctor, visit_datetime in bookings:
+            row = self.rows.get(doctor)
+            column = self.column(visit_datetime) if row is not None else None
+            if column is not None:
+                rows.append(row)
+                columns.append(column)
+        self.free[rows, columns] = False
+
+    def book_seconds(self, rows, day_offsets, seconds):
+        """Mark slots taken given parallel sequences of row, day offset and seconds since midnight."""
+        since_open = np.asarray(seconds, dtype=np.int64) - (self.open_time.hour * 3600 + self.open_time.minute * 60)
+        slot, rest = np.divmod(since_open, int(self.step.total_seconds()))
+        day_offsets = np.asarray(day_offsets, dtype=np.int64)
+        keep = (rest == 0) & (slot >= 0) & (slot < self.slots_per_day) & (day_offsets >= 0) & (day_offsets < self.days)
+        rows = np.asarray(rows, dtype=np.intp)[keep]
+        self.free[rows, day_offsets[keep] * self.slots_per_day + slot[keep]] = False
+
+    def book(self, doctor, visit_datetime):
+        self.book_many([(doctor, visit_datetime)])
+
+    def release(self, doctor, visit_datetime):
+        """Free a booked slot again; slots the clinic is closed for stay taken."""
+        column = self.column(visit_datetime)
+        if doctor in self.rows and column is not None and self.open[column]:
+            self.free[self.rows[doctor], column] = True
+
+    def _window(self, doctors, start, end):
+        """Row indices and the [first, last) column range of a query."""
+        rows = np.arange(len(self.doctors)) if doctors is None else np.array(
+            [self.rows[doctor] for doctor in doctors], dtype=np.intp
+        )
+        first = 0 if start is None else self._column_at_or_after(start)
+        last = self.free.shape[1] if end is None else self._column_at_or_after(end)
+        return rows, first, max(first, last)
+
+    def _column_at_or_after(self, moment):
+        day = (moment.date() - self.first_day).days
+        if day < 0:
+            return 0
+        if day >= self.days:
+            return self.free.shape[1]
+        since_open = moment - datetime.combine(moment.date(), self.open_time)
+        slot = min(max(-(-since_open // self.step), 0), self.slots_per_day)
+        return day * self.slots_per_day + slot
+
+    def earliest_free(self, doctors=None, start=None, end=None):
+        """The (doctor, slot start) of the earliest free slot in [start, end), or None."""
+        rows, first, last = self._window(doctors, start, end)
+        window = self.free[rows, first:last]
+        any_free = window.any(axis=0)
+        if not any_free.any():
+            return None
+        column = int(any_free.argmax())
+        doctor = self.doctors[rows[window[:, column].argmax()]]
+        return doctor, self.slot(first + column)
+
+    def count_free(self, doctors=None, start=None, end=None):
+        """{doctor: number of free slots in [start, end)}."""
+        rows, first, last = self._window(doctors, start, end)
+        counts = self.free[rows, first:last].sum(axis=1)
+        return {self.doctors[row]: int(count) for row, count in zip(rows, counts)}
+
+    def common_free(self, doctors, start=None, end=None):
+        """Slot starts in [start, end) at which every one of the doctors is free."""
+        rows, first, last = self._window(doctors, start, end)
+        columns = np.flatnonzero(self.free[rows, first:last].all(axis=0))
+        return [self.slot(first + column) for column in columns]
+
+# -----------------------
+# Snapshots
+# -----------------------
+SNAPSHOT_MAGIC = b"HSNAP\x00\x00\x01"
+SNAPSHOT_SECTIONS = RecordStore.COLUMNS + (
+    "doctor_order", "doctor_starts", "patient_order", "patient_starts", "strings", "people",
+)
+_SNAPSHOT_HEADER = struct.Struct("<8s" + "QQ" * len(SNAPSHOT_SECTIONS))
+
+
+class _PeoplePickler(pickle.Pickler):
+    """Pickles doctors and patients without their records, which the snapshot keeps as columns."""
+
+    def __init__(self, file, owners):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.records = {id(owner.records) for owner in owners}
+
+    def persistent_id(self, obj):
+        return "records" if id(obj) in self.records else None
+
+
+class _PeopleUnpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        return None  # replaced by a StoredRecords view once the store is built
+
+
+def _group_offsets(owners, column, store):
+    """Record offsets grouped by owner, and the position where each owner's group starts."""
+    groups = [owner.records for owner in owners]
+    if not all(isinstance(group, StoredRecords) and group.store is store for group in groups):
+        groups = [StoredRecords(store) for _ in owners]
+        for offset, owner_id in enumerate(column):
+            groups[owner_id].offsets.append(offset)
+    order, starts = array("i"), array("i", [0])
+    for group in groups:
+        order.extend(group.offsets)
+        starts.append(len(order))
+    return order, starts
+
+
+def _little_endian(ints):
+    """The bytes of int32s as '<i4', whatever the byte order of this machine."""
+    if sys.byteorder == "little":
+        return memoryview(ints).cast("B")
+    swapped = array("i", ints)
+    swapped.byteswap()
+    return memoryview(swapped).cast("B")
+
+
+def _int32s(section):
+    """The int32s of a '<i4' section: a view over it, or a swapped copy on big-endian machines."""
+    if sys.byteorder == "little":
+        return section.cast("i")
+    ints = array("i")
+    ints.frombytes(section)
+    ints.byteswap()
+    return ints
+
+
+def save_snapshot(hospital_system, path):
+    """Write hospital_system to path in the format read by load_snapshot.
+
+    A header of (offset, length) pairs is followed by 8-byte aligned sections:
+    the five RecordStore columns, every doctor's and every patient's record
+    offsets laid out together with the position each one starts at, the
+    treatment string table, and a pickle of the doctors, patients and clinics
+    without their records. Integers are little-endian int32 ('<i4'), as the
+    header is little-endian.
+    """
+    store = hospital_system.records
+    if not hospital_system.compact:
+        store = RecordStore()
+        for record in hospital_system.records:
+            store.append(record)
+    stored = {id(doctor) for doctor in store.doctors}
+    doctors = store.doctors + [doctor for doctor in hospital_system.doctors if id(doctor) not in stored]
+    positions = {id(doctor): i for i, doctor in enumerate(doctors)}
+    doctor_order, doctor_starts = _group_offsets(doctors, store.doctor_ids, store)
+    patient_order, patient_starts = _group_offsets(store.patients, store.patient_ids, store)
+    people = io.BytesIO()
+    _PeoplePickler(people, doctors + store.patients).dump({
+        "doctors": doctors,
+        "patients": store.patients,
+        "clinics": store.clinics,
+        "system_doctors": [positions[id(doctor)] for doctor in hospital_system.doctors],
+    })
+    sections = [_little_endian(getattr(store, name)) for name in RecordStore.COLUMNS]
+    sections += [_little_endian(section) for section in (doctor_order, doctor_starts, patient_order, patient_starts)]
+    sections += [memoryview(bytes(store.strings)), people.getbuffer()]
+
+    header, offset = [], _SNAPSHOT_HEADER.size
+    for section in sections:
+        offset += -offset % 8
+        header += [offset, section.nbytes]
+        offset += section.nbytes
+    with open(path, "wb") as f:
+        f.write(_SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, *header))
+        for section, start in zip(sections, header[::2]):
+            f.write(bytes(start - f.tell()))
+            f.write(section)
+
+
+def load_snapshot(path):
+    """Open a snapshot as a compact HospitalSystem without reading its records.
+
+    The file is memory-mapped and the record columns and per-doctor and
+    per-patient offsets are memoryviews over it (copies on big-endian
+    machines), so opening costs the same however many records there are;
+    only the doctors, patients and clinics are unpickled. Pages are read as records are looked at, and the columns
+    are copied into memory by the first add_record(). Snapshots are pickles
+    underneath: only load files you wrote.
+    """
+    # Nothing built here is garbage; collections triggered by the
+    # allocations would only rescan the objects being built
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        return _load_snapshot(path)
+    finally:
+        if collecting:
+            gc.enable()
+
+
+def _load_snapshot(path):
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header = _SNAPSHOT_HEADER.unpack_from(mapped)
+    if header[0] != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} is not a HospitalSystem snapshot")
+    view = memoryview(mapped)
+    sections = {
+        name: view[offset:offset + length]
+        for name, offset, length in zip(SNAPSHOT_SECTIONS, header[1::2], header[2::2])
+    }
+    people = _PeopleUnpickler(io.BytesIO(sections.pop("people"))).load()
+    strings = bytes(sections.pop("strings"))
+    ints = {name: _int32s(section) for name, section in sections.items()}
+
+    doctors, patients, clinics = people["doctors"], people["patients"], people["clinics"]
+    store = RecordStore(
+        doctors, patients, clinics,
+        columns={name: ints[name] for name in RecordStore.COLUMNS}, strings=strings,
+    )
+    for owners, kind in ((doctors, "doctor"), (patients, "patient")):
+        order, starts = ints[f"{kind}_order"], ints[f"{kind}_starts"]
+        for i, owner in enumerate(owners):
+            owner.records = StoredRecords(store, order[starts[i]:starts[i + 1]])
+
+    hospital_system = HospitalSystem(compact=True)
+    hospital_system.records = store
+    for i in people["system_doctors"]:
+        hospital_system.add_doctor(doctors[i])
+    return hospital_system
 
 # -----------------------
 # Example Usage
@@ -0,0 +1,307 @@
+"""Tests of the in-memory HospitalSystem of project.py.
+
+Run from the repository root:
+
+    python -m unittest test_project
+"""
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+
+from project import (
+    _SNAPSHOT_HEADER, SNAPSHOT_SECTIONS, AvailabilityMatrix, BookingIndex, Clinic, Doctor, HospitalSystem, NameTrie, Patient, Record,
+    RecordStore, StoredRecords, load_snapshot,
+)
+
+MONDAY = date(2025, 1, 6)
+
+
+def doctor(lastname="Smith", specialization="Cardiology", firstname="Alice"):
+    return Doctor(firstname, lastname, "1980-06-15", "555-0000", f"{lastname.lower()}@hospital.com", specialization, "LIC1", 10)
+
+
+def patient(lastname="Doe"):
+    return Patient("John", lastname, "1990-01-01", "555-2222", f"{lastname.lower()}@example.com", ["cough"])
+
+
+def clinic(opening_hours="8AM-5PM"):
+    return Clinic(1, "Healthy Life Clinic", "123 Main St", "Metropolis", "MetroState", "12345", "555-1111", "contact@hlclinic.com", opening_hours)
+
+
+def at(hour, minute=0, days=0):
+    return datetime.combine(MONDAY + timedelta(days=days), datetime.min.time()).replace(hour=hour, minute=minute)
+
+
+class BookingIndexTests(unittest.TestCase):
+    def test_add_remove_and_lookup(self):
+        index = BookingIndex([at(9), at(8, 30), at(9, days=1)])
+        self.assertEqual(len(index), 3)
+        self.assertTrue(index.is_booked(at(9)))
+        self.assertFalse(index.is_booked(at(9, days=2)))
+        self.assertFalse(index.is_booked(at(9, 0) + timedelta(seconds=1)))  # kept to the second
+        self.assertEqual(list(index.days[MONDAY]), [8 * 3600 + 1800, 9 * 3600])
+
+        index.remove(at(9))
+        index.remove(at(11))  # not booked: nothing to do
+        index.remove(at(9, days=1))
+        self.assertFalse(index.is_booked(at(9)))
+        self.assertNotIn(MONDAY + timedelta(days=1), index.days)  # emptied days are dropped
+        self.assertEqual(len(index), 1)
+
+    def test_free_slots_across_days(self):
+        index = BookingIndex([at(16), at(8, days=1)])
+        self.assertEqual(index.free_slots(at(15), at(9, days=1), step=timedelta(hours=1)), [
+            at(15), at(17), at(18), at(19), at(20), at(21), at(22), at(23),
+            at(0, days=1), at(1, days=1), at(2, days=1), at(3, days=1), at(4, days=1),
+            at(5, days=1), at(6, days=1), at(7, days=1),
+        ])
+
+
+class SlotLookupTests(unittest.TestCase):
+    def setUp(self):
+        self.hs = HospitalSystem()
+        self.doctor, self.patient, self.clinic = doctor(), patient(), clinic("Mon-Fri 8AM-12PM, 1PM-5PM; closed 2025-01-07")
+        self.hs.add_doctor(self.doctor)
+
+    def test_follows_records(self):
+        self.hs.add_record(Record(self.patient, self.doctor, self.clinic, at(9), "Checkup"))
+        self.assertFalse(self.hs.is_slot_available(self.doctor, at(9)))
+        self.assertTrue(self.hs.is_slot_available(self.doctor, at(9, 30)))
+        self.assertEqual(self.hs.free_slots(self.doctor, at(8), at(10)), [at(8), at(8, 30), at(9, 30)])
+        free = self.hs.free_slots_on(self.doctor, self.clinic, MONDAY)
+        self.assertEqual((len(free), free[0], free[-1]), (15, at(8), at(16, 30)))
+        self.assertNotIn(at(12), free)
+        self.assertEqual(self.hs.free_slots_on(self.doctor, self.clinic, MONDAY + timedelta(days=1)), [])
+
+    def test_hours_parsed_without_django(self):
+        # The web app's parser is shared, but the simulation doesn't need Django
+        check = "import sys, project; assert not any(name.split('.')[0] == 'django' for name in sys.modules)"
+        subprocess.run([sys.executable, "-c", check], cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+
+    def test_index_built_from_existing_records(self):
+        # Records attached before the system indexed the doctor still count
+        self.doctor.records.append(Record(self.patient, self.doctor, self.clinic, at(10), "Checkup"))
+        self.assertFalse(self.hs.is_slot_available(self.doctor, at(10)))
+        self.hs.add_record(Record(self.patient, self.doctor, self.clinic, at(11), "Checkup"))
+        self.assertEqual(len(self.hs.booking_index(self.doctor)), 2)
+
+
+class DoctorIndexTests(unittest.TestCase):
+    def test_name_trie(self):
+        trie = NameTrie()
+        trie.add("Anna", 1)
+        trie.add("Andersen", 2)
+        trie.add("Ann", 1)  # a second name of the same value
+        self.assertEqual(trie.find("an"), [1, 2])
+        self.assertEqual(trie.find("ANN"), [1])
+        self.assertEqual(trie.find(""), [])
+        self.assertEqual(trie.find("annex"), [])
+
+        trie.remove("Anna", 1)
+        self.assertEqual(trie.find("ann"), [1])  # still under "Ann"
+        self.assertEqual(trie.find("anna"), [])
+        trie.remove("Ann", 1)
+        trie.remove("Zed", 3)  # never added: nothing to do
+        self.assertEqual(trie.find("a"), [2])
+        trie.remove("Andersen", 2)
+        self.assertEqual(trie.root, {})
+
+    def test_lookups_follow_doctors(self):
+        hs = HospitalSystem()
+        smith, jones = doctor("Smith"), doctor("Jones", "Dermatology", firstname="Sam")
+        hs.add_doctor(smith)
+        hs.add_doctor(jones)
+        self.assertEqual(hs.get_doctors("CARDIOLOGY"), [smith])
+        self.assertEqual(hs.get_doctors(), [smith, jones])
+        self.assertEqual(hs.find_doctors("s"), [smith, jones])
+        self.assertEqual(hs.find_doctors("al"), [smith])
+
+        hs.update_doctor(jones, specialization="Cardiology", lastname="Brown")
+        self.assertEqual(hs.get_doctors("cardiology"), [smith, jones])
+        self.assertEqual(hs.get_doctors("Dermatology"), [])
+        self.assertNotIn("dermatology", hs.by_specialization)
+        self.assertEqual(hs.find_doctors("jo"), [])
+        self.assertEqual(hs.find_doctors("bro"), [jones])
+
+        hs.remove_doctor(smith)
+        self.assertEqual(hs.get_doctors("Cardiology"), [jones])
+        self.assertEqual(hs.find_doctors("s"), [jones])
+
+
+class RecordStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.hs = HospitalSystem(compact=True)
+        self.doctors = [doctor("Smith"), doctor("Jones", "Dermatology")]
+        self.patients = [patient("Doe"), patient("Roe")]
+        self.clinic = clinic()
+        for d in self.doctors:
+            self.hs.add_doctor(d)
+        self.records = [
+            Record(self.patients[i % 2], self.doctors[i // 2 % 2], self.clinic, at(8) + timedelta(minutes=30 * i), treatment)
+            for i, treatment in enumerate(["Checkup", None, "Checkup", "Knee brace", "12"])
+        ]
+        for record in self.records:
+            self.hs.add_record(record)
+
+    def fields(self, record):
+        return record.patient, record.doctor, record.clinic, record.visitDate, record.treatment
+
+    def test_round_trip(self):
+        store = self.hs.records
+        self.assertIsInstance(store, RecordStore)
+        self.assertEqual([self.fields(r) for r in store], [self.fields(r) for r in self.records])
+        self.assertEqual([self.fields(r) for r in store[1:3]], [self.fields(r) for r in self.records[1:3]])
+        self.assertIsNot(store[0], store[0])  # built on every read
+        # Each doctor, patient, clinic and treatment is stored once
+        self.assertEqual((len(store.doctors), len(store.patients), len(store.clinics)), (2, 2, 1))
+        self.assertEqual(bytes(store.strings), b"Checkup\0Knee brace\0" + b"12\0")
+        self.assertEqual(store.treatment(4), "12")  # text, not a position in a table
+
+    def test_owners_see_their_records(self):
+        first = self.doctors[0]
+        self.assertIsInstance(first.records, StoredRecords)
+        self.assertEqual([r.visitDate for r in first.records], [at(8), at(8, 30), at(10)])
+        self.assertEqual([r.treatment for r in self.patients[1].records], [None, "Knee brace"])
+        self.assertFalse(self.hs.is_slot_available(first, at(8, 30)))
+        self.assertTrue(self.hs.is_slot_available(first, at(9)))
+
+    def test_owner_with_outside_records(self):
+        other = patient("Poe")
+        other.records.append(Record(other, self.doctors[0], self.clinic, at(15), "Checkup"))
+        with self.assertRaises(ValueError):
+            self.hs.add_record(Record(other, self.doctors[0], self.clinic, at(16), "Checkup"))
+
+    def test_slots(self):
+        for obj in (self.doctors[0], self.patients[0], self.clinic, self.records[0], BookingIndex()):
+            with self.subTest(type(obj).__name__):
+                self.assertFalse(hasattr(obj, "__dict__"))
+
+
+class AvailabilityMatrixTests(unittest.TestCase):
+    def setUp(self):
+        self.hs = HospitalSystem()
+        self.smith, self.jones, self.lee = doctor("Smith"), doctor("Jones"), doctor("Lee", "Dermatology")
+        for d in (self.smith, self.jones, self.lee):
+            self.hs.add_doctor(d)
+        self.patient = patient()
+        self.clinic = clinic("Mon-Fri 8AM-12PM, 1PM-5PM; Sat 9:30AM-1PM; closed 2025-01-07")
+        for d, visit in ((self.smith, at(8)), (self.jones, at(8)), (self.jones, at(8, 30)), (self.smith, at(9, days=2))):
+            self.hs.add_record(Record(self.patient, d, self.clinic, visit, "Checkup"))
+        self.matrix = self.hs.availability_matrix(self.clinic, MONDAY, 7, "Cardiology")
+
+    def test_follows_opening_hours(self):
+        # From the earliest opening to the latest closing of the week
+        self.assertEqual((self.matrix.slot(0), self.matrix.slots_per_day), (at(8), 18))
+        self.assertEqual(self.matrix.count_free(), {self.smith: 64 + 7 - 2, self.jones: 64 + 7 - 2})
+        for d in (self.smith, self.jones):
+            week = [slot for days in range(7) for slot in self.hs.free_slots_on(d, self.clinic, MONDAY + timedelta(days=days))]
+            self.assertEqual(self.matrix.common_free([d]), week)
+
+    def test_earliest_free(self):
+        self.assertEqual(self.matrix.earliest_free(), (self.smith, at(8, 30)))
+        self.assertEqual(self.matrix.earliest_free([self.jones]), (self.jones, at(9)))
+        # Not in the lunch break, nor on the holiday or Saturday morning before opening
+        self.assertEqual(self.matrix.earliest_free(start=at(12)), (self.smith, at(13)))
+        self.assertEqual(self.matrix.earliest_free(start=at(17)), (self.smith, at(8, days=2)))
+        self.assertEqual(self.matrix.earliest_free(start=at(17, days=4)), (self.smith, at(9, 30, days=5)))
+        self.assertIsNone(self.matrix.earliest_free(start=at(13, days=5)))
+
+    def test_common_free(self):
+        common = self.matrix.common_free([self.smith, self.jones], end=at(0, days=1))
+        self.assertEqual((common[0], common[-1], len(common)), (at(9), at(16, 30), 14))
+
+    def test_book_and_release(self):
+        self.matrix.book(self.smith, at(8, 30))
+        self.assertEqual(self.matrix.earliest_free([self.smith]), (self.smith, at(9)))
+        self.matrix.release(self.smith, at(8, 30))
+        self.matrix.release(self.smith, at(12))  # the lunch break stays taken
+        self.matrix.release(self.smith, at(9, days=1))  # and so does the holiday
+        self.matrix.book(self.lee, at(9))  # not in this matrix
+        self.assertEqual(self.matrix.earliest_free([self.smith]), (self.smith, at(8, 30)))
+        self.assertEqual(self.matrix.count_free([self.smith]), {self.smith: 69})
+
+    def test_from_records(self):
+        records = [r for d in (self.smith, self.jones) for r in d.records]
+        matrix = AvailabilityMatrix.from_records(records, [self.smith, self.jones], MONDAY, 7, self.clinic.schedule)
+        self.assertTrue((matrix.free == self.matrix.free).all())
+
+    def test_malformed_hours(self):
+        with self.assertRaises(ValueError):
+            self.hs.availability_matrix(clinic("whenever"), MONDAY, 7)
+
+
+class SnapshotTests(unittest.TestCase):
+    def setUp(self):
+        self.doctors = [doctor("Smith"), doctor("Jones", "Dermatology"), doctor("Idle", "Neurology")]
+        self.patients = [patient("Doe"), patient("Roe")]
+        self.clinic = clinic()
+        self.records = [
+            Record(self.patients[i % 2], self.doctors[i % 2], self.clinic, at(8) + timedelta(minutes=30 * i), treatment)
+            for i, treatment in enumerate(["Checkup", None, "Knee brace"])
+        ]
+        fd, self.path = tempfile.mkstemp(suffix=".snap")
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+
+    def system(self, compact):
+        hs = HospitalSystem(compact=compact)
+        for d in self.doctors:
+            hs.add_doctor(d)
+        for record in self.records:
+            hs.add_record(record)
+        return hs
+
+    def summary(self, hs):
+        return (
+            [str(d) for d in hs.doctors],
+            [(r.patient.lastname, r.doctor.lastname, r.visitDate, r.treatment) for r in hs.records],
+            {str(d): [r.visitDate for r in d.records] for d in hs.doctors},
+        )
+
+    def test_round_trip(self):
+        for compact in (False, True):
+            with self.subTest(compact=compact):
+                for owner in self.doctors + self.patients:
+                    owner.records = []
+                hs = self.system(compact)
+                hs.save(self.path)
+                loaded = HospitalSystem.load(self.path)
+                self.assertTrue(loaded.compact)
+                self.assertEqual(self.summary(loaded), self.summary(hs))
+                self.assertEqual(len(loaded.get_doctors("neurology")[0].records), 0)
+                self.assertFalse(loaded.is_slot_available(loaded.doctors[0], at(8)))
+
+    def test_add_after_load(self):
+        self.system(True).save(self.path)
+        loaded = load_snapshot(self.path)
+        first, = loaded.get_doctors("Cardiology")
+        loaded.add_record(Record(first.records[0].patient, first, first.records[0].clinic, at(15), "Follow-up"))
+        self.assertEqual([r.treatment for r in first.records], ["Checkup", "Knee brace", "Follow-up"])
+        self.assertFalse(loaded.is_slot_available(first, at(15)))
+        # The file is left as it was
+        self.assertEqual(len(load_snapshot(self.path).records), 3)
+
+    def test_little_endian(self):
+        self.system(True).save(self.path)
+        with open(self.path, "rb") as f:
+            data = f.read()
+        header = _SNAPSHOT_HEADER.unpack_from(data)
+        sections = dict(zip(SNAPSHOT_SECTIONS, zip(header[1::2], header[2::2])))
+        offset, length = sections["visit_minutes"]
+        minutes = [int((at(8) + timedelta(minutes=30 * i) - RecordStore.EPOCH).total_seconds() // 60) for i in range(3)]
+        self.assertEqual(data[offset:offset + length], struct.pack("<3i", *minutes))
+        self.assertTrue(all(offset % 8 == 0 for offset, _ in sections.values()))
+
+    def test_not_a_snapshot(self):
+        with open(self.path, "wb") as f:
+            f.write(bytes(_SNAPSHOT_HEADER.size))
+        with self.assertRaises(ValueError):
+            load_snapshot(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()